@@ -0,0 +1,285 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from responses import dumps
+
+# priority of the request being served, for upstream calls it makes: 0 for
+# cheap reads, 1 for writes and expensive calls
+current_priority: ContextVar[int] = ContextVar("current_priority", default=0)
+
+# request classes: token cost and upstream priority
+CLASSES = {
+    "read": (1, 0),
+    "write": (2, 1),
+    "expensive": (5, 1),
+}
+
+
+# non-blocking token bucket: `rate` tokens per second up to `burst`.
+# take() either spends the tokens or says how long until they'd be there
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    # seconds to wait, 0 if admitted. `reserve` tokens are left for
+    # callers that don't ask for a reserve, i.e. higher priority ones
+    def take(self, cost: float = 1, reserve: float = 0) -> float:
+        self.refill()
+        if self.tokens - reserve >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost + reserve - self.tokens) / self.rate
+
+    # gives back tokens taken for a request that was then turned away
+    def refund(self, cost: float) -> None:
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+# one bucket per client, for the `maxsize` most recently seen clients
+class ClientBuckets:
+    def __init__(self, rate: float, burst: float, maxsize: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def take(self, client: str, cost: float = 1) -> float:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(cost)
+
+    def refund(self, client: str, cost: float) -> None:
+        bucket = self._buckets.get(client)
+        if bucket is not None:
+            bucket.refund(cost)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# concurrency limit for upstream calls with two priorities. low priority
+# calls may only use limit - reserved slots, and a freed slot goes to the
+# oldest waiting high priority call first
+class PriorityLimiter:
+    def __init__(self, limit: int, reserved: int = 0):
+        self.limit = limit
+        self.reserved = min(reserved, limit - 1)
+        self.in_flight = 0
+        self._waiters: tuple[deque, deque] = (deque(), deque())
+
+    def waiting(self, priority: int | None = None) -> int:
+        if priority is None:
+            return sum(len(waiters) for waiters in self._waiters)
+        return len(self._waiters[priority])
+
+    def _has_slot(self, priority: int) -> bool:
+        return self.in_flight < self.limit - (self.reserved if priority else 0)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0):
+        if self._has_slot(priority) and not any(self._waiters[: priority + 1]):
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[priority].append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # granted just as it was cancelled: pass the slot on
+                    self._release()
+                elif waiter in self._waiters[priority]:
+                    self._waiters[priority].remove(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        for priority, waiters in enumerate(self._waiters):
+            while waiters and self._has_slot(priority):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.in_flight += 1
+                    waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "reserved": self.reserved,
+            "in_flight": self.in_flight,
+            "waiting_high": len(self._waiters[0]),
+            "waiting_low": len(self._waiters[1]),
+        }
+
+
+# decides per request whether to serve it now or shed it: 429 when the
+# client is over its own rate, 503 when the whole process is over the
+# global rate or the upstream queue is too long. writes and expensive
+# calls are shed first: they can't use the last `read_reserve` share of the
+# global bucket and are turned away at half the queue length reads are
+class AdmissionControl:
+    def __init__(
+        self,
+        limiter: PriorityLimiter,
+        client_rate: float = 20,
+        client_burst: float = 40,
+        global_rate: float = 1000,
+        global_burst: float = 2000,
+        read_reserve: float = 0.2,
+        max_queue: int = 500,
+    ):
+        self.limiter = limiter
+        self.clients = (
+            ClientBuckets(client_rate, client_burst) if client_rate else None
+        )
+        self.bucket = (
+            TokenBucket(global_rate, global_burst) if global_rate else None
+        )
+        self.read_reserve = read_reserve
+        self.max_queue = max_queue
+        self.admitted = dict.fromkeys(CLASSES, 0)
+        self.limited = dict.fromkeys(CLASSES, 0)
+        self.shed = dict.fromkeys(CLASSES, 0)
+
+    # (status, retry after seconds) for a request to reject, None to serve
+    def check(self, client: str, kind: str) -> tuple[int, int] | None:
+        cost = CLASSES[kind][0]
+        if self.clients is not None:
+            wait = self.clients.take(client, cost)
+            if wait:
+                self.limited[kind] += 1
+                return 429, math.ceil(wait)
+        rejected = self._check_global(kind)
+        if rejected is not None:
+            # shedding isn't the client's doing, so it keeps its tokens
+            if self.clients is not None:
+                self.clients.refund(client, cost)
+            self.shed[kind] += 1
+            return rejected
+        self.admitted[kind] += 1
+        return None
+
+    def _check_global(self, kind: str) -> tuple[int, int] | None:
+        cost, priority = CLASSES[kind]
+        queue = self.max_queue // 2 if priority else self.max_queue
+        if self.limiter.waiting() >= queue:
+            return 503, 1
+        if self.bucket is not None:
+            reserve = self.bucket.burst * self.read_reserve if priority else 0
+            wait = self.bucket.take(cost, reserve)
+            if wait:
+                return 503, math.ceil(wait)
+        return None
+
+    def stats(self) -> dict:
+        stats = {
+            "admitted": self.admitted,
+            "limited": self.limited,
+            "shed": self.shed,
+            "upstream": self.limiter.stats(),
+            "max_queue": self.max_queue,
+        }
+        if self.bucket is not None:
+            self.bucket.refill()
+            stats["global"] = {
+                "rate": self.bucket.rate,
+                "burst": self.bucket.burst,
+                "tokens": self.bucket.tokens,
+            }
+        if self.clients is not None:
+            stats["clients"] = {
+                "rate": self.clients.rate,
+                "burst": self.clients.burst,
+                "tracked": len(self.clients),
+            }
+        return stats
+
+
+# ASGI middleware putting every request through AdmissionControl before it
+# reaches a handler, so shed requests cost no upstream work at all.
+# classify(method, path) names the request's class, or None to exempt it
+# (health checks, metrics). clients are told apart by the user
+# identify(token) names for a bearer token that has already been verified,
+# and otherwise by address: the first X-Forwarded-For hop when behind a
+# trusted proxy. an unverified token is never a client of its own, or a
+# new made-up token per request would get a new bucket every time
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        control: AdmissionControl,
+        classify,
+        identify=None,
+        trust_forwarded: bool = False,
+    ):
+        self.app = app
+        self.control = control
+        self.classify = classify
+        self.identify = identify
+        self.trust_forwarded = trust_forwarded
+
+    def client_key(self, scope) -> str:
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"")
+        if self.identify is not None and authorization.lower().startswith(
+            b"bearer "
+        ):
+            user = self.identify(authorization[7:].decode("latin-1"))
+            if user is not None:
+                return f"user:{user}"
+        forwarded = headers.get(b"x-forwarded-for")
+        if self.trust_forwarded and forwarded:
+            return forwarded.split(b",")[0].strip().decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        kind = self.classify(scope["method"], scope["path"])
+        if kind is None:
+            return await self.app(scope, receive, send)
+        rejected = self.control.check(self.client_key(scope), kind)
+        if rejected is not None:
+            status, retry_after = rejected
+            detail = "Too many requests" if status == 429 else "Server is busy"
+            body = dumps({"detail": detail})
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"retry-after", str(retry_after).encode()),
+                    ],
+                }
+            )
+            return await send({"type": "http.response.body", "body": body})
+        token = current_priority.set(CLASSES[kind][1])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_priority.reset(token)
@@ -1,43 +1,364 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import os
+import json
+import base64
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from supabase import create_client
-from supabase._sync.client import SyncClient
+import httpx
+from postgrest import APIError, AsyncPostgrestClient
+from supabase_auth import AsyncGoTrueClient
 from typing import Annotated, TypedDict
+from uuid import UUID
+from auth_tokens import SharedTokenStore, TokenCache, TokenVerifier
+from admission import (
+    AdmissionControl,
+    AdmissionMiddleware,
+    PriorityLimiter,
+    current_priority,
+)
+from cache import ResponseCache, SharedResponseCache
+from dedup import BloomFilter, fingerprint, normalize_url, post_keys
+from events import EventHub
+from views import ViewBuffer
+from feed import FeedEngine, FeedWeights
+from clients import (
+    UserClientPool,
+    create_auth_client,
+    create_http_pool,
+    create_postgrest_client,
+    describe_query,
+    pool_stats,
+    warm_up,
+)
+from metrics import (
+    HttpMetrics,
+    MetricsMiddleware,
+    Registry,
+    phase,
+    record_phase,
+)
+from responses import (
+    CompressionMiddleware,
+    FastJSONResponse,
+    Rendered,
+    conditional_response,
+    dumps,
+    loads,
+    pack,
+    render,
+    unpack,
+)
+from schema import parse_fields
+from search import SearchIndex
+from shared_state import create_state
+from summaries import SummaryQueue, summarize_batch
+from trending import TrendingPosts
+from user_state import InteractionState
 
 # load environment variables
 load_dotenv()
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+# clients and background work that live as long as the app. nothing
+# touches the network at import, so workers fork and start quickly; the
+# feed loads in the background and /readyz reports ready once it has
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    start_clients()
+    await shared_state.start()
+    startup["warmed_connections"] = await warm_up(
+        http_pool, SUPABASE_URL, SUPABASE_ANON_KEY, HTTP_POOL_WARMUP
+    )
+    startup["clients_seconds"] = time.perf_counter() - started
+    feed_loader = asyncio.create_task(load_initial_feed())
+    view_flusher = asyncio.create_task(view_buffer.run())
+    keepalive = asyncio.create_task(event_hub.run())
+    # other workers' writes, applied to this worker's feed, trending,
+    # search index and event streams
+    shared_writes = asyncio.create_task(shared_state.run(apply_shared_write))
+    # summaries are background work, queued behind reads for upstream slots
+    background = contextvars.copy_context()
+    background.run(current_priority.set, 1)
+    summarizer = asyncio.create_task(summary_queue.run(), context=background)
+    exit_handlers = end_streams_on_exit()
+    try:
+        yield
+    finally:
+        for sig, handler in exit_handlers.items():
+            signal.signal(sig, handler)
+        feed_loader.cancel()
+        view_flusher.cancel()
+        keepalive.cancel()
+        summarizer.cancel()
+        shared_writes.cancel()
+        # streams opened since the exit signal, or all of them when the
+        # server stopped without one
+        event_hub.close()
+        # write out whatever views and summaries are still buffered; posts
+        # still queued are left to summarizer.py. a periodic flush cut off
+        # by the cancel puts its batch back first
+        await asyncio.gather(view_flusher, return_exceptions=True)
+        await view_buffer.flush()
+        await summary_queue.flush()
+        if summary_pool is not None:
+            summary_pool.shutdown(wait=False, cancel_futures=True)
+        await cache.flush()
+        await shared_state.close()
+        await http_pool.aclose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# gzip (or brotli, when installed) for responses over COMPRESS_MIN_SIZE
+# bytes, if the client accepts it
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "500")),
+)
+
+# cap in-flight upstream calls; requests beyond the cap wait on the event
+# loop instead of each holding a worker thread. UPSTREAM_RESERVED of the
+# slots are kept for reads, so a burst of writes can't starve them
+upstream_limiter = PriorityLimiter(
+    int(os.getenv("UPSTREAM_CONCURRENCY", "200")),
+    reserved=int(os.getenv("UPSTREAM_RESERVED", "40")),
+)
+
+# per-client and global token buckets plus upstream queue length decide
+# whether a request is served or shed with 429/503 and Retry-After before
+# it does any work. a rate of 0 turns that bucket off
+admission = AdmissionControl(
+    upstream_limiter,
+    client_rate=float(os.getenv("ADMISSION_CLIENT_RATE", "20")),
+    client_burst=float(os.getenv("ADMISSION_CLIENT_BURST", "40")),
+    global_rate=float(os.getenv("ADMISSION_GLOBAL_RATE", "1000")),
+    global_burst=float(os.getenv("ADMISSION_GLOBAL_BURST", "2000")),
+    read_reserve=float(os.getenv("ADMISSION_READ_RESERVE", "0.2")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "500")),
+)
+# probes and monitoring are never shed
+ADMISSION_EXEMPT = {"/healthz", "/readyz", "/metrics", "/admission/state"}
+# calls that cost the upstream the most: password hashing on the auth
+# server, or multi-row inserts with their triggers
+EXPENSIVE_REQUESTS = {
+    ("POST", "/signup"),
+    ("POST", "/login"),
+    ("POST", "/posts"),
+    ("POST", "/interactions/batch"),
+}
+
+
+def classify_request(method: str, path: str) -> str | None:
+    if path in ADMISSION_EXEMPT:
+        return None
+    if (method, path) in EXPENSIVE_REQUESTS:
+        return "expensive"
+    # views are only buffered in memory, as cheap as a read
+    if method in ("GET", "HEAD") or (method, path) == ("POST", "/views"):
+        return "read"
+    return "write"
+
+
+# the id of a token's user once this worker has verified the token
+def verified_user_id(token: str) -> str | None:
+    user = token_verifier.cache.peek(token)
+    return None if user is None else str(user.id)
+
+
+app.add_middleware(
+    AdmissionMiddleware,
+    control=admission,
+    classify=classify_request,
+    identify=verified_user_id,
+    trust_forwarded=os.getenv("ADMISSION_TRUST_FORWARDED") == "1",
+)
+
+# request and upstream timings, exposed at /metrics; requests slower than
+# SLOW_REQUEST_MS (off by default) are logged with a per-phase breakdown.
+# added last so shed requests are counted too
+registry = Registry()
+app.add_middleware(
+    MetricsMiddleware,
+    metrics=HttpMetrics(registry),
+    slow_ms=float(os.getenv("SLOW_REQUEST_MS", "0")),
+)
+upstream_latency = registry.histogram(
+    "upstream_request_duration_seconds",
+    "Supabase call latency by table and operation",
+    ("table", "operation"),
+)
+upstream_errors = registry.counter(
+    "upstream_errors_total",
+    "Failed Supabase calls by table and operation",
+    ("table", "operation"),
+)
+upstream_wait = registry.histogram(
+    "upstream_wait_seconds",
+    "Time spent waiting for an upstream slot",
+)
+
+upstream_in_flight = registry.gauge(
+    "upstream_requests_in_flight", "Supabase calls currently in flight"
+).labels()
+
+
+async def upstream(call, table: str, operation: str):
+    start = time.perf_counter()
+    try:
+        async with upstream_limiter.slot(current_priority.get()):
+            started = time.perf_counter()
+            upstream_wait.labels().observe(started - start)
+            record_phase("upstream_wait", started - start)
+            upstream_in_flight.inc()
+            try:
+                with phase("upstream"):
+                    return await call
+            except Exception:
+                upstream_errors.labels(table, operation).inc()
+                raise
+            finally:
+                upstream_in_flight.dec()
+                upstream_latency.labels(table, operation).observe(
+                    time.perf_counter() - started
+                )
+    finally:
+        # a caller cancelled while waiting for a slot never ran its call;
+        # closing it avoids a "never awaited" warning, and does nothing
+        # to one that has run
+        if asyncio.iscoroutine(call):
+            call.close()
+
+
+# runs a postgrest query through upstream(), labelled by its table and
+# operation
+async def execute(query):
+    return await upstream(query.execute(), *describe_query(query))
 
-# set up supabase client
-supabase = create_client(
-    os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY")
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+# connections opened at startup so the first requests don't pay for them
+HTTP_POOL_WARMUP = int(os.getenv("HTTP_POOL_WARMUP", "10"))
+
+# upstream clients, created by start_clients() when the app starts
+http_pool: httpx.AsyncClient | None = None
+# service-key postgrest client for reads and server-side writes
+supabase: AsyncPostgrestClient | None = None
+# sessionless auth client for sign-up, login and remote token checks
+auth_client: AsyncGoTrueClient | None = None
+# postgrest clients scoped to each caller's token
+user_clients: UserClientPool | None = None
+
+
+def start_clients() -> None:
+    global http_pool, supabase, auth_client, user_clients
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_ANON_KEY must be set")
+    # one keep-alive connection pool shared by every client
+    http_pool = create_http_pool(
+        max_connections=int(os.getenv("HTTP_POOL_SIZE", "200")),
+        max_keepalive=int(os.getenv("HTTP_POOL_KEEPALIVE", "50")),
+    )
+    supabase = create_postgrest_client(
+        SUPABASE_URL,
+        SUPABASE_ANON_KEY,
+        os.getenv("SUPABASE_SERVICE_KEY"),
+        http_pool,
+    )
+    auth_client = create_auth_client(
+        SUPABASE_URL, SUPABASE_ANON_KEY, http_pool
+    )
+    user_clients = UserClientPool(
+        SUPABASE_URL,
+        SUPABASE_ANON_KEY,
+        http_pool,
+        maxsize=int(os.getenv("USER_CLIENT_CACHE_SIZE", "1000")),
+    )
+
+
+# where workers share cached responses, verified tokens and writes:
+# "local" keeps everything in this process (one worker), "mmap" maps a
+# shared memory file for the workers on one host, and "redis" uses any
+# server that speaks the Redis protocol, for workers on any number of hosts
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")
+STATE_OPTIONS = {
+    "mmap": {
+        "path": os.getenv("STATE_MMAP_PATH"),
+        "arena_size": int(os.getenv("STATE_MMAP_SIZE_MB", "32")) << 20,
+        "slots": int(os.getenv("STATE_MMAP_SLOTS", "65536")),
+        "poll_interval": float(os.getenv("STATE_POLL_INTERVAL", "0.002")),
+    },
+    "redis": {
+        "url": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"),
+        "prefix": os.getenv("REDIS_PREFIX", "betterfeed:"),
+    },
+}
+shared_state = create_state(
+    STATE_BACKEND, **STATE_OPTIONS.get(STATE_BACKEND, {})
 )
-# authenticate user with service key
-supabase.postgrest.auth(os.getenv("SUPABASE_SERVICE_KEY"))
+
+
+# page size limits for list endpoints
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
 
 # set up HTTPBearer for token authentication
 security = HTTPBearer()
+# same, for endpoints that also serve anonymous requests
+optional_security = HTTPBearer(auto_error=False)
+
+
+async def get_remote_user(token: str):
+    response = await upstream(auth_client.get_user(token), "auth", "get_user")
+    return response.user
+
+
+# verify access tokens locally when a JWT secret or JWKS is configured,
+# otherwise fall back to asking the auth server; either way the result is
+# cached until the token expires
+JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+AUTH_MODE = os.getenv("AUTH_MODE", "secret" if JWT_SECRET else "remote")
+token_verifier = TokenVerifier(
+    mode=AUTH_MODE,
+    cache=TokenCache(maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000"))),
+    secret=JWT_SECRET,
+    jwks_url=f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+    remote=get_remote_user,
+    max_ttl=float(os.getenv("AUTH_CACHE_TTL", "3600")),
+    shared=(
+        SharedTokenStore(shared_state) if STATE_BACKEND != "local" else None
+    ),
+)
 
 
 class AuthResponse(TypedDict):
     user: dict
-    client: SyncClient
+    client: AsyncPostgrestClient
 
 
 # auth middleware
-def auth(
+async def auth(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> AuthResponse:
     token = credentials.credentials
     try:
-        response = supabase.auth.get_user(token)
-        user_client: SyncClient = create_client(
-            os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY")
-        )
-        user_client.postgrest.auth(token)
-        return {"user": response.user, "client": user_client}
+        with phase("auth"):
+            user = await token_verifier.verify(token)
+            user_client = user_clients.get(token)
+        return {"user": user, "client": user_client}
     except Exception as e:
         raise HTTPException(
             status_code=401, detail=f"Invalid or expired token: {str(e)}"
@@ -47,36 +368,541 @@ def auth(
 auth_deps = Annotated[AuthResponse, Depends(auth)]
 
 
+# the caller on endpoints that work with or without a token: None when no
+# token is sent, 401 for a bad one
+async def optional_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(
+        optional_security
+    ),
+):
+    if credentials is None:
+        return None
+    try:
+        with phase("auth"):
+            return await token_verifier.verify(credentials.credentials)
+    except Exception as e:
+        raise HTTPException(
+            status_code=401, detail=f"Invalid or expired token: {str(e)}"
+        )
+
+
+optional_user_deps = Annotated[object | None, Depends(optional_user)]
+
+
+"""
+pagination
+"""
+
+
+# cursors are opaque to clients: base64 of the last item's sort key
+def encode_cursor(*key) -> str:
+    raw = json.dumps(key).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# decodes a cursor and coerces its values with the given types
+def decode_cursor(cursor: str, *types) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded))
+        if len(key) != len(types):
+            raise ValueError
+        return tuple(cast(value) for cast, value in zip(types, key))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# timestamps from a cursor go back out re-serialized, so nothing but an
+# ISO timestamp can end up in a filter
+def iso_timestamp(value: str) -> str:
+    return datetime.fromisoformat(value).isoformat()
+
+
+# ids in JSON bodies: positive integers. true and false are ints to
+# Python, so they are ruled out explicitly
+def is_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+# comma-separated id lists, e.g. ?post_ids=1,2,3
+def parse_ids(raw: str) -> list[int]:
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw.split(",") if i))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ids must be integers")
+    if not ids or len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Between 1 and {MAX_PAGE_SIZE} ids are allowed",
+        )
+    return ids
+
+
+# postgrest select list for ?fields= (validated against sql/schema.sql)
+# and ?include=username
+def select_columns(
+    table: str,
+    fields: str | None,
+    include: str | None = None,
+    required: tuple[str, ...] = ("id",),
+) -> str:
+    try:
+        columns = parse_fields(fields, table, required)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    select = ",".join(columns) if columns else "*"
+    if include:
+        select += ",profiles(username)"
+    return select
+
+
+# turn the embedded profiles(username) into a flat "username" field
+def flatten_username(rows: list[dict]) -> list[dict]:
+    for row in rows:
+        profile = row.pop("profiles", None)
+        if profile is not None:
+            row["username"] = profile["username"]
+    return rows
+
+
+"""
+caching
+"""
+
+
+# read-through cache for hot GET endpoints; write handlers below drop
+# exactly the keys they affect. with a shared state backend the workers
+# share one cache, so an entry is loaded once and invalidated everywhere
+if STATE_BACKEND == "local":
+    cache = ResponseCache(
+        maxsize=int(os.getenv("CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("CACHE_TTL", "30")),
+    )
+else:
+    cache = SharedResponseCache(
+        shared_state,
+        pack,
+        unpack,
+        ttl=float(os.getenv("CACHE_TTL", "30")),
+    )
+
+
+# cached responses are stored rendered (see responses.Rendered), so a hit
+# costs no serialization and its ETag doubles as a version stamp: a client
+# that already has it gets a 304 without any upstream call
+
+
+# a page is tagged with every post on it, and first pages also with
+# "posts:first" since that's the only place a new post can appear
+def page_tags(first_page: bool, *extra: str):
+    def tags(page: Rendered):
+        yield from (f"post:{row['id']}" for row in page.content["data"])
+        if first_page:
+            yield "posts:first"
+        yield from extra
+
+    return tags
+
+
+# Cache-Control per endpoint: first pages, interactions and counts change
+# with every write, so clients revalidate each time (a cheap 304 when
+# nothing changed); older pages and usernames can be reused for a while
+REVALIDATE = "no-cache"
+OLDER_PAGES_CACHE_CONTROL = f"public, max-age={int(cache.ttl)}"
+USERNAME_CACHE_CONTROL = "public, max-age=300"
+
+
+# endpoint to check cache effectiveness
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return cache.stats()
+
+
+# endpoint to check the shared state backend: messages this worker
+# published to and received from the others
+@app.get("/state/stats")
+async def get_state_stats():
+    return shared_state.stats()
+
+
+"""
+feed
+"""
+
+
+# ranked feed kept in memory; bootstrapped at startup and then updated
+# incrementally by the write hooks below
+feed = FeedEngine(FeedWeights.from_env())
+
+
+# known articles, so most new posts are cleared as unique without a query.
+# sized for DEDUP_CAPACITY posts at a 1% false positive rate
+article_filter = BloomFilter(int(os.getenv("DEDUP_CAPACITY", 1_000_000)))
+# with the local state backend, posts created by other workers never reach
+# this worker's filter. uvicorn --workers starts its workers as child
+# processes, and uvicorn and gunicorn both take WEB_CONCURRENCY workers
+MULTIPLE_WORKERS = (
+    multiprocessing.parent_process() is not None
+    or int(os.getenv("WEB_CONCURRENCY", "1")) > 1
+)
+
+
+# also fills the duplicate filter, and the in-memory search index when that
+# backend is used
+async def load_feed(batch_size: int = 1000) -> None:
+    columns = (
+        "id,created_at,view_count,url_key,fingerprint,"
+        "post_stats(like_count,save_count)"
+    )
+    if SEARCH_BACKEND == "memory":
+        columns += ",title,content"
+    rows = []
+    last_id = 0
+    while True:
+        apiresponse = await execute(
+            supabase.table("posts")
+            .select(columns)
+            .gt("id", last_id)
+            .order("id")
+            .limit(batch_size)
+        )
+        for row in apiresponse.data:
+            for key in post_keys(row):
+                article_filter.add(key)
+            stats = row.pop("post_stats", None) or {}
+            if isinstance(stats, list):
+                stats = stats[0] if stats else {}
+            rows.append({**row, **stats})
+        if len(apiresponse.data) < batch_size:
+            break
+        last_id = apiresponse.data[-1]["id"]
+    feed.load(rows)
+    if SEARCH_BACKEND == "memory":
+        search_index.load(rows)
+
+
+"""
+write hooks
+"""
+
+
+# everything that has to react to a write (caches, feed, search, event
+# subscribers) is updated here, so the handlers only need to report what
+# changed. each hook is broadcast through the shared state, and the other
+# workers run it with remote=True: that skips the cache, which is shared
+# already, and work only one worker should do
+
+
+def posts_created(rows: list[dict], remote: bool = False) -> None:
+    if not remote:
+        # a new post is newer than everything else, so only first pages
+        # change (and any search it matches)
+        cache.invalidate_tag("posts:first", "search")
+        broadcast("posts_created", rows)
+    for row in rows:
+        feed.upsert_post(row)
+        for key in post_keys(row):
+            article_filter.add(key)
+        event_hub.publish(
+            "post_created",
+            {column: row.get(column) for column in EVENT_POST_COLUMNS},
+            ("posts",),
+        )
+        if SEARCH_BACKEND == "memory":
+            search_index.add(row["id"], row.get("title"), row.get("content"))
+        if row.get("summary") is None and not remote:
+            summary_queue.submit(row["id"], row.get("content"))
+
+
+def posts_updated(rows: list[dict], remote: bool = False) -> None:
+    if not remote:
+        cache.invalidate_tag("search", *(f"post:{row['id']}" for row in rows))
+        broadcast("posts_updated", rows)
+    for row in rows:
+        if SEARCH_BACKEND == "memory":
+            search_index.add(row["id"], row.get("title"), row.get("content"))
+        event_hub.publish(
+            "post_updated",
+            {"id": row["id"], "title": row.get("title")},
+            ("posts", f"post:{row['id']}"),
+        )
+
+
+def post_deleted(post_id: int, remote: bool = False) -> None:
+    if not remote:
+        cache.invalidate_tag(f"post:{post_id}", f"interactions:{post_id}")
+        cache.invalidate(("username", post_id))
+        broadcast("post_deleted", post_id)
+    feed.remove_post(post_id)
+    trending.remove_post(post_id)
+    search_index.remove(post_id)
+    event_hub.publish(
+        "post_deleted", {"id": post_id}, ("posts", f"post:{post_id}")
+    )
+
+
+# delta is +1 for new interactions and -1 for deleted ones
+def interactions_changed(
+    rows: list[dict], delta: int, remote: bool = False
+) -> None:
+    if not remote:
+        post_ids = {row["post_id"] for row in rows}
+        cache.invalidate_tag(
+            *(f"interactions:{post_id}" for post_id in post_ids),
+            *(f"counts:{post_id}" for post_id in post_ids),
+        )
+        broadcast("interactions_changed", rows, delta)
+    deltas = {}
+    interaction_state.changed(rows, delta)
+    trending.changed(rows, delta)
+    for row in rows:
+        feed.add_interaction(row["post_id"], row["interaction_type"], delta)
+        counts = deltas.setdefault(
+            row["post_id"], {"post_id": row["post_id"], "likes": 0, "saves": 0}
+        )
+        counts[f"{row['interaction_type']}s"] += delta
+    # one event per post, however many of its rows were in the write
+    for post_id, counts in deltas.items():
+        event_hub.publish("counts", counts, ("counts", f"post:{post_id}"))
+
+
+# views are only counted in the feed; they reach the database through the
+# flushing worker's view buffer
+def views_flushed(batch: dict[int, int], remote: bool = False) -> None:
+    if not remote:
+        broadcast("views_flushed", batch)
+    # post ids come back from JSON as strings
+    feed.add_views({int(post_id): views for post_id, views in batch.items()})
+
+
+def broadcast(hook: str, *args) -> None:
+    shared_state.publish(dumps([hook, *args]))
+
+
+SHARED_HOOKS = {
+    "posts_created": posts_created,
+    "posts_updated": posts_updated,
+    "post_deleted": post_deleted,
+    "interactions_changed": interactions_changed,
+    "views_flushed": views_flushed,
+}
+
+
+# runs another worker's write here
+def apply_shared_write(message: bytes) -> None:
+    hook, *args = loads(message)
+    SHARED_HOOKS[hook](*args, remote=True)
+
+
+"""
+interaction state
+"""
+
+
+# every post id the user liked or saved, read through idx_interactions_user_id
+async def load_user_interactions(
+    user_id: str, batch_size: int = 1000
+) -> list[dict]:
+    rows = []
+    last_id = 0
+    while True:
+        apiresponse = await execute(
+            supabase.table("interactions")
+            .select("id,post_id,interaction_type")
+            .eq("user_id", user_id)
+            .gt("id", last_id)
+            .order("id")
+            .limit(batch_size)
+        )
+        rows.extend(apiresponse.data)
+        if len(apiresponse.data) < batch_size:
+            break
+        last_id = apiresponse.data[-1]["id"]
+    return rows
+
+
+# liked/saved post ids per recently active user, kept current by
+# interactions_changed() so a like shows up in the next page right away
+interaction_state = InteractionState(
+    load_user_interactions,
+    maxsize=int(os.getenv("USER_STATE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_STATE_TTL", "300")),
+)
+# pages with per-user flags must not be stored by shared caches
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+# copies of rows with the caller's liked_by_me/saved_by_me flags; cached
+# rows are shared between users and stay untouched
+async def with_flags(rows: list[dict], user) -> list[dict]:
+    state = await interaction_state.get(user.id)
+    return [
+        {
+            **row,
+            "liked_by_me": state.has("like", row["id"]),
+            "saved_by_me": state.has("save", row["id"]),
+        }
+        for row in rows
+    ]
+
+
+# a cached {"data": [...]} page as is for anonymous callers, or re-rendered
+# with the caller's flags (and its own ETag) for signed-in ones
+async def page_response(
+    request: Request, page: Rendered, cache_control: str, user
+) -> Response:
+    if user is not None:
+        data = await with_flags(page.content["data"], user)
+        page = render({**page.content, "data": data})
+        cache_control = PRIVATE_REVALIDATE
+    response = conditional_response(request, page, cache_control)
+    response.headers["Vary"] = "Authorization"
+    return response
+
+
 """
 main entities
 """
 
 
-# endpoint to get all posts
+def check_include(include: str | None) -> None:
+    if include not in (None, "username"):
+        raise HTTPException(
+            status_code=400, detail='Only "username" can be included'
+        )
+
+
+# resolves many posts with one in_() query, returned in the order asked
+# as a rendered {"data": [...]} page
+async def get_posts_by_ids(
+    post_ids: list[int], columns: str = "*"
+) -> Rendered:
+    async def load_posts():
+        apiresponse = await execute(
+            supabase.table("posts").select(columns).in_("id", post_ids)
+        )
+        rows = {row["id"]: row for row in apiresponse.data}
+        data = flatten_username([rows[i] for i in post_ids if i in rows])
+        return render({"data": data, "next_cursor": None})
+
+    return await cache.get_or_load(
+        ("posts", tuple(post_ids), columns),
+        load_posts,
+        tags=page_tags(first_page=False),
+    )
+
+
+# endpoint to get posts, newest first, one keyset page at a time, or a
+# specific set of posts with ?ids=1,2,3. ?fields=id,title,thumbnail_url
+# returns only those columns. signed-in callers also get liked_by_me and
+# saved_by_me on every post
 @app.get("/posts")
-def get_all_posts():
-    apiresponse = supabase.table("posts").select("*").execute()
-    return apiresponse.data
+async def get_all_posts(
+    request: Request,
+    user: optional_user_deps,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    ids: str | None = None,
+    include: str | None = None,
+    fields: str | None = None,
+):
+    check_include(include)
+    if ids is not None:
+        columns = select_columns("posts", fields, include)
+        page = await get_posts_by_ids(parse_ids(ids), columns)
+        return await page_response(
+            request, page, OLDER_PAGES_CACHE_CONTROL, user
+        )
+
+    # the cursor is built from the last row's sort key
+    columns = select_columns("posts", fields, include, ("id", "created_at"))
+    if cursor:
+        created_at, post_id = decode_cursor(cursor, iso_timestamp, int)
+
+    async def load_page():
+        query = (
+            supabase.table("posts")
+            .select(columns)
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            # fetch one extra row to know whether another page exists
+            .limit(limit + 1)
+        )
+        if cursor:
+            # the lte bound keeps this an index range scan on
+            # idx_posts_created_at; the or() breaks ties on id
+            query = query.lte("created_at", created_at).or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{post_id})'
+            )
+        apiresponse = await execute(query)
+        rows = flatten_username(apiresponse.data)
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return render({"data": rows[:limit], "next_cursor": next_cursor})
+
+    page = await cache.get_or_load(
+        ("posts", limit, cursor, columns),
+        load_page,
+        tags=page_tags(first_page=cursor is None),
+    )
+    return await page_response(
+        request,
+        page,
+        OLDER_PAGES_CACHE_CONTROL if cursor else REVALIDATE,
+        user,
+    )
 
 
 # endpoint to get one username by post id
 @app.get("/username/{post_id}")
-def get_username_by_post_id(post_id: int):
-    apiresponse = (
-        supabase.table("posts")
-        .select("*,profiles(username)")
-        .eq("id", post_id)
-        .execute()
+async def get_username_by_post_id(post_id: int, request: Request):
+    async def load_username():
+        apiresponse = await execute(
+            supabase.table("posts")
+            .select("*,profiles(username)")
+            .eq("id", post_id)
+        )
+        if not apiresponse.data:
+            # raised rather than cached, so a post created in the
+            # meantime is found by the next request
+            raise HTTPException(status_code=404, detail="Post not found")
+        return render(apiresponse.data[0]["profiles"]["username"])
+
+    username = await cache.get_or_load(("username", post_id), load_username)
+    return conditional_response(request, username, USERNAME_CACHE_CONTROL)
+
+
+# PostgREST filter value, quoted so commas and parentheses in URLs survive
+def filter_value(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+# the id of a stored post with the same normalized URL or the same title and
+# content. only posts the Bloom filter can't rule out cost a query, once it
+# holds every stored post: after the feed has loaded, and with several
+# workers only if they share their writes
+async def find_duplicate(post: dict) -> int | None:
+    complete = startup["feed_loaded"] and not (
+        STATE_BACKEND == "local" and MULTIPLE_WORKERS
+    )
+    if complete and not any(key in article_filter for key in post_keys(post)):
+        return None
+    conditions = [f"url_key.eq.{filter_value(post['url_key'])}"]
+    if post["fingerprint"]:
+        conditions.append(f"fingerprint.eq.{post['fingerprint']}")
+    apiresponse = await execute(
+        supabase.table("posts").select("id").or_(",".join(conditions)).limit(1)
     )
-    if apiresponse.data:
-        return apiresponse.data[0]["profiles"]["username"]
-    else:
-        raise HTTPException(status_code=404, detail="Post not found")
+    return apiresponse.data[0]["id"] if apiresponse.data else None
 
 
-# endpoint to create a new post with validation
+# endpoint to create a new post with validation; an article that was
+# already posted (under any of its URLs) is rejected with 409
 @app.post("/posts")
-def create_post(post: dict, auth_response: auth_deps):
+async def create_post(post: dict, auth_response: auth_deps):
     required = ["title", "content", "article_url"]
     for field in required:
         if field not in post:
@@ -84,24 +910,40 @@ def create_post(post: dict, auth_response: auth_deps):
                 status_code=400, detail=f'Missing required "{field}" field'
             )
     post["user_id"] = auth_response["user"].id
+    # written by the summary workers
+    post.pop("summary", None)
+    post["url_key"] = normalize_url(post["article_url"])
+    post["fingerprint"] = fingerprint(post["title"], post["content"])
+    duplicate = await find_duplicate(post)
+    if duplicate is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Article already posted as post {duplicate}",
+        )
     user_client = auth_response["client"]
-    apiresponse = user_client.table("posts").insert(post).execute()
+    try:
+        apiresponse = await execute(user_client.table("posts").insert(post))
+    except APIError as e:
+        # lost a race with another insert of the same URL
+        if e.code != "23505":
+            raise
+        raise HTTPException(status_code=409, detail="Article already posted")
+    posts_created(apiresponse.data)
     return apiresponse.data
 
 
 # endpoint to update post title by id
 @app.put("/posts/{post_id}")
-def update_post_title(
+async def update_post_title(
     post_id: int, updated_title: str, auth_response: auth_deps
 ):
     user_client = auth_response["client"]
     # check if post exists
     try:
-        apiresponse = (
+        apiresponse = await execute(
             user_client.table("posts")
             .update({"title": updated_title})
             .eq("id", post_id)
-            .execute()
         )
     except Exception as e:
         raise HTTPException(
@@ -111,16 +953,17 @@ def update_post_title(
         raise HTTPException(
             status_code=404, detail="Post not found or unauthorized"
         )
+    posts_updated(apiresponse.data)
     return apiresponse.data
 
 
 # endpoint to delete post by id
 @app.delete("/posts/{post_id}")
-def delete_post(post_id: int, auth_response: auth_deps):
+async def delete_post(post_id: int, auth_response: auth_deps):
     user_client = auth_response["client"]
     try:
-        apiresponse = (
-            user_client.table("posts").delete().eq("id", post_id).execute()
+        apiresponse = await execute(
+            user_client.table("posts").delete().eq("id", post_id)
         )
     except Exception as e:
         raise HTTPException(
@@ -130,16 +973,17 @@ def delete_post(post_id: int, auth_response: auth_deps):
         raise HTTPException(
             status_code=404, detail="Post not found or unauthorized"
         )
+    post_deleted(post_id)
     return apiresponse.data
 
 
 # endpoint to create a new interaction
 @app.post("/interactions")
-def create_interaction(interaction: dict, auth_response: auth_deps):
+async def create_interaction(interaction: dict, auth_response: auth_deps):
     user_client = auth_response["client"]
     try:
-        apiresponse = (
-            user_client.table("interactions").insert(interaction).execute()
+        apiresponse = await execute(
+            user_client.table("interactions").insert(interaction)
         )
     except Exception as e:
         raise HTTPException(
@@ -149,39 +993,177 @@ def create_interaction(interaction: dict, auth_response: auth_deps):
         raise HTTPException(
             status_code=400, detail="Invalid interaction or unauthorized"
         )
+    interactions_changed(apiresponse.data, 1)
     return apiresponse.data
 
 
-@app.get("/interactions/{post_id}")
-def get_interactions_by_post_id(post_id: int):
+# endpoint to like/save many posts at once; already existing interactions
+# are reported as such instead of failing the batch
+@app.post("/interactions/batch")
+async def create_interactions_batch(
+    interactions: list[dict], auth_response: auth_deps
+):
+    if not interactions or len(interactions) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Between 1 and {MAX_PAGE_SIZE} interactions are allowed",
+        )
+    user_id = auth_response["user"].id
+    results = []
+    rows = {}
+    for item in interactions:
+        post_id = item.get("post_id")
+        interaction_type = item.get("interaction_type")
+        if not is_id(post_id) or interaction_type not in ("like", "save"):
+            results.append({**item, "status": "invalid"})
+            continue
+        key = (post_id, interaction_type)
+        rows[key] = {
+            "user_id": user_id,
+            "post_id": post_id,
+            "interaction_type": interaction_type,
+        }
+        results.append(
+            {"post_id": post_id, "interaction_type": interaction_type}
+        )
+
+    created = {}
+    missing = set()
+    user_client = auth_response["client"]
+    # one post that doesn't exist (or was deleted meanwhile) fails the
+    # whole insert: those items are reported as not_found and the rest
+    # inserted again, once
+    for attempt in range(2):
+        if not rows:
+            break
+        try:
+            # ON CONFLICT DO NOTHING: only newly inserted rows come back
+            apiresponse = await execute(
+                user_client.table("interactions").upsert(
+                    list(rows.values()),
+                    on_conflict="user_id,post_id,interaction_type",
+                    ignore_duplicates=True,
+                )
+            )
+        except Exception as e:
+            if attempt or getattr(e, "code", None) != "23503":
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Error creating interactions: {str(e)}",
+                )
+            missing = await missing_posts({post_id for post_id, _ in rows})
+            rows = {
+                key: row for key, row in rows.items() if key[0] not in missing
+            }
+            continue
+        created = {
+            (row["post_id"], row["interaction_type"]): row
+            for row in apiresponse.data
+        }
+        interactions_changed(apiresponse.data, 1)
+        break
+
+    for result in results:
+        if "status" in result:
+            continue
+        key = (result["post_id"], result["interaction_type"])
+        row = created.pop(key, None)
+        if row is not None:
+            result.update(row, status="created")
+        elif key[0] in missing:
+            result["status"] = "not_found"
+        else:
+            result["status"] = "exists"
+    return results
+
+
+# the ids of post_ids that have no post
+async def missing_posts(post_ids: set[int]) -> set[int]:
     try:
-        apiresponse = (
-            supabase.table("interactions")
-            .select("*")
-            .eq("post_id", post_id)
-            .execute()
+        apiresponse = await execute(
+            supabase.table("posts").select("id").in_("id", list(post_ids))
         )
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Error getting interactions: {str(e)}"
+            status_code=500, detail=f"Error getting posts: {str(e)}"
         )
-    if not apiresponse.data:
+    return post_ids - {row["id"] for row in apiresponse.data}
+
+
+@app.get("/interactions/{post_id}")
+async def get_interactions_by_post_id(
+    post_id: int, request: Request, fields: str | None = None
+):
+    columns = select_columns("interactions", fields)
+
+    async def load_interactions():
+        try:
+            apiresponse = await execute(
+                supabase.table("interactions")
+                .select(columns)
+                .eq("post_id", post_id)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error getting interactions: {str(e)}",
+            )
+        return render(apiresponse.data)
+
+    # empty results are cached too and dropped by the next interaction
+    interactions = await cache.get_or_load(
+        ("interactions", post_id, columns),
+        load_interactions,
+        tags=lambda rows: [f"interactions:{post_id}"],
+    )
+    if not interactions.content:
         raise HTTPException(
             status_code=404, detail="Interactions not found or unauthorized"
         )
-    return apiresponse.data
+    return conditional_response(request, interactions, REVALIDATE)
+
+
+# endpoint to get like/save counts for many posts in one call
+@app.get("/counts")
+async def get_counts(post_ids: str, request: Request):
+    ids = parse_ids(post_ids)
+
+    async def load_counts():
+        try:
+            apiresponse = await execute(
+                supabase.table("post_stats")
+                .select("post_id,like_count,save_count")
+                .in_("post_id", ids)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error getting counts: {str(e)}"
+            )
+        counts = {
+            post_id: {"like_count": 0, "save_count": 0} for post_id in ids
+        }
+        for row in apiresponse.data:
+            counts[row["post_id"]] = {
+                "like_count": row["like_count"],
+                "save_count": row["save_count"],
+            }
+        return render(counts)
+
+    counts = await cache.get_or_load(
+        ("counts", tuple(sorted(ids))),
+        load_counts,
+        tags=lambda counts: (f"counts:{i}" for i in counts.content),
+    )
+    return conditional_response(request, counts, REVALIDATE)
 
 
 # endpoint to delete an interaction
 @app.delete("/interactions/{interaction_id}")
-def delete_interaction(interaction_id: int, auth_response: auth_deps):
+async def delete_interaction(interaction_id: int, auth_response: auth_deps):
     user_client = auth_response["client"]
     try:
-        apiresponse = (
-            user_client.table("interactions")
-            .delete()
-            .eq("id", interaction_id)
-            .execute()
+        apiresponse = await execute(
+            user_client.table("interactions").delete().eq("id", interaction_id)
         )
     except Exception as e:
         raise HTTPException(
@@ -191,17 +1173,576 @@ def delete_interaction(interaction_id: int, auth_response: auth_deps):
         raise HTTPException(
             status_code=404, detail="Interaction not found or unauthorized"
         )
+    interactions_changed(apiresponse.data, -1)
     return apiresponse.data
 
 
+# endpoint to get the ranked feed, best first; include=posts adds the
+# full post rows. signed-in callers also get liked_by_me and saved_by_me
+@app.get("/feed")
+async def get_feed(
+    user: optional_user_deps,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    include: str | None = None,
+):
+    if include not in (None, "posts"):
+        raise HTTPException(
+            status_code=400, detail='Only "posts" can be included'
+        )
+    after = decode_cursor(cursor, float, int) if cursor else None
+    items = feed.page(limit, after)
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor(items[-1]["score"], items[-1]["id"])
+    if include and items:
+        posts = await get_posts_by_ids([item["id"] for item in items])
+        rows = {row["id"]: row for row in posts.content["data"]}
+        for item in items:
+            item["post"] = rows.get(item["id"])
+    if user is not None:
+        # feed items are built per request, so no copies are needed
+        state = await interaction_state.get(user.id)
+        for item in items:
+            item["liked_by_me"] = state.has("like", item["id"])
+            item["saved_by_me"] = state.has("save", item["id"])
+    return FastJSONResponse(
+        {"data": items, "next_cursor": next_cursor},
+        headers={"Vary": "Authorization"},
+    )
+
+
+# endpoint to check the feed engine's size and weights
+@app.get("/feed/stats")
+async def get_feed_stats():
+    return feed.stats()
+
+
+"""
+trending
+"""
+
+
+# likes and saves per post within the last hour and day, counted in memory
+# by the interaction write hooks; loaded at startup from the interactions
+# made within the longest window
+trending = TrendingPosts(
+    max_k=MAX_PAGE_SIZE,
+    refresh=float(os.getenv("TRENDING_REFRESH", "1")),
+)
+
+
+# interactions newer than the longest window, oldest first, in pages
+# keyed on (created_at, id): range scans on idx_interactions_created_at
+async def trending_pages(batch_size: int = 1000):
+    created_at = datetime.fromtimestamp(
+        time.time() - trending.horizon, timezone.utc
+    ).isoformat()
+    last_id = 0
+    while True:
+        apiresponse = await execute(
+            supabase.table("interactions")
+            .select("id,post_id,interaction_type,created_at")
+            .gte("created_at", created_at)
+            .or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt.{last_id})'
+            )
+            .order("created_at")
+            .order("id")
+            .limit(batch_size)
+        )
+        yield apiresponse.data
+        if len(apiresponse.data) < batch_size:
+            break
+        created_at = apiresponse.data[-1]["created_at"]
+        last_id = apiresponse.data[-1]["id"]
+
+
+# endpoint to get the posts with the most likes and saves received within
+# the last hour (window=1h) or day (window=24h), served from memory;
+# include=posts adds the full post rows
+@app.get("/trending")
+async def get_trending(
+    window: str = "1h",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include: str | None = None,
+):
+    if window not in trending.windows:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown window: {window}. "
+            f"Allowed: {', '.join(trending.windows)}",
+        )
+    if include not in (None, "posts"):
+        raise HTTPException(
+            status_code=400, detail='Only "posts" can be included'
+        )
+    items = trending.top(window, limit)
+    if include and items:
+        posts = await get_posts_by_ids([item["post_id"] for item in items])
+        rows = {row["id"]: row for row in posts.content["data"]}
+        for item in items:
+            item["post"] = rows.get(item["post_id"])
+    return {"window": window, "data": items}
+
+
+# endpoint to check the trending counters' size and activity
+@app.get("/trending/stats")
+async def get_trending_stats():
+    return trending.stats()
+
+
+"""
+search
+"""
+
+
+# "postgres" ranks with the search_posts() function in sql/schema.sql;
+# "memory" keeps a BM25 index in process, for databases without that
+# migration (or a local stand-in)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "postgres")
+search_index = SearchIndex()
+
+
+# (post id, rank) pairs, best first, after the previous page's cursor
+async def find_matches(
+    query: str, limit: int, after: tuple[float, int] | None
+) -> list[tuple[int, float]]:
+    if SEARCH_BACKEND == "memory":
+        return search_index.search(query, limit, after)
+    params = {"query": query, "page_size": limit}
+    if after is not None:
+        params.update(after_rank=after[0], after_id=after[1])
+    apiresponse = await execute(supabase.rpc("search_posts", params))
+    return [(row["id"], row["rank"]) for row in apiresponse.data]
+
+
+# endpoint to search post titles and content, best match first, one
+# keyset page at a time; fields=, include= and the signed-in flags work
+# as on /posts
+@app.get("/search")
+async def search_posts(
+    request: Request,
+    user: optional_user_deps,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    fields: str | None = None,
+    include: str | None = None,
+):
+    check_include(include)
+    columns = select_columns("posts", fields, include)
+    after = decode_cursor(cursor, float, int) if cursor else None
+
+    async def load_results():
+        try:
+            matches = await find_matches(q, limit, after)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error searching posts: {str(e)}"
+            )
+        next_cursor = None
+        if len(matches) == limit:
+            post_id, rank = matches[-1]
+            next_cursor = encode_cursor(rank, post_id)
+        rows = {}
+        if matches:
+            posts = await get_posts_by_ids([m[0] for m in matches], columns)
+            rows = {row["id"]: row for row in posts.content["data"]}
+        data = [
+            {**rows[post_id], "rank": rank}
+            for post_id, rank in matches
+            if post_id in rows
+        ]
+        return render({"data": data, "next_cursor": next_cursor})
+
+    # new and edited posts can change any result set, so they drop every
+    # cached search (tag "search"); deletes only drop pages they were on
+    page = await cache.get_or_load(
+        ("search", q, limit, cursor, columns),
+        load_results,
+        tags=page_tags(False, "search"),
+    )
+    return await page_response(request, page, REVALIDATE, user)
+
+
+"""
+views
+"""
+
+
+async def flush_views(batch: dict[int, int]) -> None:
+    await execute(
+        supabase.rpc(
+            "increment_view_counts",
+            {"post_ids": list(batch), "deltas": list(batch.values())},
+        )
+    )
+    views_flushed(batch)
+
+
+# cached pages may show view counts up to CACHE_TTL old; invalidating on
+# every flush would empty the cache at feed scroll rates
+view_buffer = ViewBuffer(
+    flush_views,
+    interval=float(os.getenv("VIEW_FLUSH_INTERVAL", "5")),
+    max_posts=int(os.getenv("VIEW_BUFFER_SIZE", "10000")),
+)
+
+
+# endpoint to record feed impressions; views are buffered and written in
+# batches, so this never waits on the database
+@app.post("/views", status_code=202)
+async def record_views(views: dict):
+    post_ids = views.get("post_ids")
+    if not isinstance(post_ids, list) or not post_ids:
+        raise HTTPException(
+            status_code=400, detail='Missing required "post_ids" field'
+        )
+    if len(post_ids) > MAX_PAGE_SIZE or not all(map(is_id, post_ids)):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Up to {MAX_PAGE_SIZE} positive integer post ids "
+            "are allowed",
+        )
+    accepted = sum(view_buffer.record(post_id) for post_id in post_ids)
+    return {"accepted": accepted}
+
+
+# endpoint to check buffered and flushed view counts
+@app.get("/views/stats")
+async def get_view_stats():
+    return view_buffer.stats()
+
+
+"""
+summaries
+"""
+
+
+async def lookup_summaries(hashes: list[str]) -> dict[str, str]:
+    response = await execute(
+        supabase.table("summaries")
+        .select("content_hash,summary")
+        .in_("content_hash", hashes)
+    )
+    return {row["content_hash"]: row["summary"] for row in response.data}
+
+
+async def write_summaries(rows: list[dict]) -> None:
+    await execute(supabase.rpc("store_summaries", {"items": rows}))
+    cache.invalidate_tag(*(f"post:{row['post_id']}" for row in rows))
+
+
+# new posts are summarized in the background, never in create_post.
+# SUMMARY_PROCESSES worker processes run the summarizer (0 runs it on the
+# event loop's thread pool instead); SUMMARY_WORKERS batches of up to
+# SUMMARY_BATCH_SIZE posts are in flight at a time
+SUMMARY_PROCESSES = int(os.getenv("SUMMARY_PROCESSES", "1"))
+summary_pool = (
+    ProcessPoolExecutor(SUMMARY_PROCESSES) if SUMMARY_PROCESSES else None
+)
+summary_queue = SummaryQueue(
+    summarize_batch,
+    write_summaries,
+    lookup_summaries,
+    executor=summary_pool,
+    workers=int(os.getenv("SUMMARY_WORKERS", "2")),
+    batch_size=int(os.getenv("SUMMARY_BATCH_SIZE", "16")),
+    max_queue=int(os.getenv("SUMMARY_QUEUE_SIZE", "10000")),
+    flush_interval=float(os.getenv("SUMMARY_FLUSH_INTERVAL", "1")),
+    cache_size=int(os.getenv("SUMMARY_CACHE_SIZE", "10000")),
+)
+
+
+# endpoint to check the summary queue and its cache
+@app.get("/summaries/stats")
+async def get_summary_stats():
+    return summary_queue.stats()
+
+
+"""
+analytics
+"""
+
+
+# dashboards read the trigger-maintained counters in profile_stats and
+# post_stats (sql/schema.sql), never posts or interactions themselves.
+# answers are cached for CACHE_TTL seconds; writes don't invalidate them
+STATS_CACHE_CONTROL = f"public, max-age={int(cache.ttl)}"
+CREATOR_STATS_COLUMNS = (
+    "user_id,post_count,like_count,save_count,view_count,engagement"
+)
+CREATOR_SORTS = {
+    "posts": "post_count",
+    "likes": "like_count",
+    "saves": "save_count",
+    "views": "view_count",
+    "engagement": "engagement",
+}
+POST_SORTS = {
+    "engagement": "engagement",
+    "likes": "like_count",
+    "saves": "save_count",
+}
+
+
+def sort_column(sort: str, sorts: dict[str, str]) -> str:
+    if sort not in sorts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sort: {sort}. Allowed: {', '.join(sorts)}",
+        )
+    return sorts[sort]
+
+
+async def load_totals() -> dict:
+    apiresponse = await execute(supabase.rpc("stats_totals", {}))
+    row = apiresponse.data[0] if apiresponse.data else {}
+    return {
+        "users": row.get("users", 0),
+        "posts": row.get("posts", 0),
+        "views": row.get("views", 0),
+        "interactions": {
+            "like": row.get("likes", 0),
+            "save": row.get("saves", 0),
+        },
+    }
+
+
+async def load_top_creators(column: str, limit: int) -> list[dict]:
+    apiresponse = await execute(
+        supabase.table("profile_stats")
+        .select(f"{CREATOR_STATS_COLUMNS},profiles(username)")
+        .order(column, desc=True)
+        .order("user_id")
+        .limit(limit)
+    )
+    return flatten_username(apiresponse.data)
+
+
+async def load_top_posts(column: str, limit: int) -> list[dict]:
+    apiresponse = await execute(
+        supabase.table("post_stats")
+        .select(
+            "post_id,like_count,save_count,engagement,"
+            "posts(title,article_url,user_id,view_count)"
+        )
+        .order(column, desc=True)
+        .order("post_id", desc=True)
+        .limit(limit)
+    )
+    rows = apiresponse.data
+    for row in rows:
+        row.update(row.pop("posts", None) or {})
+    return rows
+
+
+# endpoint for the dashboard overview: app-wide totals, with interactions
+# by type, plus the top creators by posts and top posts by engagement
+@app.get("/stats")
+async def get_stats(
+    request: Request, top: int = Query(10, ge=1, le=MAX_PAGE_SIZE)
+):
+    async def load_stats():
+        try:
+            totals, creators, posts = await asyncio.gather(
+                load_totals(),
+                load_top_creators("post_count", top),
+                load_top_posts("engagement", top),
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error getting stats: {str(e)}"
+            )
+        return render(
+            {"totals": totals, "top_creators": creators, "top_posts": posts}
+        )
+
+    stats = await cache.get_or_load(("stats", top), load_stats)
+    return conditional_response(request, stats, STATS_CACHE_CONTROL)
+
+
+# endpoint to rank creators by posts, likes, saves, views or engagement
+# (likes + saves) received
+@app.get("/stats/creators")
+async def get_creator_stats(
+    request: Request,
+    sort: str = "posts",
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+):
+    column = sort_column(sort, CREATOR_SORTS)
+
+    async def load_creators():
+        try:
+            rows = await load_top_creators(column, limit)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error getting creator stats: {str(e)}",
+            )
+        return render({"data": rows})
+
+    creators = await cache.get_or_load(
+        ("stats", "creators", column, limit), load_creators
+    )
+    return conditional_response(request, creators, STATS_CACHE_CONTROL)
+
+
+# endpoint to rank posts by engagement, likes or saves
+@app.get("/stats/posts")
+async def get_post_stats(
+    request: Request,
+    sort: str = "engagement",
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+):
+    column = sort_column(sort, POST_SORTS)
+
+    async def load_posts():
+        try:
+            rows = await load_top_posts(column, limit)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error getting post stats: {str(e)}"
+            )
+        return render({"data": rows})
+
+    posts = await cache.get_or_load(
+        ("stats", "posts", column, limit), load_posts
+    )
+    return conditional_response(request, posts, STATS_CACHE_CONTROL)
+
+
+# endpoint to get one user's post count and the engagement and views
+# their posts received
+@app.get("/stats/users/{user_id}")
+async def get_user_stats(user_id: UUID, request: Request):
+    async def load_user():
+        try:
+            apiresponse = await execute(
+                supabase.table("profile_stats")
+                .select(f"{CREATOR_STATS_COLUMNS},profiles(username)")
+                .eq("user_id", str(user_id))
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error getting user stats: {str(e)}"
+            )
+        rows = flatten_username(apiresponse.data)
+        return render(rows[0] if rows else None)
+
+    stats = await cache.get_or_load(("stats", "user", user_id), load_user)
+    if stats.content is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return conditional_response(request, stats, STATS_CACHE_CONTROL)
+
+
+"""
+events
+"""
+
+
+# new posts, edits, deletes and like/save deltas pushed to connected
+# clients as they happen, so open sessions don't have to poll for them
+event_hub = EventHub(
+    queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")),
+    replay_size=int(os.getenv("EVENTS_REPLAY_SIZE", "1000")),
+    keepalive=float(os.getenv("EVENTS_KEEPALIVE", "15")),
+    max_subscribers=int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "50000")),
+)
+EVENT_TOPICS = {"posts", "counts"}
+# enough of a new post to show it; the rest is a GET /posts?ids= away
+EVENT_POST_COLUMNS = (
+    "id",
+    "user_id",
+    "title",
+    "article_url",
+    "thumbnail_url",
+    "created_at",
+)
+
+
+# uvicorn waits for open connections to close before it runs the lifespan
+# shutdown, and an event stream only ends when its client goes away, so a
+# single subscriber would hold up SIGTERM (and the final view and summary
+# flushes) for good. the streams are ended as soon as the server is told
+# to exit instead; clients reconnect to another worker with Last-Event-ID.
+# returns the handlers it replaced
+def end_streams_on_exit() -> dict:
+    # signals can only be handled in the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    loop = asyncio.get_running_loop()
+    replaced = {}
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        handler = signal.getsignal(sig)
+        if not callable(handler):
+            continue
+
+        def on_exit(signum, frame, handler=handler):
+            loop.call_soon_threadsafe(event_hub.close)
+            handler(signum, frame)
+
+        replaced[sig] = signal.signal(sig, on_exit)
+    return replaced
+
+
+# endpoint to subscribe to server-sent events: topics=posts for
+# post_created/post_updated/post_deleted, topics=counts for every post's
+# like/save deltas, and post_ids=1,2,3 for just those posts' events
+@app.get("/events")
+async def stream_events(
+    request: Request, topics: str | None = None, post_ids: str | None = None
+):
+    subscribed = set(filter(None, (topics or "").split(",")))
+    unknown = subscribed - EVENT_TOPICS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown topics: {', '.join(sorted(unknown))}. "
+            f"Allowed: {', '.join(sorted(EVENT_TOPICS))}",
+        )
+    if post_ids:
+        subscribed.update(f"post:{post_id}" for post_id in parse_ids(post_ids))
+    if not subscribed:
+        subscribed.add("posts")
+    if event_hub.full:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many event subscribers",
+            headers={"Retry-After": "5"},
+        )
+    subscription = event_hub.subscribe(
+        subscribed, request.headers.get("last-event-id")
+    )
+    return StreamingResponse(
+        event_hub.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# endpoint to check event subscribers and delivery
+@app.get("/events/stats")
+async def get_event_stats():
+    return event_hub.stats()
+
+
 """
 auth
 """
 
 
+# endpoint to check how many requests were authenticated from the cache
+@app.get("/auth/stats")
+async def get_auth_stats():
+    return token_verifier.stats()
+
+
 # endpoint to sign up new user
 @app.post("/signup")
-def sign_up_user(credentials: dict):
+async def sign_up_user(credentials: dict):
     required = ["email", "password", "username"]
     for field in required:
         if field not in credentials:
@@ -210,11 +1751,15 @@ def sign_up_user(credentials: dict):
             )
 
     # create user in auth
-    auth_response = supabase.auth.sign_up(
-        {
-            "email": credentials["email"],
-            "password": credentials["password"],
-        }
+    auth_response = await upstream(
+        auth_client.sign_up(
+            {
+                "email": credentials["email"],
+                "password": credentials["password"],
+            }
+        ),
+        "auth",
+        "sign_up",
     )
     if auth_response.user is None:
         raise HTTPException(status_code=400, detail="Error creating user")
@@ -225,13 +1770,15 @@ def sign_up_user(credentials: dict):
         "email": credentials["email"],
         "username": credentials["username"],
     }
-    profile_response = supabase.table("profiles").insert(profile).execute()
+    profile_response = await execute(
+        supabase.table("profiles").insert(profile)
+    )
     return {"auth": auth_response.user, "profile": profile_response.data}
 
 
 # endpoint to log in user
 @app.post("/login")
-def log_in_user(credentials: dict):
+async def log_in_user(credentials: dict):
     required = ["email", "password"]
     for field in required:
         if field not in credentials:
@@ -239,16 +1786,179 @@ def log_in_user(credentials: dict):
                 status_code=400, detail=f'Missing required "{field}" field'
             )
 
-    auth_response = supabase.auth.sign_in_with_password(
-        {
-            "email": credentials["email"],
-            "password": credentials["password"],
-        }
+    auth_response = await upstream(
+        auth_client.sign_in_with_password(
+            {
+                "email": credentials["email"],
+                "password": credentials["password"],
+            }
+        ),
+        "auth",
+        "sign_in_with_password",
     )
     if auth_response.user is None:
-        raise HTTPException(status_code=401, detail="Invalid email or password")
+        raise HTTPException(
+            status_code=401, detail="Invalid email or password"
+        )
     return {
         "user": auth_response.user,
         "session": auth_response.session,
         "access_token": auth_response.session.access_token,
     }
+
+
+"""
+metrics
+"""
+
+
+# the counters behind the /.../stats endpoints, as gauges
+@registry.collector
+def collect_stats():
+    sources = {
+        "cache": cache.stats(),
+        "auth": token_verifier.stats(),
+        "views": view_buffer.stats(),
+        "summaries": summary_queue.stats(),
+        "events": event_hub.stats(),
+        "shared_state": shared_state.stats(),
+        "feed": {"posts": len(feed)},
+        "trending": trending.stats(),
+        "dedup": article_filter.stats(),
+        "search_index": search_index.stats(),
+        "user_state": interaction_state.stats(),
+        "upstream_limiter": upstream_limiter.stats(),
+        "admission": {
+            f"{outcome}_{kind}": count
+            for outcome in ("admitted", "limited", "shed")
+            for kind, count in getattr(admission, outcome).items()
+        },
+        "user_clients": user_clients.stats(),
+    }
+    return {
+        f"{source}_{name}": (f"{source} {name}", value)
+        for source, stats in sources.items()
+        for name, value in stats.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+# endpoint for Prometheus to scrape
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+# endpoint to check rate limits, shed requests and the upstream queue
+@app.get("/admission/state")
+async def get_admission_state():
+    return admission.stats()
+
+
+"""
+health
+"""
+
+
+# how far startup has got, reported by /readyz
+startup = {
+    "complete": False,
+    "feed_loaded": False,
+    "trending_loaded": False,
+    "clients_seconds": None,
+    "feed_seconds": None,
+    "warmed_connections": 0,
+}
+process_started = time.time()
+
+
+async def load_initial_feed() -> None:
+    started = time.perf_counter()
+    try:
+        await load_feed()
+        startup["feed_loaded"] = True
+    except Exception:
+        # serve an empty feed rather than never become ready
+        logger.exception("Failed to load the feed")
+    try:
+        await trending.load(trending_pages())
+        startup["trending_loaded"] = True
+    except Exception:
+        # trending fills up from new interactions instead
+        logger.exception("Failed to load trending posts")
+    startup["feed_seconds"] = time.perf_counter() - started
+    startup["complete"] = True
+
+
+# upstream reachability for /readyz, rechecked at most every
+# READY_CHECK_INTERVAL seconds so frequent probes don't add load
+READY_CHECK_INTERVAL = float(os.getenv("READY_CHECK_INTERVAL", "5"))
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "2"))
+last_upstream_check: tuple[float, dict] | None = None
+
+
+async def check_upstream() -> dict:
+    global last_upstream_check
+    now = time.monotonic()
+    if (
+        last_upstream_check
+        and now - last_upstream_check[0] < READY_CHECK_INTERVAL
+    ):
+        return last_upstream_check[1]
+
+    async def auth_health():
+        response = await http_pool.get(
+            f"{SUPABASE_URL}/auth/v1/health",
+            headers={"apiKey": SUPABASE_ANON_KEY},
+        )
+        response.raise_for_status()
+
+    async def probe(call) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(call, READY_CHECK_TIMEOUT)
+            result = {"ok": True}
+        except Exception as e:
+            result = {"ok": False, "error": str(e) or type(e).__name__}
+        result["latency_ms"] = (time.perf_counter() - started) * 1000
+        return result
+
+    database, auth = await asyncio.gather(
+        probe(execute(supabase.table("posts").select("id").limit(1))),
+        probe(upstream(auth_health(), "auth", "health")),
+    )
+    checks = {"database": database, "auth": auth}
+    last_upstream_check = (now, checks)
+    return checks
+
+
+# endpoint for liveness probes: answers without touching upstream
+@app.get("/healthz")
+async def get_health():
+    return {
+        "status": "ok",
+        "uptime_seconds": time.time() - process_started,
+        "pool": pool_stats(http_pool) if http_pool is not None else {},
+        "upstream_in_flight": upstream_in_flight.value,
+    }
+
+
+# endpoint for readiness probes: 503 until startup has finished and while
+# the database or auth server can't be reached
+@app.get("/readyz")
+async def get_readiness():
+    upstream_checks = await check_upstream() if supabase is not None else {}
+    ready = startup["complete"] and all(
+        check["ok"] for check in upstream_checks.values()
+    )
+    return FastJSONResponse(
+        {
+            "ready": ready,
+            "startup": startup,
+            "upstream": upstream_checks,
+            "pool": pool_stats(http_pool) if http_pool is not None else {},
+        },
+        status_code=200 if ready else 503,
+    )
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+
+# minimal user object for locally verified tokens; exposes the same `.id`
+# the endpoints read from the remote supabase user
+@dataclass(frozen=True)
+class TokenUser:
+    id: str
+    email: str | None = None
+    role: str | None = None
+    claims: dict = field(default_factory=dict, repr=False)
+
+
+# expiry-aware LRU cache of verified users keyed by sha256(token), so raw
+# tokens never sit in memory longer than the request that carried them
+class TokenCache:
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # the cached user without counting a hit or miss or refreshing it
+    def peek(self, token: str):
+        with self._lock:
+            entry = self._entries.get(self.key(token))
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def set(self, token: str, user, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# verified users in a store every worker shares (see shared_state.py), so
+# a token is checked once rather than once per worker; most useful when
+# that check is a call to the auth server. users come back as TokenUser
+class SharedTokenStore:
+    def __init__(self, state, prefix: str = "token:"):
+        self.state = state
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, token: str) -> tuple[TokenUser, float] | None:
+        try:
+            data = await self.state.get(self.prefix + TokenCache.key(token))
+        except Exception:
+            self.errors += 1
+            logger.exception("Failed to read a shared token")
+            return None
+        entry = json.loads(data) if data else None
+        if entry is None or entry["expires_at"] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        expires_at = entry.pop("expires_at")
+        return TokenUser(**entry), expires_at
+
+    async def set(self, token: str, user, expires_at: float) -> None:
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return
+        entry = {
+            "id": str(user.id),
+            "email": getattr(user, "email", None),
+            "role": getattr(user, "role", None),
+            "expires_at": expires_at,
+        }
+        try:
+            await self.state.set(
+                self.prefix + TokenCache.key(token),
+                json.dumps(entry).encode(),
+                ttl,
+            )
+        except Exception:
+            self.errors += 1
+            logger.exception("Failed to share a verified token")
+
+    def stats(self) -> dict:
+        return {
+            "shared_hits": self.hits,
+            "shared_misses": self.misses,
+            "shared_errors": self.errors,
+        }
+
+
+# verifies access tokens either locally (HS256 secret or JWKS) or through
+# the remote auth API, caching the result until the token expires
+class TokenVerifier:
+    def __init__(
+        self,
+        mode: str,
+        cache: TokenCache,
+        secret: str | None = None,
+        jwks_url: str | None = None,
+        remote=None,
+        audience: str = "authenticated",
+        max_ttl: float = 3600,
+        shared: SharedTokenStore | None = None,
+    ):
+        if mode not in ("secret", "jwks", "remote"):
+            raise ValueError(f"Unknown auth mode: {mode}")
+        if mode == "secret" and not secret:
+            raise ValueError("secret mode requires a JWT secret")
+        if mode == "jwks" and not jwks_url:
+            raise ValueError("jwks mode requires a JWKS url")
+        if mode == "remote" and remote is None:
+            raise ValueError("remote mode requires a remote verifier")
+        self.mode = mode
+        self.cache = cache
+        self.secret = secret
+        self.audience = audience
+        self.max_ttl = max_ttl
+        self.remote = remote
+        self.shared = shared
+        self.local_verifications = 0
+        self.remote_calls = 0
+        self._jwks = jwt.PyJWKClient(jwks_url) if mode == "jwks" else None
+
+    async def verify(self, token: str):
+        user = self.cache.get(token)
+        if user is not None:
+            return user
+        # another worker may have verified it already
+        if self.shared is not None:
+            found = await self.shared.get(token)
+            if found is not None:
+                self.cache.set(token, *found)
+                return found[0]
+        if self.mode == "remote":
+            user, expires_at = await self._verify_remote(token)
+        elif self._jwks is not None:
+            # the JWKS client fetches keys with blocking I/O when its key
+            # cache is cold, so keep it off the event loop
+            signing_key = await asyncio.to_thread(
+                self._jwks.get_signing_key_from_jwt, token
+            )
+            user, expires_at = self._verify_local(
+                token, signing_key.key, ["RS256", "ES256"]
+            )
+        else:
+            user, expires_at = self._verify_local(
+                token, self.secret, ["HS256"]
+            )
+        expires_at = min(expires_at, time.time() + self.max_ttl)
+        self.cache.set(token, user, expires_at)
+        if self.shared is not None:
+            await self.shared.set(token, user, expires_at)
+        return user
+
+    def _verify_local(self, token: str, key, algorithms: list[str]):
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=self.audience,
+            options={"require": ["exp", "sub"]},
+        )
+        self.local_verifications += 1
+        user = TokenUser(
+            id=claims["sub"],
+            email=claims.get("email"),
+            role=claims.get("role"),
+            claims=claims,
+        )
+        return user, float(claims["exp"])
+
+    async def _verify_remote(self, token: str):
+        self.remote_calls += 1
+        user = await self.remote(token)
+        if user is None:
+            raise ValueError("Token was rejected by the auth server")
+        # the auth server already checked the signature, we only need exp
+        claims = jwt.decode(token, options={"verify_signature": False})
+        return user, float(claims.get("exp", 0))
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "local_verifications": self.local_verifications,
+            "remote_calls": self.remote_calls,
+            **self.cache.stats(),
+            **(self.shared.stats() if self.shared is not None else {}),
+        }
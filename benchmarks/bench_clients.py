@@ -0,0 +1,139 @@
+"""Requests/sec for POST /posts and POST /interactions with a fresh supabase
+client per request (the old auth() behaviour) vs. the pooled user clients.
+
+Runs against benchmarks/fake_supabase.py, so no Supabase project is needed:
+
+    python benchmarks/bench_clients.py --requests 500
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_supabase import serve  # noqa: E402
+
+JWT_SECRET = "bench-secret-bench-secret-bench-secret"
+
+
+# the old auth() path: a brand new supabase client for every request
+class LegacyClients:
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+
+    def get(self, token: str):
+        from supabase import AsyncClient
+
+        client = AsyncClient(self.url, self.key)
+        client.postgrest.auth(token)
+        return client
+
+
+async def run(
+    client, path: str, make_body, token: str, n: int, concurrency: int
+) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = iter(range(n))
+
+    async def worker():
+        for i in remaining:
+            response = await client.post(
+                path, json=make_body(i), headers=headers
+            )
+            assert response.status_code == 200, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return n / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    fake, server, url = serve()
+    # one user sends every request, so a per-client rate limit would
+    # measure the limiter instead of the clients
+    os.environ.setdefault("ADMISSION_CLIENT_RATE", "0")
+    os.environ.update(
+        SUPABASE_URL=url,
+        SUPABASE_ANON_KEY="anon",
+        SUPABASE_SERVICE_KEY="service",
+        SUPABASE_JWT_SECRET=JWT_SECRET,
+    )
+    import api
+    import httpx
+
+    token = jwt.encode(
+        {
+            "sub": "bench-user",
+            "aud": "authenticated",
+            "exp": int(time.time()) + 3600,
+        },
+        JWT_SECRET,
+    )
+    post_ids = itertools.count(1)
+    articles = itertools.count(1)
+    workloads = [
+        (
+            "POST /posts",
+            "/posts",
+            # a fresh article each time so duplicate detection never trips
+            lambda i: {
+                "title": "t",
+                "content": f"c {next(articles)}",
+                "article_url": f"https://example.com/{next(articles)}",
+            },
+        ),
+        (
+            "POST /interactions",
+            "/interactions",
+            # a fresh post id each time so the unique constraint never trips
+            lambda i: {
+                "user_id": "bench-user",
+                "post_id": next(post_ids),
+                "interaction_type": "like",
+            },
+        ),
+    ]
+    async with api.app.router.lifespan_context(api.app):
+        pooled = api.user_clients
+        legacy = LegacyClients(url, "anon")
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api.app), base_url="http://bench"
+        )
+
+        print(
+            f"{'endpoint':<22}{'before req/s':>14}{'after req/s':>14}"
+            f"{'speedup':>10}{'conns before':>14}{'conns after':>13}"
+        )
+        for name, path, body in workloads:
+            results = []
+            for user_clients in (legacy, pooled):
+                api.user_clients = user_clients
+                connections = fake.connections
+                rps = await run(
+                    client, path, body, token, args.requests, args.concurrency
+                )
+                results.append((rps, fake.connections - connections))
+            (before, conns_before), (after, conns_after) = results
+            print(
+                f"{name:<22}{before:>14.1f}{after:>14.1f}"
+                f"{after / before:>9.2f}x{conns_before:>14}{conns_after:>13}"
+            )
+        api.user_clients = pooled
+        await client.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
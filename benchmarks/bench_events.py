@@ -0,0 +1,79 @@
+"""Idle subscriber capacity of the /events hub in one process.
+
+Opens --subscribers in-process streams (each a consumer task iterating
+EventHub.stream, as the StreamingResponse does), then reports the memory
+per idle subscriber, the time to fan one event out to all of them, and
+the cost of an event only a few of them listen to:
+
+    python benchmarks/bench_events.py --subscribers 20000
+
+Sockets aren't opened, so the numbers leave out the server's own
+per-connection buffers; the point is that the hub adds little per idle
+connection and nothing per event it doesn't deliver.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from events import EventHub  # noqa: E402
+
+
+async def consume(hub: EventHub, subscription, received: list) -> None:
+    async for chunk in hub.stream(subscription):
+        received[0] += chunk.count(b"\nevent: ")
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--subscribers", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    hub = EventHub(max_subscribers=args.subscribers)
+    received = [0]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    consumers = []
+    for i in range(args.subscribers):
+        # every subscriber follows new posts, plus one post of its own
+        subscription = hub.subscribe(("posts", f"post:{i}"))
+        consumers.append(
+            asyncio.create_task(consume(hub, subscription, received))
+        )
+    await asyncio.sleep(0)
+    idle = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for n in range(args.events):
+        hub.publish("post_created", {"id": n}, ("posts",))
+        while received[0] < (n + 1) * args.subscribers:
+            await asyncio.sleep(0)
+    broadcast = (time.perf_counter() - start) / args.events
+
+    start = time.perf_counter()
+    for n in range(args.events):
+        hub.publish("counts", {"post_id": n}, ("counts", f"post:{n}"))
+    targeted = (time.perf_counter() - start) / args.events
+
+    hub.close()
+    await asyncio.gather(*consumers)
+
+    print(f"subscribers          {args.subscribers}")
+    print(f"memory per idle      {idle / args.subscribers:.0f} bytes")
+    print(f"broadcast to all     {broadcast * 1000:.1f} ms/event")
+    print(f"event for one post   {targeted * 1e6:.1f} us/event")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,207 @@
+"""Cross-worker coherence and cache sharing of the state backends.
+
+Starts --workers uvicorn processes of api.py, each on its own port, with
+STATE_BACKEND=--backend, against benchmarks/fake_supabase.py (and
+benchmarks/fake_redis.py for redis). It then reports:
+- upstream queries per read, for reads of the same keys spread over all
+  workers. Each worker loads its own copy with "local", once in total
+  with a shared backend
+- how long after the write returns a post created on one worker shows
+  up in another worker's cached GET /posts, and how many never did within --timeout
+- the same for a like reaching another worker's GET /trending, which is
+  counted in memory and only learns of it through the broadcast
+
+    python benchmarks/bench_shared_state.py --backend mmap --workers 3
+    python benchmarks/bench_shared_state.py --backend redis
+    python benchmarks/bench_shared_state.py --backend local
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from cold_start import ROOT, free_port, wait_for  # noqa: E402
+from fake_supabase import serve  # noqa: E402
+from loadtest import seed_fake  # noqa: E402
+
+
+def start_worker(env: dict) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+# polls until check(response) holds; seconds taken, or None on timeout
+def visible_after(client, url: str, check, started: float, timeout: float):
+    while time.perf_counter() - started < timeout:
+        if check(client.get(url)):
+            return time.perf_counter() - started
+        time.sleep(0.0005)
+    return None
+
+
+def summarize(name: str, delays: list) -> None:
+    seen = [d * 1000 for d in delays if d is not None]
+    missed = len(delays) - len(seen)
+    if seen:
+        print(
+            f"{name:<32}p50 {statistics.median(seen):7.1f} ms   "
+            f"max {max(seen):7.1f} ms   missed {missed}/{len(delays)}"
+        )
+    else:
+        print(f"{name:<32}missed {missed}/{len(delays)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--backend", choices=("local", "mmap", "redis"), default="mmap"
+    )
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=600)
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=2)
+    args = parser.parse_args()
+
+    fake, server, url = serve()
+    # no seeded likes, so one like puts a post in every worker's trending
+    users, post_ids = seed_fake(fake, 20, args.posts, 0)
+    env = {
+        **os.environ,
+        "SUPABASE_URL": url,
+        "SUPABASE_ANON_KEY": "anon",
+        "SUPABASE_SERVICE_KEY": "service",
+        "SUPABASE_JWT_SECRET": fake.jwt_secret,
+        "STATE_BACKEND": args.backend,
+        # rebuild trending on every read, so only the broadcast is timed
+        "TRENDING_REFRESH": "0",
+        "ADMISSION_CLIENT_RATE": "0",
+    }
+    path = None
+    if args.backend == "mmap":
+        path = os.path.join(
+            tempfile.gettempdir(), f"bench-state-{os.getpid()}"
+        )
+        env["STATE_MMAP_PATH"] = path
+    elif args.backend == "redis":
+        from fake_redis import serve as serve_redis
+
+        _, redis_server, env["REDIS_URL"] = serve_redis()
+
+    workers = [start_worker(env) for _ in range(args.workers)]
+    try:
+        with httpx.Client(timeout=30) as client:
+            started = time.perf_counter()
+            for _, base in workers:
+                wait_for(client, f"{base}/readyz", started, 60)
+            bases = [base for _, base in workers]
+
+            # the same keys read through every worker in turn
+            keys = post_ids[: args.keys]
+            before = fake.requests
+            for i in range(args.reads):
+                post_id = keys[i % len(keys)]
+                client.get(f"{bases[i % len(bases)]}/username/{post_id}")
+            queries = fake.requests - before
+
+            user = users[0]
+            headers = {"Authorization": f"Bearer {user['token']}"}
+            posts, likes = [], []
+            for i in range(args.writes):
+                writer = bases[i % len(bases)]
+                reader = bases[(i + 1) % len(bases)]
+                first_page = f"{reader}/posts?limit=5"
+                client.get(first_page)
+                created = client.post(
+                    f"{writer}/posts",
+                    json={
+                        "title": f"Shared state check {i}",
+                        "content": "Written by bench_shared_state.py",
+                        "article_url": f"https://bench.example.com/{i}",
+                    },
+                    headers=headers,
+                ).json()[0]
+                started = time.perf_counter()
+                posts.append(
+                    visible_after(
+                        client,
+                        first_page,
+                        lambda r: r.json()["data"][0]["id"] == created["id"],
+                        started,
+                        args.timeout,
+                    )
+                )
+
+                client.post(
+                    f"{writer}/interactions",
+                    json={
+                        "user_id": user["id"],
+                        "post_id": created["id"],
+                        "interaction_type": "like",
+                    },
+                    headers=headers,
+                )
+                started = time.perf_counter()
+                likes.append(
+                    visible_after(
+                        client,
+                        f"{reader}/trending?window=1h&limit=100",
+                        lambda r: any(
+                            item["post_id"] == created["id"]
+                            for item in r.json()["data"]
+                        ),
+                        started,
+                        args.timeout,
+                    )
+                )
+            stats = client.get(f"{bases[0]}/state/stats").json()
+    finally:
+        for process, _ in workers:
+            process.terminate()
+            process.wait()
+        server.shutdown()
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    print(f"backend                         {args.backend}")
+    print(f"workers                         {args.workers}")
+    print(
+        f"upstream queries per read       {queries / args.reads:.3f} "
+        f"({queries} for {args.reads} reads of {len(keys)} keys)"
+    )
+    summarize("new post on another worker", posts)
+    summarize("like in another's trending", likes)
+    print(
+        f"messages (worker 1)             {stats['published']} published, "
+        f"{stats['received']} received"
+    )
+
+
+if __name__ == "__main__":
+    main()
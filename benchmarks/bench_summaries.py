@@ -0,0 +1,120 @@
+"""Throughput and latency of the summary queue with the local summarizer.
+
+Submits --posts posts, a --duplicates share of them repeating earlier
+content, to a SummaryQueue backed by a process (or thread) pool, with
+writes that take --write-latency seconds, and reports posts/s, the
+submit-to-written latency and how much work the content-hash cache saved.
+--rounds makes each summary cost more CPU, like a real model would:
+
+    python benchmarks/bench_summaries.py --posts 5000 --processes 4
+    python benchmarks/bench_summaries.py --executor thread --batch-size 1
+
+For comparison it also times summarizing every post inline, one at a
+time, as create_post would have to.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from summaries import SummaryQueue, summarize, summarize_batch  # noqa: E402
+
+WORDS = (
+    "research team found new data climate model space launch network "
+    "energy policy study results market growth system design water "
+    "telescope planet engine battery city health science report"
+).split()
+
+
+def make_posts(n: int, duplicates: float, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(n):
+        if posts and rng.random() < duplicates:
+            posts.append(rng.choice(posts))
+            continue
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+            + "."
+            for _ in range(rng.randint(3, 8))
+        ]
+        posts.append(" ".join(sentences).capitalize())
+    return posts
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    parser.add_argument(
+        "--executor", choices=("process", "thread"), default="process"
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--write-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts, args.duplicates)
+
+    start = time.perf_counter()
+    for text in posts:
+        summarize(text, rounds=args.rounds)
+    inline = time.perf_counter() - start
+
+    async def write(rows: list[dict]) -> None:
+        await asyncio.sleep(args.write_latency)
+
+    if args.executor == "process":
+        executor = ProcessPoolExecutor(args.processes)
+    else:
+        executor = ThreadPoolExecutor(args.processes)
+    with executor:
+        # start the pool before timing
+        executor.submit(summarize, "warm up.").result()
+        queue = SummaryQueue(
+            partial(summarize_batch, rounds=args.rounds),
+            write,
+            executor=executor,
+            workers=args.processes,
+            batch_size=args.batch_size,
+            max_queue=args.posts,
+            flush_interval=0.1,
+        )
+        runner = asyncio.create_task(queue.run())
+        start = time.perf_counter()
+        for post_id, text in enumerate(posts):
+            queue.submit(post_id, text)
+        await queue.join()
+        queued = time.perf_counter() - start
+        runner.cancel()
+
+    stats = queue.stats()
+    print(f"posts                {args.posts}")
+    print(f"inline               {args.posts / inline:.0f} posts/s")
+    print(
+        f"queue                {args.posts / queued:.0f} posts/s "
+        f"({args.executor} pool of {args.processes})"
+    )
+    print(f"latency p50          {stats['latency_p50'] * 1000:.1f} ms")
+    print(f"latency p95          {stats['latency_p95'] * 1000:.1f} ms")
+    print(
+        f"summarized           {stats['summarized']} "
+        f"in {stats['batches']} batches"
+    )
+    print(f"from cache           {stats['coalesced'] + stats['cache_hits']}")
+    print(f"writes               {stats['writes']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""Update and read costs of the trending counters.
+
+Replays --interactions likes and saves spread over --hours of simulated
+time across --posts posts (half of them to a few hot posts, and
+--unlikes of them taken back), reading the top --limit of each window
+every --read-every interactions. Simulated time moves faster than
+--refresh, so those reads all rebuild the top list; reads between
+rebuilds are timed separately. Reports interactions/s, read latency and
+the bucket entries held, next to recounting the window from created_at on
+every read, as a query over interactions would:
+
+    python benchmarks/bench_trending.py --interactions 200000 --posts 20000
+    python benchmarks/bench_trending.py --refresh 0
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from trending import WINDOWS, TrendingPosts  # noqa: E402
+
+
+def make_interactions(
+    n: int, posts: int, hours: float, unlikes: float, seed: int = 0
+) -> list[tuple[float, int, str, int]]:
+    rng = random.Random(seed)
+    start = time.time() - hours * 3600
+    step = hours * 3600 / n
+    events = []
+    for i in range(n):
+        at = start + i * step
+        if rng.random() < 0.5:
+            post_id = int(rng.paretovariate(1.2)) % posts + 1
+        else:
+            post_id = rng.randint(1, posts)
+        kind = rng.choice(("like", "save"))
+        events.append((at, post_id, kind, 1))
+        if rng.random() < unlikes:
+            events.append((at, post_id, kind, -1))
+    return events
+
+
+def recount(
+    events: list[tuple[float, int, str, int]],
+    end: int,
+    now: float,
+    minutes: int,
+    limit: int,
+) -> list[tuple[int, int]]:
+    counts = Counter()
+    for at, post_id, _, delta in events[:end]:
+        if at // 60 > now // 60 - minutes:
+            counts[post_id] += delta
+    return heapq.nlargest(limit, counts.items(), key=lambda i: (i[1], i[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--interactions", type=int, default=200000)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--hours", type=float, default=48)
+    parser.add_argument("--unlikes", type=float, default=0.05)
+    parser.add_argument("--read-every", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--refresh", type=float, default=1.0)
+    parser.add_argument(
+        "--recount-reads",
+        type=int,
+        default=20,
+        help="reads to time for the recount baseline",
+    )
+    args = parser.parse_args()
+
+    events = make_interactions(
+        args.interactions, args.posts, args.hours, args.unlikes
+    )
+    clock = [events[0][0]]
+    trending = TrendingPosts(refresh=args.refresh, clock=lambda: clock[0])
+
+    updates = 0.0
+    reads: list[float] = []
+    entries = 0
+    for i, (at, post_id, kind, delta) in enumerate(events):
+        clock[0] = at
+        started = time.perf_counter()
+        trending.add(post_id, kind, at, delta)
+        updates += time.perf_counter() - started
+        if i % args.read_every == 0:
+            for window in WINDOWS:
+                started = time.perf_counter()
+                trending.top(window, args.limit)
+                reads.append(time.perf_counter() - started)
+            entries = max(entries, trending.stats()["entries"])
+
+    # the answer must match a full recount at the end
+    trending.refresh = 0
+    for window, length in WINDOWS.items():
+        expected = recount(events, len(events), clock[0], length, args.limit)
+        got = trending.top(window, args.limit)
+        assert [(item["post_id"], item["engagement"]) for item in got] == [
+            (post_id, count) for post_id, count in expected if count
+        ], window
+
+    cached = []
+    for _ in range(1000):
+        started = time.perf_counter()
+        trending.top("24h", args.limit)
+        cached.append(time.perf_counter() - started)
+
+    recounts = []
+    step = max(len(events) // args.recount_reads, 1)
+    for end in range(step, len(events) + 1, step):
+        started = time.perf_counter()
+        recount(events, end, events[end - 1][0], 1440, args.limit)
+        recounts.append(time.perf_counter() - started)
+
+    reads.sort()
+    cached.sort()
+    recounts.sort()
+    stats = trending.stats()
+    print(f"interactions         {len(events)} over {args.hours:g}h")
+    print(f"updates              {len(events) / updates:.0f} /s")
+    print(
+        f"read p50             {cached[len(cached) // 2] * 1e6:.1f} us "
+        f"(p99 {cached[int(len(cached) * 0.99)] * 1e6:.1f} us)"
+    )
+    print(
+        f"rebuild read p50     {reads[len(reads) // 2] * 1e6:.1f} us "
+        f"(p99 {reads[int(len(reads) * 0.99)] * 1e6:.1f} us)"
+    )
+    print(
+        f"recount read p50     {recounts[len(recounts) // 2] * 1e3:.1f} ms "
+        "(24h window)"
+    )
+    print(f"top list rebuilds    {stats['rebuilds']} for {len(reads)} reads")
+    print(f"bucket entries       {stats['entries']} (peak {entries})")
+    print(
+        f"posts counted        1h: {stats['posts_1h']}, "
+        f"24h: {stats['posts_24h']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
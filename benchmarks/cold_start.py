@@ -0,0 +1,133 @@
+"""Cold-start time of api.py: how long a new worker takes from process
+start to serving its first successful request.
+
+Starts uvicorn in a subprocess against benchmarks/fake_supabase.py and
+reports, per run, the time until the process answers /healthz (listening),
+/readyz (clients warmed, feed loaded) and a first GET /posts:
+
+    python benchmarks/cold_start.py --runs 5 --posts 5000
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_supabase import serve  # noqa: E402
+from loadtest import seed_fake  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(env: dict) -> float:
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            "import time; t = time.perf_counter(); import api; "
+            "print(time.perf_counter() - t)",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    return float(output)
+
+
+# polls path until it returns 200 and returns the seconds since `started`
+def wait_for(client, url: str, started: float, timeout: float) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def cold_start(env: dict, timeout: float) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            return {
+                "healthz": wait_for(
+                    client, f"{base}/healthz", started, timeout
+                ),
+                "readyz": wait_for(client, f"{base}/readyz", started, timeout),
+                "first_posts": wait_for(
+                    client, f"{base}/posts", started, timeout
+                ),
+            }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    fake, server, url = serve()
+    seed_fake(fake, 20, args.posts, args.posts * 2)
+    env = {
+        **os.environ,
+        "SUPABASE_URL": url,
+        "SUPABASE_ANON_KEY": "anon",
+        "SUPABASE_SERVICE_KEY": "service",
+        "SUPABASE_JWT_SECRET": fake.jwt_secret,
+    }
+
+    imports = [import_time(env) for _ in range(args.runs)]
+    runs = [cold_start(env, args.timeout) for _ in range(args.runs)]
+    server.shutdown()
+
+    print(f"{'stage':<14}{'median s':>10}{'max s':>10}")
+    print(
+        f"{'import api':<14}{statistics.median(imports):>10.3f}"
+        f"{max(imports):>10.3f}"
+    )
+    for stage in ("healthz", "readyz", "first_posts"):
+        values = [run[stage] for run in runs]
+        print(
+            f"{stage:<14}{statistics.median(values):>10.3f}"
+            f"{max(values):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
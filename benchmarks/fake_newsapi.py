@@ -0,0 +1,197 @@
+"""Local stand-in for NewsAPI's /v2/everything, for running ingester.py
+without an API key or network access.
+
+Serves the articles of a fixture file of {topic: [article, ...]} with the
+paging, `from`/`to` filters, `sortBy=publishedAt` ordering and 100 result
+cap of the real endpoint. With --rate it also publishes new copies of
+fixture articles, stamped with the current time, to mimic a live feed:
+
+    python benchmarks/fake_newsapi.py --port 8100 --rate 2
+    NEWS_API_URL=http://127.0.0.1:8100/v2/everything python ingester.py
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), "..", "fixtures", "newsapi_articles.json"
+)
+
+
+class NewsApiError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeNewsApi:
+    def __init__(
+        self,
+        path: str = FIXTURE,
+        max_results: int = 100,
+        latency: float = 0,
+        api_key: str | None = None,
+    ):
+        with open(path) as f:
+            self.articles: dict[str, list[dict]] = json.load(f)
+        self.max_results = max_results
+        self.latency = latency
+        self.api_key = api_key
+        self.requests = 0
+        self.published = 0
+        self._ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    # adds an article to a topic, as if it had just been published
+    def publish(self, topic: str, article: dict | None = None) -> dict:
+        with self.lock:
+            if article is None:
+                article = dict(random.choice(self.articles[topic]))
+                n = next(self._ids)
+                separator = "&" if "?" in article["url"] else "?"
+                article["url"] = f"{article['url']}{separator}live={n}"
+                article["title"] = f"{article['title']} (update {n})"
+                article["description"] = (
+                    f"{article.get('description') or ''} Update {n}."
+                )
+                article["publishedAt"] = format_time(
+                    datetime.now(timezone.utc)
+                )
+            self.articles.setdefault(topic, []).append(article)
+            self.published += 1
+            return article
+
+    def everything(self, params: dict) -> dict:
+        if self.api_key and params.get("apiKey") != self.api_key:
+            raise NewsApiError(401, "apiKeyInvalid", "Your API key is invalid")
+        if not params.get("q"):
+            raise NewsApiError(
+                400, "parametersMissing", "Required parameters are missing"
+            )
+        page = int(params.get("page") or 1)
+        page_size = min(int(params.get("pageSize") or 100), 100)
+        if page * page_size > self.max_results and page > 1:
+            raise NewsApiError(
+                426,
+                "maximumResultsReached",
+                f"You may only request the first {self.max_results} results",
+            )
+        with self.lock:
+            articles = list(self.articles.get(params["q"], ()))
+        if params.get("from"):
+            since = parse_time(params["from"])
+            articles = [
+                a for a in articles if parse_time(a["publishedAt"]) >= since
+            ]
+        if params.get("to"):
+            until = parse_time(params["to"])
+            articles = [
+                a for a in articles if parse_time(a["publishedAt"]) <= until
+            ]
+        if params.get("sortBy") == "publishedAt":
+            articles.sort(key=lambda a: a["publishedAt"], reverse=True)
+        start = (page - 1) * page_size
+        return {
+            "status": "ok",
+            "totalResults": len(articles),
+            "articles": articles[start : start + page_size],
+        }
+
+
+def make_handler(fake: FakeNewsApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            with fake.lock:
+                fake.requests += 1
+            if fake.latency:
+                time.sleep(fake.latency)
+            url = urlparse(self.path)
+            try:
+                if url.path != "/v2/everything":
+                    raise NewsApiError(404, "notFound", "not found")
+                params = dict(parse_qsl(url.query, keep_blank_values=True))
+                self.send_json(200, fake.everything(params))
+            except NewsApiError as e:
+                # NewsAPI's error shape
+                self.send_json(
+                    e.status,
+                    {"status": "error", "code": e.code, "message": e.message},
+                )
+
+    return Handler
+
+
+# starts the fake on a background thread and returns (fake, server, url)
+def serve(host: str = "127.0.0.1", port: int = 0, **options):
+    fake = FakeNewsApi(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fake, server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="new articles per second"
+    )
+    args = parser.parse_args()
+
+    fake, server, url = serve(
+        port=args.port, path=args.fixture, latency=args.latency
+    )
+    print(f"NEWS_API_URL={url}/v2/everything")
+    try:
+        while True:
+            if args.rate:
+                time.sleep(1 / args.rate)
+                fake.publish(random.choice(list(fake.articles)))
+            else:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    print(f"{fake.requests} requests, {fake.published} articles published")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Local stand-in for a Redis server, for running several API workers with
+STATE_BACKEND=redis without installing one.
+
+Speaks RESP2 and implements the commands shared_state.RedisState uses
+(GET, MGET, SET with EX/PX, DEL, PUBLISH, SUBSCRIBE) plus PING, AUTH,
+SELECT, FLUSHALL and DBSIZE, with one keyspace:
+
+    python benchmarks/fake_redis.py --port 6380
+    STATE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6380/0 \\
+        uvicorn api:app --workers 4
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, Exception):
+        return b"-ERR %s\r\n" % str(value).encode()
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(map(encode, value))
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class FakeRedis:
+    def __init__(self):
+        # key -> (expires at or None, value)
+        self.values: dict[bytes, tuple[float | None, bytes]] = {}
+        self.channels: dict[bytes, set] = {}
+        self.commands = 0
+        self.lock = threading.Lock()
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.time():
+            del self.values[key]
+            return None
+        return entry[1]
+
+    def execute(self, handler, args: list[bytes]):
+        name = args[0].upper().decode()
+        with self.lock:
+            self.commands += 1
+            if name == "PING":
+                return "PONG"
+            if name in ("AUTH", "SELECT"):
+                return "OK"
+            if name == "GET":
+                return self._get(args[1])
+            if name == "MGET":
+                return [self._get(key) for key in args[1:]]
+            if name == "SET":
+                expires = None
+                options = [arg.upper() for arg in args[3:]]
+                for option, value in zip(options, args[4:]):
+                    if option == b"PX":
+                        expires = time.time() + int(value) / 1000
+                    elif option == b"EX":
+                        expires = time.time() + int(value)
+                self.values[args[1]] = (expires, args[2])
+                return "OK"
+            if name == "DEL":
+                return sum(
+                    self.values.pop(key, None) is not None for key in args[1:]
+                )
+            if name == "FLUSHALL":
+                self.values.clear()
+                return "OK"
+            if name == "DBSIZE":
+                return len(self.values)
+            if name == "SUBSCRIBE":
+                replies = []
+                for channel in args[1:]:
+                    self.channels.setdefault(channel, set()).add(handler)
+                    handler.subscriptions.add(channel)
+                    replies.append(
+                        [b"subscribe", channel, len(handler.subscriptions)]
+                    )
+                return replies
+            if name == "PUBLISH":
+                subscribers = list(self.channels.get(args[1], ()))
+        if name == "PUBLISH":
+            message = encode([b"message", args[1], args[2]])
+            for subscriber in subscribers:
+                subscriber.send(message)
+            return len(subscribers)
+        return ValueError(f"unknown command '{name}'")
+
+    def unsubscribe(self, handler) -> None:
+        with self.lock:
+            for channel in handler.subscriptions:
+                self.channels.get(channel, set()).discard(handler)
+
+
+def make_handler(fake: FakeRedis):
+    class Handler(socketserver.StreamRequestHandler):
+        def setup(self):
+            super().setup()
+            self.subscriptions = set()
+            self.send_lock = threading.Lock()
+
+        def send(self, data: bytes) -> None:
+            with self.send_lock:
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except OSError:
+                    pass
+
+        def read_command(self) -> list[bytes] | None:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if not line.startswith(b"*"):
+                # inline command, as typed into telnet
+                return line.split()
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            return args
+
+        def handle(self):
+            try:
+                while True:
+                    args = self.read_command()
+                    if args is None:
+                        break
+                    if not args:
+                        continue
+                    reply = fake.execute(self, args)
+                    if args[0].upper() == b"SUBSCRIBE":
+                        self.send(b"".join(map(encode, reply)))
+                    else:
+                        self.send(encode(reply))
+            finally:
+                fake.unsubscribe(self)
+
+    return Handler
+
+
+# starts the fake on a background thread and returns (fake, server, url)
+def serve(host: str = "127.0.0.1", port: int = 0):
+    fake = FakeRedis()
+    server = socketserver.ThreadingTCPServer(
+        (host, port), make_handler(fake), bind_and_activate=False
+    )
+    server.allow_reuse_address = True
+    server.daemon_threads = True
+    server.server_bind()
+    server.server_activate()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fake, server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    fake, server, url = serve(port=args.port)
+    print(f"REDIS_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    print(f"{fake.commands} commands")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,692 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import jwt
+
+# (table, embedded table) -> (local column, remote column, many)
+RELATIONS = {
+    ("posts", "profiles"): ("user_id", "id", False),
+    ("posts", "post_stats"): ("id", "post_id", False),
+    ("post_stats", "posts"): ("post_id", "id", False),
+    ("profile_stats", "profiles"): ("user_id", "id", False),
+    ("posts", "interactions"): ("id", "post_id", True),
+    ("profiles", "posts"): ("id", "user_id", True),
+    ("interactions", "posts"): ("post_id", "id", False),
+    ("interactions", "profiles"): ("user_id", "id", False),
+}
+
+# primary keys other than "id"
+PRIMARY_KEYS = {
+    "post_stats": ("post_id",),
+    "profile_stats": ("user_id",),
+    "summaries": ("content_hash",),
+}
+
+# unique keys checked on insert, besides the primary key
+UNIQUE = {
+    "profiles": [("email",), ("username",)],
+    "posts": [("url_key",)],
+    "interactions": [("user_id", "post_id", "interaction_type")],
+}
+
+IDENTITY_TABLES = {"posts", "interactions"}
+
+# column -> referenced table (by id), checked on insert
+FOREIGN_KEYS = {"interactions": {"post_id": "posts"}}
+
+
+class FakeError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# splits a PostgREST logic tree on top-level commas, keeping quoted values
+# and nested (...) groups together
+def split_terms(text: str) -> list[str]:
+    terms, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            terms.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        terms.append(current)
+    return terms
+
+
+def unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def coerce(value: str, like):
+    if value == "null":
+        return None
+    if isinstance(like, bool):
+        return value == "true"
+    if isinstance(like, int):
+        return int(value)
+    if isinstance(like, float):
+        return float(value)
+    return value
+
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+}
+
+
+def compile_condition(column: str, expression: str):
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition(".")
+    if op == "in":
+        values = [unquote(v) for v in split_terms(raw.strip("()"))]
+
+        def check(row):
+            value = row.get(column)
+            return any(value == coerce(v, value) for v in values)
+
+    elif op == "is":
+
+        def check(row):
+            return row.get(column) is None if raw == "null" else False
+
+    elif op in ("like", "ilike"):
+        pattern = re.escape(unquote(raw)).replace("\\*", ".*")
+        pattern = pattern.replace("%", ".*")
+        flags = re.IGNORECASE if op == "ilike" else 0
+
+        def check(row):
+            return bool(re.fullmatch(pattern, str(row.get(column)), flags))
+
+    elif op in OPERATORS:
+        compare = OPERATORS[op]
+        raw = unquote(raw)
+
+        def check(row):
+            value = row.get(column)
+            return compare(value, coerce(raw, value))
+
+    else:
+        raise FakeError(400, "PGRST100", f"unsupported operator {op}")
+    return (lambda row: not check(row)) if negate else check
+
+
+def compile_logic(kind: str, body: str):
+    checks = []
+    for term in split_terms(body):
+        if term.startswith(("and(", "or(")):
+            sub_kind, _, sub_body = term.partition("(")
+            checks.append(compile_logic(sub_kind, sub_body[:-1]))
+        else:
+            column, _, expression = term.partition(".")
+            checks.append(compile_condition(column, expression))
+    if kind == "and":
+        return lambda row: all(check(row) for check in checks)
+    return lambda row: any(check(row) for check in checks)
+
+
+def parse_select(select: str) -> list:
+    columns = []
+    for term in split_terms(select or "*"):
+        term = term.strip()
+        if "(" in term:
+            name, _, inner = term.partition("(")
+            name = name.split(":")[-1].split("!")[0]
+            columns.append((name, inner[:-1]))
+        else:
+            columns.append(term)
+    return columns
+
+
+# in-memory stand-in for the parts of Supabase (PostgREST + auth) the API
+# and scripts use, served over real HTTP so connection reuse is measurable.
+# RLS isn't enforced; triggers from sql/schema.sql are mirrored by hand
+class FakeSupabase:
+    def __init__(self, jwt_secret: str = "fake-jwt-secret-fake-jwt-secret!"):
+        self.jwt_secret = jwt_secret
+        self.tables: dict[str, list[dict]] = {
+            "profiles": [],
+            "posts": [],
+            "interactions": [],
+            "post_stats": [],
+            "profile_stats": [],
+            "summaries": [],
+        }
+        self.next_id: dict[str, int] = {}
+        self.users: dict[str, dict] = {}
+        self.rpcs = {
+            "increment_view_counts": self.increment_view_counts,
+            "store_summaries": self.store_summaries,
+            "stats_totals": self.stats_totals,
+        }
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.RLock()
+
+    # --- tables ---
+
+    def table(self, name: str) -> list[dict]:
+        if name not in self.tables:
+            raise FakeError(404, "42P01", f'relation "{name}" does not exist')
+        return self.tables[name]
+
+    def query(self, name: str, params: list[tuple[str, str]]) -> list[dict]:
+        rows = self.table(name)
+        for key, value in params:
+            if key in ("select", "order", "limit", "offset", "on_conflict"):
+                continue
+            if key in ("or", "and"):
+                check = compile_logic(key, value[1:-1])
+            else:
+                check = compile_condition(key, value)
+            rows = [row for row in rows if check(row)]
+        return rows
+
+    def embed(self, name: str, rows: list[dict], select: str) -> list[dict]:
+        result = []
+        for row in rows:
+            out = {}
+            for column in parse_select(select):
+                if column == "*":
+                    out.update(row)
+                elif isinstance(column, tuple):
+                    other, inner = column
+                    local, remote, many = RELATIONS[(name, other)]
+                    matches = [
+                        r
+                        for r in self.tables[other]
+                        if r[remote] == row[local]
+                    ]
+                    if inner == "count":
+                        out[other] = [{"count": len(matches)}]
+                        continue
+                    embedded = self.embed(other, matches, inner)
+                    out[other] = (
+                        embedded
+                        if many
+                        else (embedded[0] if embedded else None)
+                    )
+                else:
+                    alias, _, source = column.partition(":")
+                    out[alias] = row.get(source or alias)
+            result.append(out)
+        return result
+
+    def select(self, name: str, params: list[tuple[str, str]]):
+        options = dict(params)
+        rows = self.query(name, params)
+        for term in reversed(split_terms(options.get("order", ""))):
+            column, _, direction = term.partition(".")
+            desc = direction.startswith("desc")
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            rows = present + missing
+        total = len(rows)
+        offset = int(options.get("offset", 0))
+        if "limit" in options:
+            rows = rows[offset : offset + int(options["limit"])]
+        else:
+            rows = rows[offset:]
+        return self.embed(name, rows, options.get("select", "*")), total
+
+    # like a unique index, NULLs never conflict
+    def _conflict(self, name: str, row: dict, columns: tuple) -> dict | None:
+        if any(row.get(c) is None for c in columns):
+            return None
+        for existing in self.tables[name]:
+            if all(existing.get(c) == row.get(c) for c in columns):
+                return existing
+        return None
+
+    def insert(
+        self,
+        name: str,
+        rows: list[dict],
+        on_conflict: str | None = None,
+        resolution: str | None = None,
+    ) -> list[dict]:
+        created = []
+        with self.lock:
+            table = self.table(name)
+            # checked up front, so a failing insert inserts nothing
+            for column, target in FOREIGN_KEYS.get(name, {}).items():
+                ids = {row["id"] for row in self.table(target)}
+                for row in rows:
+                    if row.get(column) is not None and row[column] not in ids:
+                        raise FakeError(
+                            409,
+                            "23503",
+                            f'insert on table "{name}" violates foreign key '
+                            f"constraint on {column}",
+                        )
+            for row in rows:
+                row = dict(row)
+                keys = list(UNIQUE.get(name, []))
+                keys.insert(0, PRIMARY_KEYS.get(name, ("id",)))
+                if on_conflict:
+                    target = tuple(on_conflict.split(","))
+                    existing = self._conflict(name, row, target)
+                    if existing is not None:
+                        if resolution == "merge-duplicates":
+                            existing.update(row)
+                            created.append(existing)
+                        continue
+                for columns in keys:
+                    if self._conflict(name, row, columns) is not None:
+                        raise FakeError(
+                            409,
+                            "23505",
+                            "duplicate key value violates unique "
+                            f"constraint on {name}({','.join(columns)})",
+                        )
+                if name in IDENTITY_TABLES:
+                    self.next_id[name] = self.next_id.get(name, 0) + 1
+                    row["id"] = self.next_id[name]
+                if name not in ("post_stats", "profile_stats"):
+                    row.setdefault("created_at", now())
+                if name == "posts":
+                    row.setdefault("updated_at", row["created_at"])
+                    row.setdefault("view_count", 0)
+                    row.setdefault("content", None)
+                    row.setdefault("thumbnail_url", None)
+                    row.setdefault("url_key", None)
+                    row.setdefault("fingerprint", None)
+                    row.setdefault("summary", None)
+                table.append(row)
+                created.append(row)
+                self.after_insert(name, row)
+        return created
+
+    def update(self, name: str, params, values: dict) -> list[dict]:
+        with self.lock:
+            rows = self.query(name, params)
+            for row in rows:
+                row.update(values)
+                if name == "posts":
+                    row["updated_at"] = now()
+            return rows
+
+    def delete(self, name: str, params) -> list[dict]:
+        with self.lock:
+            rows = self.query(name, params)
+            doomed = {id(row) for row in rows}
+            self.tables[name] = [
+                r for r in self.tables[name] if id(r) not in doomed
+            ]
+            for row in rows:
+                self.after_delete(name, row)
+            return rows
+
+    # mirrors the triggers and ON DELETE CASCADEs in sql/schema.sql
+    def after_insert(self, name: str, row: dict) -> None:
+        if name == "profiles":
+            self.tables["profile_stats"].append(
+                {
+                    "user_id": row["id"],
+                    "post_count": 0,
+                    "like_count": 0,
+                    "save_count": 0,
+                    "view_count": 0,
+                    "engagement": 0,
+                }
+            )
+        elif name == "posts":
+            self.tables["post_stats"].append(
+                {
+                    "post_id": row["id"],
+                    "like_count": 0,
+                    "save_count": 0,
+                    "engagement": 0,
+                }
+            )
+            self._bump_creator(row["user_id"], post_count=1)
+        elif name == "interactions":
+            self._bump_stats(row, 1)
+
+    def after_delete(self, name: str, row: dict) -> None:
+        if name == "posts":
+            for stats in self.tables["post_stats"]:
+                if stats["post_id"] == row["id"]:
+                    self._bump_creator(
+                        row["user_id"],
+                        post_count=-1,
+                        like_count=-stats["like_count"],
+                        save_count=-stats["save_count"],
+                        view_count=-row["view_count"],
+                    )
+            self.tables["post_stats"] = [
+                s
+                for s in self.tables["post_stats"]
+                if s["post_id"] != row["id"]
+            ]
+            self.tables["interactions"] = [
+                i
+                for i in self.tables["interactions"]
+                if i["post_id"] != row["id"]
+            ]
+        elif name == "interactions":
+            self._bump_stats(row, -1)
+
+    def _bump_stats(self, interaction: dict, delta: int) -> None:
+        column = f"{interaction['interaction_type']}_count"
+        for stats in self.tables["post_stats"]:
+            if stats["post_id"] == interaction["post_id"]:
+                stats[column] += delta
+                stats["engagement"] += delta
+        for post in self.tables["posts"]:
+            if post["id"] == interaction["post_id"]:
+                self._bump_creator(post["user_id"], **{column: delta})
+
+    def _bump_creator(self, user_id: str, **deltas) -> None:
+        for stats in self.tables["profile_stats"]:
+            if stats["user_id"] == user_id:
+                for column, delta in deltas.items():
+                    stats[column] += delta
+                stats["engagement"] = stats["like_count"] + stats["save_count"]
+
+    # --- rpc ---
+
+    def increment_view_counts(self, post_ids: list, deltas: list):
+        with self.lock:
+            increments = dict(zip(post_ids, deltas))
+            for post in self.tables["posts"]:
+                if post["id"] in increments:
+                    post["view_count"] += increments[post["id"]]
+                    self._bump_creator(
+                        post["user_id"], view_count=increments[post["id"]]
+                    )
+        return None
+
+    def stats_totals(self):
+        with self.lock:
+            rows = self.tables["profile_stats"]
+            return [
+                {
+                    "users": len(rows),
+                    "posts": sum(row["post_count"] for row in rows),
+                    "likes": sum(row["like_count"] for row in rows),
+                    "saves": sum(row["save_count"] for row in rows),
+                    "views": sum(row["view_count"] for row in rows),
+                }
+            ]
+
+    def store_summaries(self, items: list):
+        with self.lock:
+            cached = {row["content_hash"] for row in self.tables["summaries"]}
+            posts = {post["id"]: post for post in self.tables["posts"]}
+            for item in items:
+                if item["content_hash"] not in cached:
+                    cached.add(item["content_hash"])
+                    self.tables["summaries"].append(
+                        {
+                            "content_hash": item["content_hash"],
+                            "summary": item["summary"],
+                            "created_at": now(),
+                        }
+                    )
+                post = posts.get(item["post_id"])
+                content = post and post.get("content")
+                if (
+                    content is not None
+                    and hashlib.md5(content.encode()).hexdigest()
+                    == item["content_hash"]
+                ):
+                    post["summary"] = item["summary"]
+        return None
+
+    # --- auth ---
+
+    def session_for(self, user: dict) -> dict:
+        expires_in = 3600
+        token = jwt.encode(
+            {
+                "sub": user["id"],
+                "aud": "authenticated",
+                "role": "authenticated",
+                "email": user["email"],
+                "exp": int(time.time()) + expires_in,
+            },
+            self.jwt_secret,
+        )
+        return {
+            "access_token": token,
+            "refresh_token": uuid.uuid4().hex,
+            "token_type": "bearer",
+            "expires_in": expires_in,
+            "expires_at": int(time.time()) + expires_in,
+            "user": self.public_user(user),
+        }
+
+    def public_user(self, user: dict) -> dict:
+        return {
+            "id": user["id"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": user["email"],
+            "app_metadata": {"provider": "email"},
+            "user_metadata": {},
+            "created_at": user["created_at"],
+        }
+
+    def sign_up(self, email: str, password: str) -> dict:
+        with self.lock:
+            if email in self.users:
+                raise FakeError(
+                    422, "user_already_exists", "User already registered"
+                )
+            user = {
+                "id": str(uuid.uuid4()),
+                "email": email,
+                "password": password,
+                "created_at": now(),
+            }
+            self.users[email] = user
+        return self.session_for(user)
+
+    def sign_in(self, email: str, password: str) -> dict:
+        user = self.users.get(email)
+        if user is None or user["password"] != password:
+            raise FakeError(
+                400, "invalid_credentials", "Invalid login credentials"
+            )
+        return self.session_for(user)
+
+    def user_for_token(self, token: str) -> dict:
+        try:
+            claims = jwt.decode(
+                token,
+                self.jwt_secret,
+                algorithms=["HS256"],
+                audience="authenticated",
+            )
+        except jwt.PyJWTError as e:
+            raise FakeError(401, "bad_jwt", str(e))
+        for user in self.users.values():
+            if user["id"] == claims["sub"]:
+                return self.public_user(user)
+        return {
+            "id": claims["sub"],
+            "aud": "authenticated",
+            "email": claims.get("email"),
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": now(),
+        }
+
+
+def make_handler(fake: FakeSupabase):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with fake.lock:
+                fake.connections += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body, headers=None) -> None:
+            payload = b"" if body is None else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def dispatch(self, method: str) -> None:
+            fake.requests += 1
+            url = urlparse(self.path)
+            params = parse_qsl(url.query, keep_blank_values=True)
+            try:
+                # always drain the body (postgrest sends "{}" with DELETE),
+                # or it would be read as the next keep-alive request
+                body = self.read_json()
+                if method not in ("POST", "PATCH"):
+                    body = None
+                if url.path.startswith("/rest/v1/"):
+                    self.rest(
+                        method, url.path[len("/rest/v1/") :], params, body
+                    )
+                elif url.path.startswith("/auth/v1/"):
+                    self.auth(
+                        method, url.path[len("/auth/v1/") :], params, body
+                    )
+                else:
+                    raise FakeError(404, "not_found", "not found")
+            except FakeError as e:
+                # PostgREST's error shape, plus GoTrue's "msg"
+                self.send_json(
+                    e.status,
+                    {
+                        "code": e.code,
+                        "message": e.message,
+                        "details": None,
+                        "hint": None,
+                        "msg": e.message,
+                    },
+                )
+
+        def rest(self, method, path, params, body) -> None:
+            prefer = self.headers.get("Prefer", "")
+            if path.startswith("rpc/"):
+                function = fake.rpcs.get(path[4:])
+                if function is None:
+                    raise FakeError(
+                        404, "PGRST202", f"function {path} not found"
+                    )
+                self.send_json(200, function(**(body or {})))
+                return
+            if method == "GET":
+                rows, total = fake.select(path, params)
+                headers = {}
+                if "count=" in prefer:
+                    end = max(len(rows) - 1, 0)
+                    headers["Content-Range"] = f"0-{end}/{total}"
+                self.send_json(200, rows, headers)
+                return
+            if method == "POST":
+                resolution = None
+                if "resolution=" in prefer:
+                    resolution = prefer.split("resolution=")[1].split(",")[0]
+                on_conflict = dict(params).get("on_conflict")
+                if resolution and not on_conflict:
+                    on_conflict = "id"
+                rows = fake.insert(
+                    path,
+                    body if isinstance(body, list) else [body],
+                    on_conflict=on_conflict,
+                    resolution=resolution,
+                )
+            elif method == "PATCH":
+                rows = fake.update(path, params, body)
+            elif method == "DELETE":
+                rows = fake.delete(path, params)
+            select = dict(params).get("select")
+            self.send_json(
+                201 if method == "POST" else 200,
+                fake.embed(path, rows, select) if select else rows,
+            )
+
+        def auth(self, method, path, params, body) -> None:
+            if path == "signup":
+                self.send_json(
+                    200, fake.sign_up(body["email"], body["password"])
+                )
+            elif (
+                path == "token"
+                and dict(params).get("grant_type") == "password"
+            ):
+                self.send_json(
+                    200, fake.sign_in(body["email"], body["password"])
+                )
+            elif path == "health":
+                self.send_json(200, {"name": "GoTrue", "version": "fake"})
+            elif path == "user":
+                token = self.headers.get("Authorization", "").removeprefix(
+                    "Bearer "
+                )
+                self.send_json(200, fake.user_for_token(token))
+            else:
+                raise FakeError(404, "not_found", f"auth/{path} not supported")
+
+        def do_GET(self):
+            self.dispatch("GET")
+
+        def do_POST(self):
+            self.dispatch("POST")
+
+        def do_PATCH(self):
+            self.dispatch("PATCH")
+
+        def do_DELETE(self):
+            self.dispatch("DELETE")
+
+    return Handler
+
+
+# starts the fake on a background thread and returns (fake, server, url)
+def serve(host: str = "127.0.0.1", port: int = 0, **options):
+    fake = FakeSupabase(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fake, server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,317 @@
+"""Offline load test for api.py.
+
+Runs the FastAPI app in-process against benchmarks/fake_supabase.py, drives
+a weighted mix of feed reads, likes, post creates, logins and view
+impressions at a fixed concurrency, and reports throughput and
+p50/p95/p99 latency per endpoint. Results are written as JSON so runs can
+be diffed:
+
+    python benchmarks/loadtest.py --duration 10 --output before.json
+    python benchmarks/loadtest.py --duration 10 --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_supabase import serve  # noqa: E402
+
+DEFAULT_MIX = "feed=40,posts=20,like=20,create_post=5,login=5,views=10"
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}")
+        weights[name] = float(weight)
+    return weights
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, int(round(p / 100 * len(sorted_values)))
+    )
+    return sorted_values[index]
+
+
+# --- operations: each returns (endpoint label, response) ---
+
+
+async def op_feed(ctx):
+    return "GET /feed", await ctx.client.get("/feed?include=posts")
+
+
+async def op_posts(ctx):
+    response = await ctx.client.get("/posts", params={"limit": 20})
+    cursor = response.json().get("next_cursor")
+    if cursor and ctx.rng.random() < 0.5:
+        # scroll one page deeper half the time
+        response = await ctx.client.get(
+            "/posts", params={"limit": 20, "cursor": cursor}
+        )
+    return "GET /posts", response
+
+
+async def op_like(ctx):
+    user = ctx.rng.choice(ctx.users)
+    return "POST /interactions", await ctx.client.post(
+        "/interactions",
+        json={
+            "user_id": user["id"],
+            "post_id": ctx.rng.choice(ctx.post_ids),
+            "interaction_type": ctx.rng.choice(["like", "like", "save"]),
+        },
+        headers={"Authorization": f"Bearer {user['token']}"},
+    )
+
+
+async def op_create_post(ctx):
+    user = ctx.rng.choice(ctx.users)
+    n = ctx.rng.randrange(10**9)
+    return "POST /posts", await ctx.client.post(
+        "/posts",
+        json={
+            "title": f"Load test article {n}",
+            "content": "Generated by benchmarks/loadtest.py",
+            "article_url": f"https://loadtest.example.com/{n}",
+        },
+        headers={"Authorization": f"Bearer {user['token']}"},
+    )
+
+
+async def op_login(ctx):
+    user = ctx.rng.choice(ctx.users)
+    return "POST /login", await ctx.client.post(
+        "/login", json={"email": user["email"], "password": "password"}
+    )
+
+
+async def op_views(ctx):
+    return "POST /views", await ctx.client.post(
+        "/views", json={"post_ids": ctx.rng.sample(ctx.post_ids, 5)}
+    )
+
+
+OPERATIONS = {
+    "feed": op_feed,
+    "posts": op_posts,
+    "like": op_like,
+    "create_post": op_create_post,
+    "login": op_login,
+    "views": op_views,
+}
+
+
+class Context:
+    def __init__(self, client, users, post_ids, seed):
+        self.client = client
+        self.users = users
+        self.post_ids = post_ids
+        self.rng = random.Random(seed)
+
+
+# fills the fake with users (auth + profiles), posts and interactions
+def seed_fake(fake, n_users: int, n_posts: int, n_interactions: int):
+    rng = random.Random(0)
+    users = []
+    for i in range(n_users):
+        session = fake.sign_up(f"user{i}@example.com", "password")
+        user = {
+            "id": session["user"]["id"],
+            "email": f"user{i}@example.com",
+            "token": session["access_token"],
+        }
+        users.append(user)
+        fake.insert(
+            "profiles",
+            [{"id": user["id"], "email": user["email"], "username": f"u{i}"}],
+        )
+    start = datetime.now(timezone.utc)
+    posts = fake.insert(
+        "posts",
+        [
+            {
+                "user_id": rng.choice(users)["id"],
+                "article_url": f"https://news.example.com/{i}",
+                "url_key": f"news.example.com/{i}",
+                "title": f"Seed article {i}",
+                "content": "Seeded by benchmarks/loadtest.py",
+                "created_at": (start - timedelta(minutes=i)).isoformat(),
+            }
+            for i in range(n_posts)
+        ],
+    )
+    post_ids = [post["id"] for post in posts]
+    interactions = {
+        (
+            rng.choice(users)["id"],
+            rng.choice(post_ids),
+            rng.choice(["like", "save"]),
+        )
+        for _ in range(n_interactions)
+    }
+    fake.insert(
+        "interactions",
+        [
+            {"user_id": u, "post_id": p, "interaction_type": t}
+            for u, p, t in interactions
+        ],
+    )
+    return users, post_ids
+
+
+async def run_load(app, args, users, post_ids):
+    import httpx
+
+    weights = parse_mix(args.mix)
+    names, shares = list(weights), list(weights.values())
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://loadtest", timeout=60
+    ) as client:
+        deadline = time.perf_counter() + args.duration
+
+        async def worker(seed: int):
+            ctx = Context(client, users, post_ids, seed)
+            while time.perf_counter() < deadline:
+                name = ctx.rng.choices(names, shares)[0]
+                start = time.perf_counter()
+                label, response = await OPERATIONS[name](ctx)
+                latencies[label].append((time.perf_counter() - start) * 1000)
+                statuses[label][str(response.status_code)] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(worker(args.seed + i) for i in range(args.concurrency))
+        )
+        elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for label, values in sorted(latencies.items()):
+        values.sort()
+        errors = sum(
+            count
+            for status, count in statuses[label].items()
+            if int(status) >= 400
+        )
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": errors,
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": values[-1],
+            "statuses": dict(statuses[label]),
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": weights,
+            "users": args.users,
+            "posts": args.posts,
+        },
+        "elapsed": elapsed,
+        "total": {
+            "requests": total,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "throughput": total / elapsed,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(results: dict, previous: dict | None = None) -> None:
+    print(
+        f"{'endpoint':<22}{'reqs':>8}{'err':>6}{'req/s':>10}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    )
+    for label, e in results["endpoints"].items():
+        line = (
+            f"{label:<22}{e['requests']:>8}{e['errors']:>6}"
+            f"{e['throughput']:>10.1f}{e['p50_ms']:>9.2f}"
+            f"{e['p95_ms']:>9.2f}{e['p99_ms']:>9.2f}"
+        )
+        old = (previous or {}).get("endpoints", {}).get(label)
+        if old:
+            change = (e["throughput"] / old["throughput"] - 1) * 100
+            p99 = (
+                (e["p99_ms"] / old["p99_ms"] - 1) * 100 if old["p99_ms"] else 0
+            )
+            line += f"   req/s {change:+.1f}%  p99 {p99:+.1f}%"
+        print(line)
+    total = results["total"]
+    print(
+        f"\n{total['requests']} requests, {total['errors']} errors, "
+        f"{total['throughput']:.1f} req/s over {results['elapsed']:.1f}s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--interactions", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="previous results JSON to diff")
+    args = parser.parse_args()
+
+    fake, server, url = serve()
+    users, post_ids = seed_fake(
+        fake, args.users, args.posts, args.interactions
+    )
+    # every simulated user shares one address, so per-client rate limits
+    # would measure the limiter instead of the app
+    os.environ.setdefault("ADMISSION_CLIENT_RATE", "0")
+    os.environ.update(
+        SUPABASE_URL=url,
+        SUPABASE_ANON_KEY="anon",
+        SUPABASE_SERVICE_KEY="service",
+        SUPABASE_JWT_SECRET=fake.jwt_secret,
+    )
+    import api
+
+    async with api.app.router.lifespan_context(api.app):
+        results = await run_load(api.app, args, users, post_ids)
+    results["upstream"] = {
+        "requests": fake.requests,
+        "connections": fake.connections,
+    }
+    server.shutdown()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(results, previous)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+MISS = object()
+
+
+# in-process read-through cache with TTL + LRU eviction and single-flight
+# loading: concurrent misses on one key share a single upstream call.
+# entries can carry tags (e.g. "post:5") so a write can drop every cached
+# page that contains a given row without touching unrelated keys
+class ResponseCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[Hashable, tuple[float, object, tuple]] = (
+            OrderedDict()
+        )
+        self._tags: dict[str, set[Hashable]] = {}
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        # bumped by tag invalidations, which can't see tags of loads that
+        # haven't finished yet
+        self._tag_epoch = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable],
+        tags: Callable[[object], Iterable[str]] | None = None,
+    ):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._remove(key)
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, loader, tags))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # shield so one caller disconnecting doesn't cancel the shared load
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, tags):
+        task = asyncio.current_task()
+        epoch = self._tag_epoch
+        try:
+            value = await loader()
+            # an invalidation while loading means the value may already be
+            # stale, so it is returned to waiters but not stored
+            stale = self._inflight.get(key) is not task or (
+                tags is not None and self._tag_epoch != epoch
+            )
+            if not stale:
+                self._store(key, value, tuple(tags(value)) if tags else ())
+            return value
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def _store(self, key, value, tags: tuple) -> None:
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._inflight.pop(key, None)
+            if self._remove(key):
+                self.invalidations += 1
+
+    def invalidate_tag(self, *tags: str) -> None:
+        self._tag_epoch += 1
+        for tag in tags:
+            self.invalidate(*self._tags.get(tag, ()))
+
+    # nothing is written behind; here for SharedResponseCache's interface
+    async def flush(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        served = self.hits + self.coalesced
+        total = served + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": served / total if total else 0.0,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "inflight": len(self._inflight),
+        }
+
+
+# ResponseCache's interface over a store every worker shares (see
+# shared_state.py): a response is loaded once for all workers, and a write
+# on any of them invalidates it for all. invalidating a tag gives it a new
+# version (its time plus random bytes); entries keep the versions their
+# tags had when stored and are a miss once any has changed, so it costs
+# one write per tag however many entries carry it. every entry is also
+# tagged with its own key, which is how invalidate() works. those writes
+# go out in the background so write hooks stay synchronous, and until they
+# land this worker treats the tags as invalid itself. eviction is left to
+# the store, which expires entries after `ttl`
+class SharedResponseCache:
+    def __init__(
+        self,
+        state,
+        encode: Callable[[object], bytes],
+        decode: Callable[[bytes], object],
+        ttl: float = 30,
+        prefix: str = "cache:",
+        clock_skew: float = 0.1,
+    ):
+        self.state = state
+        self.encode = encode
+        self.decode = decode
+        self.ttl = ttl
+        self.prefix = prefix
+        self.clock_skew = clock_skew
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._tag_epoch = 0
+        # tags whose new versions haven't been written yet
+        self._pending: dict[str, int] = {}
+        self._writes: set[asyncio.Task] = set()
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key!r}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable],
+        tags: Callable[[object], Iterable[str]] | None = None,
+    ):
+        name = self._key(key)
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.ensure_future(self._get_or_load(name, loader, tags))
+            self._inflight[name] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _lookup(self, name: str):
+        data = await self.state.get(name)
+        if data is None:
+            return MISS
+        header, _, payload = data.partition(b"\n")
+        entry = json.loads(header)
+        if any(tag in self._pending for tag in entry["tags"]):
+            self.stale += 1
+            return MISS
+        versions = await self.state.get_many(
+            [self._tag_key(tag) for tag in entry["tags"]]
+        )
+        if [v and v.decode() for v in versions] != entry["versions"]:
+            self.stale += 1
+            return MISS
+        return self.decode(payload)
+
+    async def _get_or_load(self, name: str, loader, tags):
+        task = asyncio.current_task()
+        try:
+            try:
+                value = await self._lookup(name)
+            except Exception:
+                # a store that's down costs hit ratio, never requests
+                self.errors += 1
+                logger.exception(
+                    "Failed to read %s from the shared cache", name
+                )
+                value = MISS
+            if value is not MISS:
+                self.hits += 1
+                return value
+            self.misses += 1
+            started = time.time()
+            epoch = self._tag_epoch
+            value = await loader()
+            if self._inflight.get(name) is task and self._tag_epoch == epoch:
+                entry_tags = [f"={name}", *(tags(value) if tags else ())]
+                try:
+                    await self._store(name, value, entry_tags, started)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("Failed to store %s", name)
+            return value
+        finally:
+            if self._inflight.get(name) is task:
+                del self._inflight[name]
+
+    async def _store(
+        self, name: str, value, tags: list[str], started: float
+    ) -> None:
+        versions = [
+            v and v.decode()
+            for v in await self.state.get_many(
+                [self._tag_key(tag) for tag in tags]
+            )
+        ]
+        # a tag that changed while the value was loading (give or take
+        # the clocks of other hosts) may mean the value is already stale
+        for version in versions:
+            if version and float(version.split(":")[0]) >= (
+                started - self.clock_skew
+            ):
+                return
+        header = json.dumps({"tags": tags, "versions": versions})
+        await self.state.set(
+            name, header.encode() + b"\n" + self.encode(value), self.ttl
+        )
+
+    def _invalidate(self, tags: list[str]) -> None:
+        if not tags:
+            return
+        self.invalidations += len(tags)
+        for tag in tags:
+            self._pending[tag] = self._pending.get(tag, 0) + 1
+        version = f"{time.time():.6f}:{os.urandom(6).hex()}".encode()
+        task = asyncio.ensure_future(
+            self.state.set_many(
+                {self._tag_key(tag): version for tag in tags},
+                # versions outlive every entry stored before them
+                2 * self.ttl + self.clock_skew,
+            )
+        )
+        self._writes.add(task)
+
+        def written(task: asyncio.Task) -> None:
+            self._writes.discard(task)
+            for tag in tags:
+                self._pending[tag] -= 1
+                if not self._pending[tag]:
+                    del self._pending[tag]
+            if not task.cancelled() and task.exception() is not None:
+                self.errors += 1
+                logger.error("Failed to invalidate: %s", task.exception())
+
+        task.add_done_callback(written)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        names = [self._key(key) for key in keys]
+        for name in names:
+            self._inflight.pop(name, None)
+        self._invalidate([f"={name}" for name in names])
+
+    def invalidate_tag(self, *tags: str) -> None:
+        self._tag_epoch += 1
+        self._invalidate(list(tags))
+
+    # waits for invalidations still being written
+    async def flush(self) -> None:
+        if self._writes:
+            await asyncio.wait(list(self._writes))
+
+    def stats(self) -> dict:
+        served = self.hits + self.coalesced
+        total = served + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": served / total if total else 0.0,
+            "stale": self.stale,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+            "pending_invalidations": len(self._writes),
+            "backend": self.state.name,
+        }
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from supabase_auth import AsyncGoTrueClient
+
+
+# one keep-alive HTTP pool shared by the service client and every
+# per-user client, so requests reuse TCP/TLS connections
+def create_http_pool(
+    max_connections: int = 200,
+    max_keepalive: int = 50,
+    timeout: float = 120,
+) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        ),
+        timeout=timeout,
+        follow_redirects=True,
+    )
+
+
+# PostgREST client that sends `token` as its bearer, on the shared pool
+def create_postgrest_client(
+    supabase_url: str, api_key: str, token: str, http_pool: httpx.AsyncClient
+) -> AsyncPostgrestClient:
+    return AsyncPostgrestClient(
+        f"{supabase_url.rstrip('/')}/rest/v1",
+        headers={"apiKey": api_key, "Authorization": f"Bearer {token}"},
+        http_client=http_pool,
+    )
+
+
+# auth client for sign-up, sign-in and token lookups that never holds a
+# session. signing in on a full supabase client switches that client's
+# database requests over to the signed-in user's token
+def create_auth_client(
+    supabase_url: str, api_key: str, http_pool: httpx.AsyncClient
+) -> AsyncGoTrueClient:
+    return AsyncGoTrueClient(
+        url=f"{supabase_url.rstrip('/')}/auth/v1",
+        headers={"apiKey": api_key, "Authorization": f"Bearer {api_key}"},
+        auto_refresh_token=False,
+        persist_session=False,
+        http_client=http_pool,
+    )
+
+
+# opens up to `connections` keep-alive connections ahead of traffic by
+# sending that many concurrent requests to the auth health endpoint.
+# returns how many succeeded
+async def warm_up(
+    http_pool: httpx.AsyncClient,
+    supabase_url: str,
+    api_key: str,
+    connections: int,
+) -> int:
+    url = f"{supabase_url.rstrip('/')}/auth/v1/health"
+
+    async def ping() -> bool:
+        try:
+            response = await http_pool.get(url, headers={"apiKey": api_key})
+            return response.status_code < 500
+        except httpx.HTTPError:
+            return False
+
+    results = await asyncio.gather(*(ping() for _ in range(connections)))
+    return sum(results)
+
+
+# open and idle connections in the pool; reads httpcore internals, so it
+# reports nothing rather than fail if they change
+def pool_stats(http_pool: httpx.AsyncClient) -> dict:
+    pool = getattr(http_pool._transport, "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    return {
+        "connections": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+        "max_connections": pool._max_connections,
+        "max_keepalive": pool._max_keepalive_connections,
+    }
+
+
+# bounded LRU of PostgREST clients scoped to a caller's token; every client
+# sends its requests through the shared pool, so a cache miss only costs a
+# few header dicts instead of a new HTTP client. only used from the event
+# loop, so it needs no lock
+class UserClientPool:
+    def __init__(
+        self,
+        supabase_url: str,
+        api_key: str,
+        http_pool: httpx.AsyncClient,
+        maxsize: int = 1000,
+    ):
+        self.supabase_url = supabase_url
+        self.api_key = api_key
+        self.http_pool = http_pool
+        self.maxsize = maxsize
+        self._clients: OrderedDict[str, AsyncPostgrestClient] = OrderedDict()
+
+    def get(self, token: str) -> AsyncPostgrestClient:
+        key = hashlib.sha256(token.encode()).hexdigest()
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            return client
+        client = create_postgrest_client(
+            self.supabase_url, self.api_key, token, self.http_pool
+        )
+        self._clients[key] = client
+        while len(self._clients) > self.maxsize:
+            self._clients.popitem(last=False)
+        return client
+
+    def stats(self) -> dict:
+        return {"size": len(self._clients), "maxsize": self.maxsize}
+
+
+# table and operation of a postgrest query for metrics, e.g.
+# ("posts", "select") or ("rpc/increment_view_counts", "rpc")
+def describe_query(query) -> tuple[str, str]:
+    request = query.request
+    path = request.path.path.split("/rest/v1/", 1)[-1]
+    method = getattr(request.http_method, "value", request.http_method)
+    if path.startswith("rpc/"):
+        return path, "rpc"
+    if method == "POST":
+        prefer = request.headers.get("prefer", "")
+        return path, "upsert" if "resolution=" in prefer else "insert"
+    return path, {"GET": "select", "PATCH": "update"}.get(
+        method, method.lower()
+    )
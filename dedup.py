@@ -0,0 +1,182 @@
+import hashlib
+import math
+import re
+from typing import Callable, Iterable
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset(
+    {
+        "fbclid",
+        "gclid",
+        "dclid",
+        "msclkid",
+        "mc_cid",
+        "mc_eid",
+        "igshid",
+        "ref",
+        "ref_src",
+        "cmpid",
+        "ocid",
+        "smid",
+        "cid",
+    }
+)
+NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+# one key per article however it was linked: scheme, "www.", default
+# ports, fragments, trailing slashes, tracking parameters and parameter
+# order are all ignored, e.g. "news.example.com/story?id=4"
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").removeprefix("www.")
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    params = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_")
+        and key.lower() not in TRACKING_PARAMS
+    )
+    key = f"{host}{path}"
+    if params:
+        key += "?" + urlencode(params)
+    return key
+
+
+def normalize_text(text: str | None) -> str:
+    return NON_WORD.sub(" ", (text or "").lower()).strip()
+
+
+# the same story republished under another URL has the same title and
+# description once case, punctuation and spacing are ignored. md5 so the
+# backfill in sql/schema.sql can compute identical values. None without a
+# title or content, which would make every untitled stub a "duplicate"
+def fingerprint(title: str | None, content: str | None) -> str | None:
+    title, content = normalize_text(title), normalize_text(content)
+    if not title or not content:
+        return None
+    return hashlib.md5(f"{title}\n{content}".encode()).hexdigest()
+
+
+# fixed-size Bloom filter: "no" is certain, "maybe" is wrong about
+# error_rate of the time once `capacity` keys have been added
+class BloomFilter:
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            8, int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    # k bit positions from two 64-bit hashes (double hashing)
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "keys": self.count,
+            "capacity": self.capacity,
+            "bits": self.size,
+            "hashes": self.hashes,
+            "bytes": len(self.bits),
+        }
+
+
+# keys of a post as stored: "url:<normalized url>" and "fp:<fingerprint>"
+def post_keys(post: dict) -> list[str]:
+    keys = []
+    if post.get("url_key"):
+        keys.append(f"url:{post['url_key']}")
+    if post.get("fingerprint"):
+        keys.append(f"fp:{post['fingerprint']}")
+    return keys
+
+
+# drops posts whose URL or content was already seen. the Bloom filter
+# answers most checks; only posts it can't rule out are confirmed with one
+# lookup(url_keys, fingerprints) call per batch, which returns the
+# post_keys() of the stored posts matching either. apart from that call
+# every check is O(1) per post
+class Deduplicator:
+    def __init__(
+        self,
+        bloom: BloomFilter,
+        lookup: Callable[[list[str], list[str]], set[str]] | None = None,
+    ):
+        self.bloom = bloom
+        self.lookup = lookup
+        self.checked = 0
+        self.lookups = 0
+        self.duplicates = 0
+
+    def seen(self, post: dict) -> None:
+        for key in post_keys(post):
+            self.bloom.add(key)
+
+    def filter(self, posts: list[dict]) -> list[dict]:
+        fresh = []
+        maybe = []
+        batch_keys: set[str] = set()
+        for post in posts:
+            self.checked += 1
+            keys = post_keys(post)
+            # the same article twice in one batch
+            if any(key in batch_keys for key in keys):
+                self.duplicates += 1
+                continue
+            batch_keys.update(keys)
+            if any(key in self.bloom for key in keys):
+                maybe.append((post, keys))
+            else:
+                fresh.append(post)
+
+        if maybe and self.lookup is not None:
+            self.lookups += 1
+            existing = self.lookup(
+                [post["url_key"] for post, _ in maybe if post["url_key"]],
+                [
+                    post["fingerprint"]
+                    for post, _ in maybe
+                    if post["fingerprint"]
+                ],
+            )
+            for post, keys in maybe:
+                if any(key in existing for key in keys):
+                    self.duplicates += 1
+                else:
+                    fresh.append(post)
+        else:
+            # without a lookup a Bloom hit counts as a duplicate
+            self.duplicates += len(maybe)
+
+        for post in fresh:
+            self.seen(post)
+        return fresh
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "lookups": self.lookups,
+            "duplicates": self.duplicates,
+            **self.bloom.stats(),
+        }
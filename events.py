@@ -0,0 +1,182 @@
+import asyncio
+import itertools
+import uuid
+from collections import deque
+from typing import AsyncIterator, Iterable
+
+from responses import dumps
+
+# sent instead of a backlog the subscriber fell too far behind on, or
+# events it missed while disconnected: refetch, then keep listening
+RESYNC = b"event: resync\ndata: {}\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+
+# one connected client: the topics it listens to, its pending frames and
+# the future its stream waits on while idle. a plain list and future
+# rather than asyncio.Queue/Event keep an idle subscriber small
+class Subscription:
+    __slots__ = ("topics", "queue", "waiter")
+
+    def __init__(self, topics: frozenset[str]):
+        self.topics = topics
+        self.queue: list[bytes] = []
+        self.waiter: asyncio.Future | None = None
+
+    def wake(self) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+
+# in-process fan-out of server-sent events. each event is serialized once
+# and pushed onto the queue of every subscriber of one of its topics, so
+# publishing costs one append per interested subscriber and nothing per
+# idle one. queues hold at most queue_size frames; a subscriber that
+# can't keep up has its backlog replaced by a resync event rather than
+# growing without bound or slowing down the writers
+class EventHub:
+    def __init__(
+        self,
+        queue_size: int = 100,
+        replay_size: int = 1000,
+        keepalive: float = 15.0,
+        max_subscribers: int = 50000,
+    ):
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        # event ids are "<epoch>-<seq>", so a Last-Event-ID from before a
+        # restart (or from another worker) is never mistaken for ours.
+        # random, since workers started together share the same second
+        self.epoch = uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._topics: dict[str, set[Subscription]] = {}
+        self._subscribers: set[Subscription] = set()
+        # (seq, topics, frame) of recent events for reconnecting clients
+        self._recent: deque[tuple[int, tuple[str, ...], bytes]] = deque(
+            maxlen=replay_size
+        )
+        self.closed = False
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(
+        self, topics: Iterable[str], last_event_id: str | None = None
+    ) -> Subscription:
+        subscription = Subscription(frozenset(topics))
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self._subscribers.add(subscription)
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[topic]
+
+    # queues what the client missed since last_event_id, or a resync when
+    # that is no longer (or never was) in the replay buffer
+    def _replay(self, subscription: Subscription, last_event_id: str):
+        epoch, _, seq = last_event_id.partition("-")
+        oldest = self._recent[0][0] if self._recent else self._last_id + 1
+        if (
+            epoch != self.epoch
+            or not seq.isdigit()
+            or not oldest - 1 <= int(seq) <= self._last_id
+        ):
+            self._push(subscription, RESYNC)
+            return
+        for event_seq, topics, frame in self._recent:
+            if event_seq > int(seq) and subscription.topics.intersection(
+                topics
+            ):
+                self._push(subscription, frame)
+
+    def _push(self, subscription: Subscription, frame: bytes) -> None:
+        if len(subscription.queue) >= self.queue_size:
+            subscription.queue.clear()
+            subscription.queue.append(RESYNC)
+            self.resyncs += 1
+        else:
+            subscription.queue.append(frame)
+        subscription.wake()
+
+    def publish(self, event: str, data, topics: tuple[str, ...]) -> None:
+        seq = next(self._ids)
+        self._last_id = seq
+        frame = b"".join(
+            (
+                f"id: {self.epoch}-{seq}\nevent: {event}\ndata: ".encode(),
+                dumps(data),
+                b"\n\n",
+            )
+        )
+        self._recent.append((seq, topics, frame))
+        self.published += 1
+        targets = set()
+        for topic in topics:
+            targets.update(self._topics.get(topic, ()))
+        for subscription in targets:
+            self._push(subscription, frame)
+
+    # the response body of one subscriber: everything queued since the last
+    # write goes out as one chunk. unsubscribes when the client goes away
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        try:
+            # tells EventSource how soon to reconnect, and gets the headers
+            # through proxies that wait for a first byte
+            yield b"retry: 3000\n\n"
+            loop = asyncio.get_running_loop()
+            while not self.closed:
+                if not subscription.queue:
+                    subscription.waiter = loop.create_future()
+                    await subscription.waiter
+                    continue
+                frames, subscription.queue = subscription.queue, []
+                self.delivered += sum(f is not KEEPALIVE for f in frames)
+                yield b"".join(frames)
+        finally:
+            self.unsubscribe(subscription)
+
+    # one timer for all connections: every keepalive seconds, idle
+    # subscribers get a comment line so proxies don't close them
+    async def run(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(self.keepalive)
+            for subscription in self._subscribers:
+                if not subscription.queue:
+                    subscription.queue.append(KEEPALIVE)
+                    subscription.wake()
+
+    # ends every open stream and any opened later. api.py calls it as soon
+    # as the server is told to exit, since the server waits for them
+    def close(self) -> None:
+        self.closed = True
+        for subscription in self._subscribers:
+            subscription.wake()
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+            "queued": sum(len(s.queue) for s in self._subscribers),
+        }
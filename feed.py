@@ -0,0 +1,151 @@
+import math
+import os
+from bisect import bisect_right, insort
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+
+# weights for the ranking formula; every field can be overridden with a
+# FEED_<NAME> environment variable, e.g. FEED_SAVE=3
+@dataclass(frozen=True)
+class FeedWeights:
+    like: float = 1.0
+    save: float = 2.0
+    view: float = 0.01
+    half_life_hours: float = 12.0
+
+    @classmethod
+    def from_env(cls) -> "FeedWeights":
+        overrides = {}
+        for f in fields(cls):
+            value = os.getenv(f"FEED_{f.name.upper()}")
+            if value is not None:
+                overrides[f.name] = float(value)
+        return cls(**overrides)
+
+
+@dataclass
+class PostStats:
+    created_at: float
+    likes: int = 0
+    saves: int = 0
+    views: int = 0
+
+
+# engagement decays by half every half_life_hours. instead of decaying every
+# score as time passes, score = log2(engagement) + age bonus, which ranks
+# posts identically but never changes unless the post itself changes, so
+# scores can live in a sorted list and be updated one post at a time
+def score(stats: PostStats, weights: FeedWeights) -> float:
+    engagement = (
+        weights.like * stats.likes
+        + weights.save * stats.saves
+        + weights.view * stats.views
+    )
+    return math.log2(1 + max(engagement, 0)) + stats.created_at / (
+        weights.half_life_hours * 3600
+    )
+
+
+def parse_timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+# in-memory ranked feed: post stats by id plus a list of (-score, -id)
+# kept sorted, so a page is a bisect and a slice
+class FeedEngine:
+    def __init__(self, weights: FeedWeights | None = None, scorer=score):
+        self.weights = weights or FeedWeights()
+        self.scorer = scorer
+        self._posts: dict[int, PostStats] = {}
+        self._keys: dict[int, tuple[float, int]] = {}
+        self._ranked: list[tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._posts)
+
+    def _rank(self, post_id: int) -> None:
+        old = self._keys.pop(post_id, None)
+        if old is not None:
+            del self._ranked[bisect_right(self._ranked, old) - 1]
+        stats = self._posts.get(post_id)
+        if stats is not None:
+            key = (-self.scorer(stats, self.weights), -post_id)
+            self._keys[post_id] = key
+            insort(self._ranked, key)
+
+    def load(self, posts: list[dict]) -> None:
+        self._posts = {}
+        for row in posts:
+            self._posts[row["id"]] = PostStats(
+                created_at=parse_timestamp(row["created_at"]),
+                likes=row.get("like_count", 0),
+                saves=row.get("save_count", 0),
+                views=row.get("view_count", 0),
+            )
+        self.reweight(self.weights)
+
+    # changing weights is the only operation that rescores everything
+    def reweight(self, weights: FeedWeights) -> None:
+        self.weights = weights
+        self._keys = {
+            post_id: (-self.scorer(stats, weights), -post_id)
+            for post_id, stats in self._posts.items()
+        }
+        self._ranked = sorted(self._keys.values())
+
+    def upsert_post(self, row: dict) -> None:
+        stats = self._posts.get(row["id"])
+        if stats is None:
+            self._posts[row["id"]] = PostStats(
+                created_at=parse_timestamp(row["created_at"]),
+                views=row.get("view_count", 0),
+            )
+        self._rank(row["id"])
+
+    def remove_post(self, post_id: int) -> None:
+        self._posts.pop(post_id, None)
+        self._rank(post_id)
+
+    def add_interaction(
+        self, post_id: int, interaction_type: str, delta: int = 1
+    ) -> None:
+        stats = self._posts.get(post_id)
+        if stats is None:
+            return
+        if interaction_type == "like":
+            stats.likes += delta
+        elif interaction_type == "save":
+            stats.saves += delta
+        self._rank(post_id)
+
+    def add_views(self, views: dict[int, int]) -> None:
+        for post_id, count in views.items():
+            stats = self._posts.get(post_id)
+            if stats is not None:
+                stats.views += count
+                self._rank(post_id)
+
+    # top-k after the (score, id) cursor of the previous page
+    def page(
+        self, limit: int, after: tuple[float, int] | None = None
+    ) -> list[dict]:
+        start = 0
+        if after is not None:
+            start = bisect_right(self._ranked, (-after[0], -after[1]))
+        items = []
+        for neg_score, neg_id in self._ranked[start : start + limit]:
+            stats = self._posts[-neg_id]
+            items.append(
+                {
+                    "id": -neg_id,
+                    "score": -neg_score,
+                    "like_count": stats.likes,
+                    "save_count": stats.saves,
+                    "view_count": stats.views,
+                }
+            )
+        return items
+
+    def stats(self) -> dict:
+        return {"posts": len(self._posts), "weights": vars(self.weights)}
@@ -0,0 +1,412 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
+
+import requests
+
+from dedup import (
+    BloomFilter,
+    Deduplicator,
+    fingerprint,
+    normalize_url,
+    post_keys,
+)
+
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+
+
+# token bucket shared by the fetch threads: `rate` requests per second with
+# bursts of up to `burst`
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                refill = (now - self._updated) * self.rate
+                self._tokens = min(self.burst, self._tokens + refill)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# NewsAPI /v2/everything, one keep-alive session for all fetch threads.
+# `url` points it at a stand-in such as benchmarks/fake_newsapi.py
+class NewsApiSource:
+    def __init__(
+        self, api_key: str, page_size: int = 20, url: str = NEWS_API_URL
+    ):
+        self.api_key = api_key
+        self.page_size = page_size
+        self.url = url
+        self.session = requests.Session()
+
+    def fetch(self, topic: str, page: int, **params) -> list[dict]:
+        response = self.session.get(
+            self.url,
+            params={
+                "q": topic,
+                "apiKey": self.api_key,
+                "language": "en",
+                "sortBy": "popularity",
+                "pageSize": self.page_size,
+                "page": page,
+                **params,
+            },
+            timeout=30,
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data.get("status") != "ok":
+            raise RuntimeError(data.get("message", "NewsAPI request failed"))
+        return data["articles"]
+
+
+# stands in for NewsAPI offline: serves pages from a JSON file of
+# {topic: [article, ...]}, optionally sleeping to mimic network latency
+class FixtureSource:
+    def __init__(self, path: str, page_size: int = 20, latency: float = 0):
+        with open(path) as f:
+            self.articles: dict[str, list[dict]] = json.load(f)
+        self.page_size = page_size
+        self.latency = latency
+
+    def fetch(self, topic: str, page: int, **params) -> list[dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        start = (page - 1) * self.page_size
+        return self.articles.get(topic, [])[start : start + self.page_size]
+
+
+@dataclass
+class IngestReport:
+    fetched: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    batches: int = 0
+    errors: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        rate = self.inserted / self.seconds if self.seconds else 0
+        return (
+            f"fetched {self.fetched} articles, inserted {self.inserted} "
+            f"posts in {self.batches} batches, skipped {self.skipped}, "
+            f"{self.duplicates} duplicates, "
+            f"{len(self.errors)} errors in {self.seconds:.2f}s "
+            f"({rate:.1f} posts/s)"
+        )
+
+
+# fetches every (topic, page) concurrently and yields articles as each
+# page arrives, so inserting can start before fetching finishes
+def fetch_articles(
+    source,
+    topics: list[str],
+    pages: int = 1,
+    workers: int = 8,
+    limiter: RateLimiter | None = None,
+    report: IngestReport | None = None,
+) -> Iterator[dict]:
+    def fetch(topic: str, page: int) -> list[dict]:
+        if limiter is not None:
+            limiter.acquire()
+        return source.fetch(topic, page)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch, topic, page): topic
+            for topic in topics
+            for page in range(1, pages + 1)
+        }
+        for future in as_completed(futures):
+            try:
+                articles = future.result()
+            except Exception as e:
+                if report is not None:
+                    report.errors.append(f"{futures[future]}: {e}")
+                continue
+            if report is not None:
+                report.fetched += len(articles)
+            yield from articles
+
+
+# pages through one topic newest first and yields the articles published
+# after `since`, stopping at the first older one, so a poll with nothing
+# new costs a single request. NewsAPI serves only the first 100 results of
+# a query, so when max_pages run out the next window starts again at page 1
+# with `to` set to the oldest article so far. `seen` are the urls already
+# taken at exactly `since`, which `from` includes
+def fetch_new_articles(
+    source,
+    topic: str,
+    since: str | None = None,
+    seen: Iterable[str] = (),
+    max_pages: int = 5,
+    limiter: RateLimiter | None = None,
+) -> Iterator[dict]:
+    seen = set(seen)
+    # the oldest publishedAt yielded so far and the urls yielded at it
+    until, boundary = None, set()
+    while True:
+        params = {"sortBy": "publishedAt"}
+        if since:
+            params["from"] = since
+        if until:
+            params["to"] = until
+        found = False
+        for page in range(1, max_pages + 1):
+            if limiter is not None:
+                limiter.acquire()
+            articles = source.fetch(topic, page, **params)
+            for article in articles:
+                published = article.get("publishedAt") or ""
+                url = article.get("url")
+                if since and published < since:
+                    return
+                if published == since and url in seen:
+                    continue
+                # the next window starts with these again
+                if published == until and url in boundary:
+                    continue
+                if published != until:
+                    until, boundary = published, set()
+                boundary.add(url)
+                found = True
+                yield article
+            if len(articles) < source.page_size:
+                return
+        if not found:
+            return
+
+
+# url_key and fingerprint are computed from the stored (truncated) title
+# and content so they match what the database backfill computes
+def article_to_post(article: dict, user_id: str) -> dict | None:
+    if not article.get("url"):
+        return None
+    title = (article.get("title") or "Untitled Article")[:100]
+    content = (article.get("description") or "")[:500]
+    return {
+        "user_id": user_id,
+        "article_url": article["url"],
+        "title": title,
+        "content": content,
+        "thumbnail_url": article.get("urlToImage"),
+        "url_key": normalize_url(article["url"]),
+        "fingerprint": fingerprint(title, content),
+    }
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# streams articles into posts, assigning authors round-robin, and writes
+# them batch_size rows per request. insert=None counts without writing.
+# with a dedup, articles already stored or repeated in the stream are
+# dropped before their batch is written
+def ingest_posts(
+    articles: Iterable[dict],
+    user_ids: list[str],
+    insert=None,
+    batch_size: int = 100,
+    report: IngestReport | None = None,
+    dedup: Deduplicator | None = None,
+) -> IngestReport:
+    report = report or IngestReport()
+
+    def posts() -> Iterator[dict]:
+        for i, article in enumerate(articles):
+            post = article_to_post(article, user_ids[i % len(user_ids)])
+            if post is None:
+                report.skipped += 1
+                continue
+            yield post
+
+    for batch in batched(posts(), batch_size):
+        if dedup is not None:
+            try:
+                fresh = dedup.filter(batch)
+            except Exception as e:
+                report.errors.append(f"dedup of {len(batch)}: {e}")
+                continue
+            report.duplicates += len(batch) - len(fresh)
+            batch = fresh
+            if not batch:
+                continue
+        try:
+            if insert is not None:
+                insert(batch)
+        except Exception as e:
+            report.errors.append(f"batch of {len(batch)}: {e}")
+            continue
+        report.inserted += len(batch)
+        report.batches += 1
+    return report
+
+
+# per-topic watermarks on disk: the publishedAt of the newest article
+# committed and the urls committed at exactly that time. saved by writing
+# a temp file and renaming it over the old one, so a crash leaves the old
+# checkpoint or the new one, never half of one
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.topics: dict[str, dict] = {}
+        try:
+            with open(path) as f:
+                self.topics = json.load(f)["topics"]
+        except FileNotFoundError:
+            pass
+
+    def watermark(self, topic: str) -> tuple[str | None, set[str]]:
+        entry = self.topics.get(topic)
+        if entry is None:
+            return None, set()
+        return entry["published_at"], set(entry["urls"])
+
+    # moves the topic's watermark past `articles`, oldest first
+    def advance(self, topic: str, articles: list[dict]) -> None:
+        since, urls = self.watermark(topic)
+        for article in articles:
+            published = article.get("publishedAt")
+            if not published or (since and published < since):
+                continue
+            if published != since:
+                since, urls = published, set()
+            if article.get("url"):
+                urls.add(article["url"])
+        if since is None:
+            return
+        entry = self.topics.setdefault(topic, {"ingested": 0})
+        entry["published_at"] = since
+        entry["urls"] = sorted(urls)
+        entry["ingested"] += len(articles)
+        entry["updated_at"] = time.time()
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"topics": self.topics}, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+
+# a Deduplicator loaded with the keys of every stored post, that confirms
+# Bloom filter hits against the posts table (one query per key kind).
+# `client` is a supabase or postgrest client
+def database_deduplicator(
+    client, capacity: int = 1_000_000, page_size: int = 1000
+) -> Deduplicator:
+    def lookup(url_keys: list[str], fingerprints: list[str]) -> set[str]:
+        rows = []
+        if url_keys:
+            rows += (
+                client.table("posts")
+                .select("url_key,fingerprint")
+                .in_("url_key", url_keys)
+                .execute()
+                .data
+            )
+        if fingerprints:
+            rows += (
+                client.table("posts")
+                .select("url_key,fingerprint")
+                .in_("fingerprint", fingerprints)
+                .execute()
+                .data
+            )
+        return {key for row in rows for key in post_keys(row)}
+
+    dedup = Deduplicator(BloomFilter(capacity=capacity), lookup)
+    start = 0
+    while True:
+        rows = (
+            client.table("posts")
+            .select("url_key,fingerprint")
+            .order("id")
+            .range(start, start + page_size - 1)
+            .execute()
+            .data
+        )
+        for row in rows:
+            dedup.seen(row)
+        if len(rows) < page_size:
+            return dedup
+        start += page_size
+
+
+# sets url_key on posts stored before the column existed, with the same
+# normalize_url() the API and the scripts use, which sql/schema.sql can't
+# reproduce. oldest first: a post whose key is already taken keeps none,
+# so the unique index holds, and is still found by its fingerprint.
+# returns (keyed, skipped)
+def backfill_url_keys(client, page_size: int = 1000) -> tuple[int, int]:
+    keyed = skipped = 0
+    last_id = 0
+    while True:
+        rows = (
+            client.table("posts")
+            .select("id,article_url")
+            .is_("url_key", "null")
+            .gt("id", last_id)
+            .order("id")
+            .limit(page_size)
+            .execute()
+            .data
+        )
+        if not rows:
+            return keyed, skipped
+        last_id = rows[-1]["id"]
+        keys = {
+            row["id"]: normalize_url(row["article_url"])
+            for row in rows
+            if row.get("article_url")
+        }
+        skipped += len(rows) - len(keys)
+        taken = {
+            row["url_key"]
+            for row in client.table("posts")
+            .select("url_key")
+            .in_("url_key", list(set(keys.values())))
+            .execute()
+            .data
+        }
+        for post_id, key in keys.items():
+            if key in taken:
+                skipped += 1
+                continue
+            taken.add(key)
+            client.table("posts").update({"url_key": key}).eq(
+                "id", post_id
+            ).execute()
+            keyed += 1
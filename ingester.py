@@ -0,0 +1,250 @@
+import argparse
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from postgrest import SyncPostgrestClient
+
+from dedup import BloomFilter, Deduplicator
+from ingest import (
+    NEWS_API_URL,
+    Checkpoint,
+    IngestReport,
+    NewsApiSource,
+    RateLimiter,
+    batched,
+    database_deduplicator,
+    fetch_new_articles,
+    ingest_posts,
+)
+
+TOPICS = [
+    "technology",
+    "science",
+    "space",
+    "artificial intelligence",
+    "environment",
+]
+
+# ingested articles are posted by this profile instead of being spread
+# over real users' accounts
+INGEST_PROFILE = {
+    "id": "f5eebc99-9c0b-4ef8-bb6d-6bb9bd380a66",
+    "email": "news@example.com",
+    "username": "betterfeed_news",
+    "avatar_url": None,
+}
+
+parser = argparse.ArgumentParser(
+    description="Keep BetterFeed posts up to date with NewsAPI"
+)
+parser.add_argument(
+    "--topics", default=",".join(TOPICS), help="comma separated topics"
+)
+parser.add_argument(
+    "--interval", type=float, default=900, help="seconds between polls"
+)
+parser.add_argument(
+    "--once", action="store_true", help="poll every topic once and exit"
+)
+parser.add_argument(
+    "--checkpoint",
+    default=os.getenv("INGEST_CHECKPOINT", "ingest_checkpoint.json"),
+    help="file holding the per-topic watermarks",
+)
+parser.add_argument(
+    "--since",
+    help="publishedAt to start from for topics without a watermark "
+    "(default: 24 hours ago)",
+)
+parser.add_argument("--page-size", type=int, default=100)
+parser.add_argument(
+    "--max-pages",
+    type=int,
+    default=1,
+    help="pages per query window; NewsAPI serves 100 results per query",
+)
+parser.add_argument(
+    "--rate", type=float, default=1, help="max NewsAPI requests per second"
+)
+parser.add_argument("--batch-size", type=int, default=100)
+parser.add_argument(
+    "--user-id",
+    default=os.getenv("INGEST_USER_ID"),
+    help="profile that authors the posts (default: the ingest profile)",
+)
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="fetch and transform without writing posts (the checkpoint "
+    "still advances)",
+)
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# fetches what's new in one topic, then writes it oldest first, saving
+# the checkpoint after every batch. a failed fetch writes nothing and a
+# failed batch stops the topic there, so the next poll picks up exactly
+# where the last committed batch ended. returns the topic's report and the
+# lag: seconds between publication and commit for its newest article
+def ingest_topic(
+    topic: str,
+    source: NewsApiSource,
+    checkpoint: Checkpoint,
+    args,
+    user_id: str,
+    insert,
+    dedup: Deduplicator,
+    limiter: RateLimiter,
+    stop: threading.Event,
+) -> tuple[IngestReport, float | None]:
+    report = IngestReport()
+    since, seen = checkpoint.watermark(topic)
+    try:
+        articles = list(
+            fetch_new_articles(
+                source,
+                topic,
+                since or args.since,
+                seen,
+                args.max_pages,
+                limiter,
+            )
+        )
+    except Exception as e:
+        report.errors.append(f"fetch: {e}")
+        return report, None
+    report.fetched = len(articles)
+    articles.sort(key=lambda article: article.get("publishedAt") or "")
+
+    lag = None
+    for batch in batched(articles, args.batch_size):
+        if stop.is_set():
+            break
+        errors = len(report.errors)
+        ingest_posts(batch, [user_id], insert, len(batch), report, dedup)
+        if len(report.errors) > errors:
+            break
+        checkpoint.advance(topic, batch)
+        checkpoint.save()
+        newest = batch[-1].get("publishedAt")
+        if newest:
+            lag = time.time() - parse_time(newest).timestamp()
+    return report, lag
+
+
+def main():
+    args = parser.parse_args()
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    service_key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not args.dry_run and (not supabase_url or not service_key):
+        print("ERROR: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set")
+        raise SystemExit(1)
+    if not args.since:
+        args.since = format_time(
+            datetime.now(timezone.utc) - timedelta(hours=24)
+        )
+
+    source = NewsApiSource(
+        os.getenv("NEWS_API_KEY"),
+        args.page_size,
+        os.getenv("NEWS_API_URL", NEWS_API_URL),
+    )
+    checkpoint = Checkpoint(args.checkpoint)
+    limiter = RateLimiter(args.rate)
+    topics = [topic.strip() for topic in args.topics.split(",")]
+    user_id = args.user_id or INGEST_PROFILE["id"]
+
+    insert = None
+    dedup = Deduplicator(BloomFilter(capacity=1_000_000))
+    if not args.dry_run:
+        client = SyncPostgrestClient(
+            f"{supabase_url.rstrip('/')}/rest/v1",
+            headers={
+                "apiKey": service_key,
+                "Authorization": f"Bearer {service_key}",
+            },
+        )
+        if not args.user_id:
+            client.table("profiles").upsert(
+                INGEST_PROFILE, on_conflict="id", ignore_duplicates=True
+            ).execute()
+        dedup = database_deduplicator(client)
+        print(f"Loaded {dedup.bloom.count} keys of existing posts")
+
+        # the unique url_key index is the last word if two ingesters race
+        def insert(batch):
+            client.table("posts").upsert(
+                batch, on_conflict="url_key", ignore_duplicates=True
+            ).execute()
+
+    # finish the batch in hand, save, then exit
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    total = IngestReport()
+    while not stop.is_set():
+        started = time.perf_counter()
+        cycle = IngestReport()
+        lags = []
+        for topic in topics:
+            if stop.is_set():
+                break
+            report, lag = ingest_topic(
+                topic,
+                source,
+                checkpoint,
+                args,
+                user_id,
+                insert,
+                dedup,
+                limiter,
+                stop,
+            )
+            watermark, _ = checkpoint.watermark(topic)
+            line = (
+                f"{topic}: {report.fetched} new, {report.inserted} posted, "
+                f"{report.duplicates} duplicates, watermark {watermark}"
+            )
+            if lag is not None:
+                lags.append(lag)
+                line += f", lag {lag:.0f}s"
+            print(line)
+            for error in report.errors:
+                print(f"  Error: {error[:200]}")
+            for counts in (cycle, total):
+                counts.fetched += report.fetched
+                counts.inserted += report.inserted
+                counts.skipped += report.skipped
+                counts.duplicates += report.duplicates
+                counts.batches += report.batches
+                counts.errors += report.errors
+
+        elapsed = time.perf_counter() - started
+        rate = cycle.fetched / elapsed if elapsed else 0
+        print(
+            f"poll done: {cycle.fetched} articles in {elapsed:.2f}s "
+            f"({rate:.1f} articles/s)"
+            + (f", max lag {max(lags):.0f}s" if lags else "")
+        )
+        if args.once:
+            break
+        stop.wait(max(0, args.interval - elapsed))
+
+    print(total.summary())
+
+
+if __name__ == "__main__":
+    main()
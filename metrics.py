@@ -0,0 +1,310 @@
+import contextvars
+import logging
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# seconds; the Prometheus client defaults
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+
+
+def format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n")
+        )
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# minimal in-process metric types rendering the Prometheus text format.
+# every update happens on the event loop, so there is no locking
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: dict[tuple, object] = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes {self.label_names}")
+            child = self._children[values] = self._child()
+        return child
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        for values, child in self._children.items():
+            labels = format_labels(self.label_names, values)
+            yield self.name, labels, child.value
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    type = "counter"
+    _child = _Value
+
+
+class Gauge(Metric):
+    type = "gauge"
+    _child = _Value
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self) -> _Histogram:
+        return _Histogram(self.buckets)
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        bucket_labels = self.label_names + ("le",)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = format_labels(
+                    bucket_labels, values + (format_value(bound),)
+                )
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = format_labels(self.label_names, values)
+            yield f"{self.name}_sum", labels, child.sum
+            yield f"{self.name}_count", labels, child.count
+
+
+# collectors are called on every scrape and return
+# {metric name: (help, value)} for values that already live elsewhere,
+# e.g. the cache's hit counters
+Collector = Callable[[], dict[str, tuple[str, float]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._collectors: list[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collector(self, collect: Collector) -> Collector:
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        for collect in self._collectors:
+            try:
+                collected = collect()
+            except Exception:
+                logger.exception("Metrics collector failed")
+                continue
+            for name, (help, value) in collected.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+"""
+per-request phases
+"""
+
+
+# seconds spent in each phase of the current request, e.g. auth, upstream,
+# serialize; set by MetricsMiddleware and filled in by phase()
+current_phases: contextvars.ContextVar[dict[str, float] | None] = (
+    contextvars.ContextVar("current_phases", default=None)
+)
+
+
+def record_phase(name: str, seconds: float) -> None:
+    phases = current_phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+        phases[f"{name}_calls"] = phases.get(f"{name}_calls", 0) + 1
+
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+
+# "total 812.3ms: upstream 790.1ms (3 calls), auth 1.2ms, other 20.9ms"
+def format_phases(total: float, phases: dict[str, float]) -> str:
+    parts = []
+    accounted = 0.0
+    for name, seconds in phases.items():
+        if name.endswith("_calls"):
+            continue
+        accounted += seconds
+        calls = phases.get(f"{name}_calls", 1)
+        suffix = f" ({calls} calls)" if calls > 1 else ""
+        parts.append(f"{name} {seconds * 1000:.1f}ms{suffix}")
+    parts.append(f"other {max(total - accounted, 0) * 1000:.1f}ms")
+    return f"total {total * 1000:.1f}ms: " + ", ".join(parts)
+
+
+# request counters, latency histograms and in-flight gauges for every
+# HTTP route
+class HttpMetrics:
+    def __init__(self, registry: Registry):
+        self.requests = registry.counter(
+            "http_requests_total",
+            "HTTP requests by route and status",
+            ("method", "route", "status"),
+        )
+        self.latency = registry.histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency by route",
+            ("method", "route"),
+        )
+        self.in_flight = registry.gauge(
+            "http_requests_in_flight",
+            "HTTP requests currently being served",
+            ("method",),
+        )
+
+
+# ASGI middleware timing every HTTP request by route template (not raw
+# path, which would give one series per post id). requests slower than
+# slow_ms are logged with their per-phase breakdown. event streams are
+# counted but not timed: they last as long as the client stays connected
+class MetricsMiddleware:
+    def __init__(self, app, metrics: HttpMetrics, slow_ms: float = 0):
+        self.app = app
+        self.metrics = metrics
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        streaming = False
+        phases: dict[str, float] = {}
+        token = current_phases.set(phases)
+
+        async def send_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name == b"content-type"
+                    and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers") or ()
+                )
+            await send(message)
+
+        in_flight = self.metrics.in_flight.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            current_phases.reset(token)
+            # set by the router once the request matched a route
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.metrics.requests.labels(method, route, str(status)).inc()
+            if not streaming:
+                self.metrics.latency.labels(method, route).observe(elapsed)
+                if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+                    logger.warning(
+                        "Slow request %s %s -> %s, %s",
+                        method,
+                        scope["path"],
+                        status,
+                        format_phases(elapsed, phases),
+                    )
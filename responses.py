@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import phase
+
+# both optional: orjson is several times faster than json.dumps and brotli
+# compresses text noticeably smaller than gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def dumps(content) -> bytes:
+    with phase("serialize"):
+        if orjson is None:
+            return json.dumps(
+                content,
+                ensure_ascii=False,
+                allow_nan=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def loads(body: bytes):
+    if orjson is None:
+        return json.loads(body)
+    return orjson.loads(body)
+
+
+# JSON responses rendered with orjson when it is installed. returning one
+# directly from an endpoint also skips FastAPI's jsonable_encoder pass,
+# which is safe for rows that came out of PostgREST as plain JSON
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# a response body serialized once, with a strong ETag from its hash, so
+# cached responses are neither re-serialized nor re-hashed per request
+@dataclass(frozen=True)
+class Rendered:
+    content: object
+    body: bytes
+    etag: str
+
+
+def render(content) -> Rendered:
+    body = dumps(content)
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return Rendered(content, body, f'"{digest}"')
+
+
+# a Rendered (or None) as bytes for a cache shared between processes: the
+# ETag, a newline, then the body the content is parsed back from
+def pack(rendered: Rendered | None) -> bytes:
+    if rendered is None:
+        return b""
+    return rendered.etag.encode() + b"\n" + rendered.body
+
+
+def unpack(data: bytes) -> Rendered | None:
+    if not data:
+        return None
+    etag, _, body = data.partition(b"\n")
+    return Rendered(loads(body), body, etag.decode())
+
+
+# weak comparison, as If-None-Match requires: W/"x" matches "x"
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+# 304 when the client already has this version, the body otherwise
+def conditional_response(
+    request: Request, rendered: Rendered, cache_control: str
+) -> Response:
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        rendered.body, media_type="application/json", headers=headers
+    )
+
+
+# picks br or gzip from an Accept-Encoding header, honouring q=0
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    wildcard = offered.get("*", 0.0)
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        if offered.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+# ASGI middleware compressing single-body responses of at least
+# minimum_size bytes. streamed responses (e.g. server-sent events) and
+# already encoded bodies are passed through untouched
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        with phase("compress"):
+            if encoding == "br":
+                return brotli.compress(body, quality=self.brotli_quality)
+            return gzip.compress(body, self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+            ):
+                passthrough = True
+                await send(start)
+                return await send(message)
+            body = self.compress(body, encoding)
+            # the compressed bytes differ, so a strong ETag becomes weak
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,52 @@
+import os
+import re
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "sql", "schema.sql")
+
+CREATE_TABLE = re.compile(r"CREATE TABLE (\w+) \((.*?)\n\);", re.S)
+ADD_COLUMN = re.compile(
+    r"ALTER TABLE (\w+)\s+ADD COLUMN (?:IF NOT EXISTS )?(\w+)", re.I
+)
+# lines inside CREATE TABLE that are constraints rather than columns
+CONSTRAINTS = {"UNIQUE", "PRIMARY", "CONSTRAINT", "CHECK", "FOREIGN"}
+
+
+# column names per table, read from sql/schema.sql so the API accepts
+# exactly the columns the database has
+def load_columns(path: str = SCHEMA_PATH) -> dict[str, tuple[str, ...]]:
+    with open(path) as f:
+        sql = f.read()
+    columns: dict[str, list[str]] = {}
+    for table, body in CREATE_TABLE.findall(sql):
+        names = columns.setdefault(table, [])
+        for line in body.splitlines():
+            line = line.strip()
+            if not line or line.startswith("--"):
+                continue
+            name = re.match(r"\w+", line).group()
+            if name.upper() not in CONSTRAINTS:
+                names.append(name)
+    for table, name in ADD_COLUMN.findall(sql):
+        columns.setdefault(table, []).append(name)
+    return {table: tuple(names) for table, names in columns.items()}
+
+
+COLUMNS = load_columns()
+
+
+# parses ?fields=id,title into a postgrest select list, always keeping
+# the columns the caller needs (ids for caching, sort keys for cursors).
+# returns None for "all columns"
+def parse_fields(
+    raw: str | None, table: str, required: tuple[str, ...] = ("id",)
+) -> tuple[str, ...] | None:
+    if raw is None:
+        return None
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in COLUMNS[table]]
+    if unknown or not fields:
+        raise ValueError(
+            f"Unknown {table} fields: {', '.join(unknown) or raw}. "
+            f"Allowed: {', '.join(COLUMNS[table])}"
+        )
+    return tuple(dict.fromkeys((*required, *fields)))
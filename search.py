@@ -0,0 +1,120 @@
+import math
+import re
+from bisect import bisect_right
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+
+# lowercased words minus stopwords, with plurals folded so "article"
+# matches "articles"
+def tokenize(text: str | None) -> list[str]:
+    terms = []
+    for word in TOKEN.findall((text or "").lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and word[-2] not in "su":
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+# in-process inverted index over post titles and content with BM25
+# ranking, for running without the database's full-text search. documents
+# are added, replaced and removed one at a time, so keeping it current
+# costs one post's terms per write
+class SearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, title_weight=2):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        # term -> {post id: weighted term frequency}
+        self._postings: dict[str, dict[int, int]] = {}
+        self._terms: dict[int, tuple[str, ...]] = {}
+        self._lengths: dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, post_id: int, title: str | None, content: str | None):
+        self.remove(post_id)
+        frequencies: dict[str, int] = {}
+        # title matches count title_weight times, like setweight('A')
+        for term in tokenize(title):
+            frequencies[term] = frequencies.get(term, 0) + self.title_weight
+        for term in tokenize(content):
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[post_id] = frequency
+        length = sum(frequencies.values())
+        self._terms[post_id] = tuple(frequencies)
+        self._lengths[post_id] = length
+        self._total_length += length
+
+    def remove(self, post_id: int) -> None:
+        length = self._lengths.pop(post_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._terms.pop(post_id):
+            postings = self._postings[term]
+            del postings[post_id]
+            if not postings:
+                del self._postings[term]
+
+    def load(self, posts: list[dict]) -> None:
+        self._postings = {}
+        self._terms = {}
+        self._lengths = {}
+        self._total_length = 0
+        for row in posts:
+            self.add(row["id"], row.get("title"), row.get("content"))
+
+    # posts containing every query term, best first, after the
+    # (rank, id) cursor of the previous page
+    def search(
+        self, query: str, limit: int, after: tuple[float, int] | None = None
+    ) -> list[tuple[int, float]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        postings = [self._postings.get(term) for term in terms]
+        if not terms or not all(postings):
+            return []
+        postings.sort(key=len)
+        matches = set(postings[0])
+        for other in postings[1:]:
+            matches.intersection_update(other)
+        if not matches:
+            return []
+
+        n = len(self._lengths)
+        average = self._total_length / n
+        scores = dict.fromkeys(matches, 0.0)
+        for term_postings in postings:
+            df = len(term_postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for post_id in matches:
+                tf = term_postings[post_id]
+                norm = self.k1 * (
+                    1 - self.b + self.b * self._lengths[post_id] / average
+                )
+                scores[post_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(
+            (-score, -post_id) for post_id, score in scores.items()
+        )
+        start = 0
+        if after is not None:
+            start = bisect_right(ranked, (-after[0], -after[1]))
+        return [
+            (-neg_id, -neg_score)
+            for neg_score, neg_id in ranked[start : start + limit]
+        ]
+
+    def stats(self) -> dict:
+        return {"documents": len(self._lengths), "terms": len(self._postings)}
@@ -1,9 +1,32 @@
 import os
-import requests
+import argparse
+import random
 from supabase import create_client, Client
-from datetime import datetime
 from dotenv import load_dotenv
-import time
+from dedup import BloomFilter, Deduplicator
+from ingest import (
+    FixtureSource,
+    IngestReport,
+    NEWS_API_URL,
+    NewsApiSource,
+    RateLimiter,
+    backfill_url_keys,
+    batched,
+    database_deduplicator,
+    fetch_articles,
+    ingest_posts,
+)
+
+parser = argparse.ArgumentParser(description="Seed BetterFeed with articles")
+parser.add_argument('--fixture', help="read articles from a local JSON fixture instead of NewsAPI")
+parser.add_argument('--fixture-latency', type=float, default=0, help="seconds each fixture page takes, to mimic NewsAPI")
+parser.add_argument('--pages', type=int, default=1, help="pages to fetch per topic")
+parser.add_argument('--page-size', type=int, default=3, help="articles per page")
+parser.add_argument('--workers', type=int, default=8, help="concurrent fetches")
+parser.add_argument('--rate', type=float, default=5, help="max NewsAPI requests per second")
+parser.add_argument('--batch-size', type=int, default=100, help="rows per insert")
+parser.add_argument('--dry-run', action='store_true', help="fetch and transform without writing to Supabase")
+args = parser.parse_args()
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,16 +37,17 @@ SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Changed from ANON_KE
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 
 # Debug: Check if variables are loaded
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+if not args.dry_run and (not SUPABASE_URL or not SUPABASE_SERVICE_KEY):
     print("ERROR: Supabase environment variables not loaded!")
     print("Make sure SUPABASE_URL and SUPABASE_SERVICE_KEY are in your .env file")
     exit(1)
 
-if not NEWS_API_KEY:
+if not NEWS_API_KEY and not args.fixture:
     print("WARNING: NEWS_API_KEY not found. You'll need this to fetch articles.")
 
 # Initialize Supabase client with SERVICE KEY (bypasses RLS)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+if not args.dry_run:
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 print("Fetching real article data from NewsAPI...")
 print("Using SERVICE KEY to bypass RLS for seeding...")
@@ -69,25 +93,23 @@ sample_users = [
     }
 ]
 
-try:
-    for user in sample_users:
-        try:
-            supabase.table('profiles').insert(user).execute()
-            print(f"Created user: @{user['username']}")
-        except Exception as e:
-            if 'duplicate key value' in str(e).lower():
-                print(f"User @{user['username']} already exists (skipping)")
-            else:
-                print(f"Error creating user @{user['username']}: {str(e)[:100]}")
-    print()
-except Exception as e:
-    print(f"Error in user creation: {e}")
-    print()
+if not args.dry_run:
+    try:
+        # one request for all profiles; existing ones are skipped
+        result = supabase.table('profiles').upsert(
+            sample_users, on_conflict='id', ignore_duplicates=True
+        ).execute()
+        print(f"Created {len(result.data)} users "
+              f"({len(sample_users) - len(result.data)} already existed)")
+        print()
+    except Exception as e:
+        print(f"Error in user creation: {e}")
+        print()
 
 # ============================================
-# Step 2: Fetch real articles from NewsAPI
+# Step 2 + 3: Fetch articles and insert them as posts
 # ============================================
-print("STEP 2: Fetching real articles from NewsAPI")
+print("STEP 2: Fetching articles and creating posts")
 print("-" * 40)
 
 # Topics to search for interesting articles
@@ -99,72 +121,51 @@ topics = [
     'environment'
 ]
 
-all_articles = []
-
-for topic in topics:
-    print(f"Fetching articles about: {topic}")
-    
-    url = f"https://newsapi.org/v2/everything"
-    params = {
-        'q': topic,
-        'apiKey': NEWS_API_KEY,
-        'language': 'en',
-        'sortBy': 'popularity',
-        'pageSize': 3
-    }
-    
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data['status'] == 'ok' and data['articles']:
-            articles = data['articles']
-            print(f"  Found {len(articles)} articles")
-            all_articles.extend(articles)
-        else:
-            print(f"  No articles found for {topic}")
-        
-        time.sleep(0.5)
-        
-    except Exception as e:
-        print(f"  Error fetching {topic}: {e}")
-
-print(f"\nTotal articles fetched: {len(all_articles)}")
-print()
-
-# ============================================
-# Step 3: Insert articles as posts
-# ============================================
-print("STEP 3: Creating posts from articles")
-print("-" * 40)
-
+if args.fixture:
+    print(f"Using local fixture {args.fixture} instead of NewsAPI")
+    source = FixtureSource(args.fixture, args.page_size, args.fixture_latency)
+else:
+    source = NewsApiSource(
+        NEWS_API_KEY, args.page_size, os.getenv("NEWS_API_URL", NEWS_API_URL)
+    )
+
+# topic pages are fetched concurrently (rate limited) and streamed straight
+# into batched inserts
+report = IngestReport()
+articles = fetch_articles(
+    source,
+    topics,
+    pages=args.pages,
+    workers=args.workers,
+    limiter=RateLimiter(args.rate, burst=args.workers),
+    report=report,
+)
 user_ids = [user['id'] for user in sample_users]
-post_count = 0
-
-for i, article in enumerate(all_articles[:15]):
-    if not article.get('url'):
-        continue
-    
-    user_id = user_ids[i % len(user_ids)]
-    
-    post = {
-        'user_id': user_id,
-        'article_url': article['url'],
-        'title': article['title'][:100] if article['title'] else 'Untitled Article',
-        'content': article.get('description', '')[:500] if article.get('description') else '',
-        'thumbnail_url': article.get('urlToImage'),
-        'view_count': (i + 1) * 127
-    }
-    
-    try:
-        result = supabase.table('posts').insert(post).execute()
-        post_count += 1
-        print(f"Created post {post_count}: {post['title'][:50]}...")
-    except Exception as e:
-        print(f"Error creating post: {str(e)[:100]}")
 
-print(f"\nSuccessfully created {post_count} posts!")
+# articles already stored (same normalized URL or same title + description)
+# are dropped: a Bloom filter of the stored keys answers most checks, and
+# only its "maybe" answers cost a lookup, one per batch
+dedup = Deduplicator(BloomFilter(capacity=1_000_000))
+insert = None
+if not args.dry_run:
+    # one-off for posts stored before url_key existed; a no-op afterwards
+    keyed, skipped = backfill_url_keys(supabase)
+    if keyed:
+        print(f"Backfilled url_key on {keyed} existing posts "
+              f"({skipped} left without one: same link as an older post)")
+    dedup = database_deduplicator(supabase)
+    print(f"Loaded {dedup.bloom.count} keys of existing posts")
+
+    # the unique url_key index is the last word if two seeders race
+    insert = lambda batch: supabase.table('posts').upsert(
+        batch, on_conflict='url_key', ignore_duplicates=True
+    ).execute()
+ingest_posts(articles, user_ids, insert, args.batch_size, report, dedup)
+
+for error in report.errors:
+    print(f"  Error: {error[:100]}")
+print(f"\n{report.summary()}")
+post_count = report.inserted
 print()
 
 # ============================================
@@ -174,38 +175,37 @@ print("STEP 4: Creating sample interactions")
 print("-" * 40)
 
 try:
-    posts_response = supabase.table('posts').select('id').execute()
-    post_ids = [post['id'] for post in posts_response.data]
-    
+    post_ids = []
+    if not args.dry_run:
+        posts_response = supabase.table('posts').select('id').execute()
+        post_ids = [post['id'] for post in posts_response.data]
+
     if not post_ids:
         print("No posts found to create interactions")
     else:
-        import random
-        interaction_count = 0
-        
+        interactions = []
+
         for user_id in user_ids:
             num_interactions = random.randint(3, 7)
             selected_posts = random.sample(post_ids, min(num_interactions, len(post_ids)))
-            
+
             for post_id in selected_posts:
-                interaction_type = random.choice(['like', 'like', 'save'])
-                
-                interaction = {
+                interactions.append({
                     'user_id': user_id,
                     'post_id': post_id,
-                    'interaction_type': interaction_type
-                }
-                
-                try:
-                    supabase.table('interactions').insert(interaction).execute()
-                    interaction_count += 1
-                except Exception as e:
-                    if 'duplicate key value' not in str(e).lower():
-                        print(f"Error: {str(e)[:80]}")
-        
-        print(f"Created {interaction_count} interactions")
+                    'interaction_type': random.choice(['like', 'like', 'save'])
+                })
+
+        # one bulk upsert; existing (user, post, type) rows are left alone
+        for batch in batched(interactions, args.batch_size):
+            result = supabase.table('interactions').upsert(
+                batch,
+                on_conflict='user_id,post_id,interaction_type',
+                ignore_duplicates=True
+            ).execute()
+            print(f"Created {len(result.data)} interactions")
         print()
-        
+
 except Exception as e:
     print(f"Error creating interactions: {e}")
     print()
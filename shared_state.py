@@ -0,0 +1,615 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+# called with each message another process published
+Handler = Callable[[bytes], None]
+SENDER_SIZE = 16
+
+
+# one worker, nothing to share: values live in this process and published
+# messages have nobody to reach
+class LocalState:
+    name = "local"
+
+    def __init__(self):
+        self.id = uuid.uuid4().bytes
+        self._values: dict[str, tuple[float, bytes]] = {}
+        self.published = 0
+        self.received = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._values[key]
+            return None
+        return entry[1]
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._values[key] = (time.time() + ttl, value)
+
+    async def set_many(self, items: dict[str, bytes], ttl: float) -> None:
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._values.pop(key, None)
+
+    def publish(self, message: bytes) -> None:
+        self.published += 1
+
+    async def run(self, handler: Handler) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "keys": len(self._values),
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+HEADER = struct.Struct("<8sQQQQQ")
+HEADER_SIZE = 64
+MAGIC = b"BFSTATE1"
+# key hash, arena position, record length, unused, expires at
+SLOT = struct.Struct("<QQIId")
+RECORD = struct.Struct("<I")
+FRAME = struct.Struct("<I")
+WRAP = 0xFFFFFFFF
+# slots a key can live in, starting at its hash
+PROBE = 8
+
+
+def key_hash(key: bytes) -> int:
+    value = int.from_bytes(
+        hashlib.blake2b(key, digest_size=8).digest(), "little"
+    )
+    # 0 marks a free slot
+    return value or 1
+
+
+def default_mmap_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return os.path.join(directory or tempfile.gettempdir(), "betterfeed-state")
+
+
+# shared memory for workers on one host: a file every worker maps, holding
+# a hash index of fixed slots, an arena that records (key + value) are
+# appended to, and a ring of published messages. the arena wraps around,
+# so the oldest records are overwritten first and their slots go invalid;
+# with TTLs on every key that is the eviction policy. writers take an
+# exclusive flock, readers a shared one, each held for microseconds.
+# workers poll the ring's head every poll_interval seconds, an 8 byte read
+class MmapState:
+    name = "mmap"
+
+    def __init__(
+        self,
+        path: str | None = None,
+        arena_size: int = 32 << 20,
+        slots: int = 1 << 16,
+        channel_size: int = 4 << 20,
+        poll_interval: float = 0.002,
+    ):
+        self.path = path or default_mmap_path()
+        self.arena_size = arena_size
+        self.slots = slots
+        self.channel_size = channel_size
+        self.poll_interval = poll_interval
+        self.id = uuid.uuid4().bytes
+        self._index = HEADER_SIZE
+        self._arena = self._index + slots * SLOT.size
+        self._channel = self._arena + arena_size
+        self.size = self._channel + channel_size
+        self._fd: int | None = None
+        self._map: mmap.mmap | None = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.overruns = 0
+
+    async def start(self) -> None:
+        if self._map is not None:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, self.size)
+                    os.pwrite(
+                        fd,
+                        HEADER.pack(
+                            MAGIC,
+                            self.slots,
+                            self.arena_size,
+                            self.channel_size,
+                            0,
+                            0,
+                        ),
+                        0,
+                    )
+                magic, slots, arena_size, channel_size, _, _ = HEADER.unpack(
+                    os.pread(fd, HEADER.size, 0)
+                )
+                if (magic, slots, arena_size, channel_size) != (
+                    MAGIC,
+                    self.slots,
+                    self.arena_size,
+                    self.channel_size,
+                ):
+                    raise ValueError(
+                        f"{self.path} was created with another layout; "
+                        "remove it or match the STATE_MMAP_* settings"
+                    )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, self.size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    async def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = self._fd = None
+
+    @contextmanager
+    def _lock(self, kind: int = fcntl.LOCK_EX):
+        fcntl.flock(self._fd, kind)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # arena_head and channel_head are the header's last two fields; both
+    # only ever grow, positions are taken modulo the region's size
+    def _heads(self) -> tuple[int, int]:
+        return struct.unpack_from("<QQ", self._map, 32)
+
+    def _slot_range(self, h: int) -> range:
+        start = h % self.slots
+        return range(start, start + PROBE)
+
+    def _read_slot(self, i: int) -> tuple:
+        return SLOT.unpack_from(
+            self._map, self._index + (i % self.slots) * SLOT.size
+        )
+
+    def _write_slot(self, i: int, *slot) -> None:
+        SLOT.pack_into(
+            self._map, self._index + (i % self.slots) * SLOT.size, *slot
+        )
+
+    def _live(self, slot: tuple, arena_head: int, now: float) -> bool:
+        h, position, _, _, expires = slot
+        return (
+            h != 0
+            and expires > now
+            and position + self.arena_size >= arena_head
+        )
+
+    def _find(self, key: bytes, now: float) -> bytes | None:
+        h = key_hash(key)
+        arena_head, _ = self._heads()
+        for i in self._slot_range(h):
+            slot = self._read_slot(i)
+            if slot[0] != h or not self._live(slot, arena_head, now):
+                continue
+            offset = self._arena + slot[1] % self.arena_size
+            (key_size,) = RECORD.unpack_from(self._map, offset)
+            start = offset + RECORD.size
+            if self._map[start : start + key_size] == key:
+                return self._map[start + key_size : offset + slot[2]]
+        return None
+
+    async def get(self, key: str) -> bytes | None:
+        with self._lock(fcntl.LOCK_SH):
+            return self._find(key.encode(), time.time())
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        now = time.time()
+        with self._lock(fcntl.LOCK_SH):
+            return [self._find(key.encode(), now) for key in keys]
+
+    def _store(self, key: bytes, value: bytes, expires: float) -> bool:
+        record = RECORD.pack(len(key)) + key + value
+        if len(record) > self.arena_size // 4:
+            self.dropped += 1
+            return False
+        now = time.time()
+        arena_head, channel_head = self._heads()
+        position = arena_head
+        offset = position % self.arena_size
+        if offset + len(record) > self.arena_size:
+            position += self.arena_size - offset
+            offset = 0
+        self._map[
+            self._arena + offset : self._arena + offset + len(record)
+        ] = record
+        arena_head = position + len(record)
+        struct.pack_into("<Q", self._map, 32, arena_head)
+
+        # the key's own slot, else a free or dead one, else the one that
+        # expires soonest
+        h = key_hash(key)
+        choice, soonest = None, None
+        for i in self._slot_range(h):
+            slot = self._read_slot(i)
+            if slot[0] == h:
+                choice = i
+                break
+            if choice is None and not self._live(slot, arena_head, now):
+                choice = i
+            if soonest is None or slot[4] < soonest[1]:
+                soonest = (i, slot[4])
+        if choice is None:
+            choice = soonest[0]
+        self._write_slot(choice, h, position, len(record), 0, expires)
+        return True
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock():
+            self._store(key.encode(), value, time.time() + ttl)
+
+    async def set_many(self, items: dict[str, bytes], ttl: float) -> None:
+        expires = time.time() + ttl
+        with self._lock():
+            for key, value in items.items():
+                self._store(key.encode(), value, expires)
+
+    async def delete(self, *keys: str) -> None:
+        with self._lock():
+            for key in keys:
+                h = key_hash(key.encode())
+                for i in self._slot_range(h):
+                    if self._read_slot(i)[0] == h:
+                        self._write_slot(i, 0, 0, 0, 0, 0.0)
+
+    def publish(self, message: bytes) -> None:
+        frame = FRAME.pack(SENDER_SIZE + len(message)) + self.id + message
+        if len(frame) > self.channel_size // 4:
+            self.dropped += 1
+            logger.warning("Dropped a %d byte message", len(message))
+            return
+        with self._lock():
+            arena_head, head = self._heads()
+            offset = head % self.channel_size
+            if offset + len(frame) > self.channel_size:
+                if self.channel_size - offset >= FRAME.size:
+                    FRAME.pack_into(self._map, self._channel + offset, WRAP)
+                head += self.channel_size - offset
+                offset = 0
+            start = self._channel + offset
+            self._map[start : start + len(frame)] = frame
+            struct.pack_into("<Q", self._map, 40, head + len(frame))
+        self.published += 1
+
+    def _read_messages(self, position: int, head: int):
+        messages = []
+        with self._lock(fcntl.LOCK_SH):
+            _, head = self._heads()
+            if head - position > self.channel_size:
+                # the ring went round before this worker could read it
+                self.overruns += 1
+                logger.warning("Missed messages from other workers")
+                return head, messages
+            while position < head:
+                offset = position % self.channel_size
+                if self.channel_size - offset < FRAME.size:
+                    position += self.channel_size - offset
+                    continue
+                (size,) = FRAME.unpack_from(self._map, self._channel + offset)
+                if size == WRAP:
+                    position += self.channel_size - offset
+                    continue
+                start = self._channel + offset + FRAME.size
+                messages.append(bytes(self._map[start : start + size]))
+                position += FRAME.size + size
+        return position, messages
+
+    async def run(self, handler: Handler) -> None:
+        _, position = self._heads()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            _, head = self._heads()
+            if head == position:
+                continue
+            position, messages = self._read_messages(position, head)
+            for message in messages:
+                if message[:SENDER_SIZE] == self.id:
+                    continue
+                self.received += 1
+                try:
+                    handler(message[SENDER_SIZE:])
+                except Exception:
+                    logger.exception("Failed to apply a shared message")
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": self.name,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+            "overruns": self.overruns,
+        }
+        if self._map is not None:
+            arena_head, channel_head = self._heads()
+            stats["arena_bytes_written"] = arena_head
+            stats["channel_bytes_written"] = channel_head
+        return stats
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, (int, float)):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+# one RESP2 reply; errors are returned as RedisError, not raised, so a
+# pipeline keeps its place
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return RedisError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if kind == b"*":
+        size = int(rest)
+        if size < 0:
+            return None
+        return [await read_reply(reader) for _ in range(size)]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+async def open_redis(url: str):
+    parsed = urlparse(url)
+    reader, writer = await asyncio.open_connection(
+        parsed.hostname or "127.0.0.1", parsed.port or 6379
+    )
+    setup = []
+    if parsed.password:
+        setup.append(
+            ("AUTH", unquote(parsed.username), unquote(parsed.password))
+            if parsed.username
+            else ("AUTH", unquote(parsed.password))
+        )
+    db = parsed.path.lstrip("/")
+    if db and db != "0":
+        setup.append(("SELECT", db))
+    for command in setup:
+        writer.write(encode_command(*command))
+        reply = await read_reply(reader)
+        if isinstance(reply, RedisError):
+            writer.close()
+            raise reply
+    return reader, writer
+
+
+# a pipelined connection: commands are written as they come and replies
+# matched to them in order by a reader task, so concurrent requests share
+# one socket without waiting on each other
+class RedisConnection:
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._waiting: deque[asyncio.Future] = deque()
+        self._task = asyncio.create_task(self._read())
+        self.closed = False
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                reply = await read_reply(self._reader)
+                future = self._waiting.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error: Exception) -> None:
+        self.closed = True
+        while self._waiting:
+            future = self._waiting.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(str(error) or "closed"))
+        self._writer.close()
+
+    async def command(self, *args):
+        if self.closed:
+            raise ConnectionError("Redis connection is closed")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append(future)
+        self._writer.write(encode_command(*args))
+        reply = await future
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self) -> None:
+        self._task.cancel()
+        self._fail(ConnectionError("closed"))
+
+
+# any server that speaks the Redis protocol: keys under `prefix` with PX
+# expiry, messages over PUBLISH/SUBSCRIBE on a second connection. a lost
+# connection is reopened by the next command; the subscriber reconnects
+# with backoff and counts what it may have missed in `reconnects`
+class RedisState:
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = "redis://127.0.0.1:6379/0",
+        prefix: str = "betterfeed:",
+        channel: str | None = None,
+    ):
+        self.url = url
+        self.prefix = prefix
+        self.channel = channel or f"{prefix}writes"
+        self.id = uuid.uuid4().bytes
+        self._connection: RedisConnection | None = None
+        self._connecting = asyncio.Lock()
+        self._publishing: set[asyncio.Task] = set()
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+        self.reconnects = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        if self._publishing:
+            await asyncio.wait(self._publishing, timeout=1)
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _command(self, *args):
+        connection = self._connection
+        if connection is None or connection.closed:
+            async with self._connecting:
+                connection = self._connection
+                if connection is None or connection.closed:
+                    connection = RedisConnection(*await open_redis(self.url))
+                    self._connection = connection
+        try:
+            return await connection.command(*args)
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._command("GET", self.prefix + key)
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        if not keys:
+            return []
+        return await self._command(
+            "MGET", *(self.prefix + key for key in keys)
+        )
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._command(
+            "SET", self.prefix + key, value, "PX", max(int(ttl * 1000), 1)
+        )
+
+    async def set_many(self, items: dict[str, bytes], ttl: float) -> None:
+        # pipelined on the one connection
+        await asyncio.gather(
+            *(self.set(key, value, ttl) for key, value in items.items())
+        )
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._command("DEL", *(self.prefix + key for key in keys))
+
+    def publish(self, message: bytes) -> None:
+        self.published += 1
+        task = asyncio.ensure_future(
+            self._command("PUBLISH", self.channel, self.id + message)
+        )
+        self._publishing.add(task)
+        task.add_done_callback(self._published)
+
+    def _published(self, task: asyncio.Task) -> None:
+        self._publishing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to publish: %s", task.exception())
+
+    async def run(self, handler: Handler) -> None:
+        delay = 0.1
+        while True:
+            writer = None
+            try:
+                reader, writer = await open_redis(self.url)
+                writer.write(encode_command("SUBSCRIBE", self.channel))
+                delay = 0.1
+                while True:
+                    reply = await read_reply(reader)
+                    if not isinstance(reply, list) or reply[0] != b"message":
+                        continue
+                    message = reply[2]
+                    if message[:SENDER_SIZE] == self.id:
+                        continue
+                    self.received += 1
+                    try:
+                        handler(message[SENDER_SIZE:])
+                    except Exception:
+                        logger.exception("Failed to apply a shared message")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reconnects += 1
+                logger.warning("Redis subscription lost: %s", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+        }
+
+
+def create_state(backend: str, **options):
+    if backend == "local":
+        return LocalState()
+    if backend == "mmap":
+        return MmapState(**options)
+    if backend == "redis":
+        return RedisState(**options)
+    raise ValueError(f"Unknown state backend: {backend}")
@@ -132,4 +132,437 @@ CREATE POLICY "Users can create their own interactions"
 -- Users can delete their own interactions
 CREATE POLICY "Users can delete their own interactions"
     ON interactions FOR DELETE
-    USING (auth.uid() = user_id);
\ No newline at end of file
+    USING (auth.uid() = user_id);
+
+-- ============================================
+-- POST STATS (ENGAGEMENT COUNTERS)
+-- ============================================
+-- Per-post like/save counts kept up to date by triggers, so clients can
+-- read counts for a whole feed page without scanning interactions.
+
+CREATE TABLE post_stats (
+    post_id BIGINT PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    like_count INTEGER DEFAULT 0 NOT NULL,
+    save_count INTEGER DEFAULT 0 NOT NULL
+);
+
+-- Every post starts with a zeroed counter row
+CREATE OR REPLACE FUNCTION create_post_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO post_stats (post_id) VALUES (NEW.id)
+    ON CONFLICT (post_id) DO NOTHING;
+    RETURN NEW;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE TRIGGER create_posts_stats
+    AFTER INSERT ON posts
+    FOR EACH ROW
+    EXECUTE FUNCTION create_post_stats();
+
+-- Adjust counters incrementally as interactions come and go
+CREATE OR REPLACE FUNCTION update_post_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE post_stats SET
+            like_count = like_count + (NEW.interaction_type = 'like')::int,
+            save_count = save_count + (NEW.interaction_type = 'save')::int
+        WHERE post_id = NEW.post_id;
+        RETURN NEW;
+    ELSE
+        UPDATE post_stats SET
+            like_count = like_count - (OLD.interaction_type = 'like')::int,
+            save_count = save_count - (OLD.interaction_type = 'save')::int
+        WHERE post_id = OLD.post_id;
+        RETURN OLD;
+    END IF;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE TRIGGER update_interactions_post_stats
+    AFTER INSERT OR DELETE ON interactions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_post_stats();
+
+-- Backfill counters for posts that existed before this table
+INSERT INTO post_stats (post_id, like_count, save_count)
+SELECT
+    p.id,
+    COUNT(i.id) FILTER (WHERE i.interaction_type = 'like'),
+    COUNT(i.id) FILTER (WHERE i.interaction_type = 'save')
+FROM posts p
+LEFT JOIN interactions i ON i.post_id = p.id
+GROUP BY p.id
+ON CONFLICT (post_id) DO NOTHING;
+
+ALTER TABLE post_stats ENABLE ROW LEVEL SECURITY;
+
+-- Counts are public like interactions; only the triggers write them
+CREATE POLICY "Post stats are viewable by everyone"
+    ON post_stats FOR SELECT
+    USING (true);
+
+
+-- ============================================
+-- BATCHED VIEW COUNTS
+-- ============================================
+-- The API buffers impressions in memory and flushes them here as one
+-- statement, incrementing each post once per flush.
+
+CREATE OR REPLACE FUNCTION increment_view_counts(
+    post_ids BIGINT[],
+    deltas INTEGER[]
+)
+RETURNS VOID AS $$
+    UPDATE posts p
+    SET view_count = p.view_count + d.delta
+    FROM unnest(post_ids, deltas) AS d(post_id, delta)
+    WHERE p.id = d.post_id;
+$$ language 'sql' SECURITY DEFINER;
+
+-- Only the service role (the API) may bump view counts
+REVOKE EXECUTE ON FUNCTION increment_view_counts(BIGINT[], INTEGER[])
+    FROM PUBLIC, anon, authenticated;
+
+-- View count bumps shouldn't count as edits, so only touch updated_at when
+-- the post's content changes
+DROP TRIGGER update_posts_updated_at ON posts;
+
+CREATE TRIGGER update_posts_updated_at
+    BEFORE UPDATE OF user_id, article_url, title, content, thumbnail_url
+    ON posts
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+
+-- ============================================
+-- FULL-TEXT SEARCH
+-- ============================================
+-- Search documents live beside posts rather than in a posts column, so
+-- select=* on posts doesn't ship the tsvector. The trigger re-indexes a
+-- post only when its title or content changes.
+
+CREATE TABLE post_search (
+    post_id BIGINT PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    document TSVECTOR NOT NULL
+);
+
+CREATE INDEX idx_post_search_document ON post_search USING GIN (document);
+
+-- Title words rank above content words
+CREATE OR REPLACE FUNCTION index_post_search()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO post_search (post_id, document)
+    VALUES (
+        NEW.id,
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B')
+    )
+    ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NEW;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE TRIGGER index_posts_search
+    AFTER INSERT OR UPDATE OF title, content ON posts
+    FOR EACH ROW
+    EXECUTE FUNCTION index_post_search();
+
+-- Index posts that existed before this table
+INSERT INTO post_search (post_id, document)
+SELECT
+    id,
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+FROM posts
+ON CONFLICT (post_id) DO NOTHING;
+
+ALTER TABLE post_search ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Search documents are viewable by everyone"
+    ON post_search FOR SELECT
+    USING (true);
+
+-- Ranked matches for a web-style query ("climate -sports", quoted
+-- phrases), one keyset page at a time: pass the last row's rank and id to
+-- get the next page. Normalization 1|32 divides by document length and
+-- scales to 0..1, the closest ts_rank_cd gets to BM25's length norm.
+CREATE OR REPLACE FUNCTION search_posts(
+    query TEXT,
+    page_size INTEGER DEFAULT 20,
+    after_rank REAL DEFAULT NULL,
+    after_id BIGINT DEFAULT NULL
+)
+RETURNS TABLE (id BIGINT, rank REAL) AS $$
+    SELECT ranked.id, ranked.rank
+    FROM (
+        SELECT s.post_id AS id, ts_rank_cd(s.document, q, 1 | 32) AS rank
+        FROM post_search s, websearch_to_tsquery('english', query) q
+        WHERE s.document @@ q
+    ) ranked
+    WHERE after_id IS NULL OR (ranked.rank, ranked.id) < (after_rank, after_id)
+    ORDER BY ranked.rank DESC, ranked.id DESC
+    LIMIT page_size;
+$$ language 'sql' STABLE;
+
+
+-- ============================================
+-- DUPLICATE ARTICLES
+-- ============================================
+-- NewsAPI returns the same story under several URLs (tracking parameters,
+-- www., http vs https) and republished under new ones. The app stores two
+-- keys per post, computed in dedup.py: url_key, the normalized URL, and
+-- fingerprint, an md5 of the normalized title and content. A unique
+-- url_key makes the same link impossible to insert twice; the fingerprint
+-- index serves the lookup for copies under other links.
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS url_key TEXT;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+
+-- Same normalization as dedup.fingerprint(); NULL when either part is empty
+UPDATE posts
+SET fingerprint = md5(
+    trim(regexp_replace(lower(title), '[^a-z0-9]+', ' ', 'g')) || E'\n' ||
+    trim(regexp_replace(lower(content), '[^a-z0-9]+', ' ', 'g'))
+)
+WHERE fingerprint IS NULL
+    AND trim(regexp_replace(lower(coalesce(title, '')), '[^a-z0-9]+', ' ', 'g')) <> ''
+    AND trim(regexp_replace(lower(coalesce(content, '')), '[^a-z0-9]+', ' ', 'g')) <> '';
+
+-- url_key is not backfilled here: dedup.normalize_url() sorts query
+-- parameters and drops tracking ones one by one, which SQL can't match
+-- exactly, and a near miss would never equal the keys the app computes.
+-- `python seed.py` fills it in for existing posts (ingest.backfill_url_keys)
+-- before it adds any; until then those posts are only matched by
+-- fingerprint. NULL keys don't conflict in the unique index.
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_url_key ON posts(url_key);
+CREATE INDEX IF NOT EXISTS idx_posts_fingerprint ON posts(fingerprint);
+
+
+-- ============================================
+-- SUMMARIES
+-- ============================================
+-- Summaries are written in the background (summaries.py), never on the
+-- request path. The summaries table caches them by md5 of the content, so
+-- a duplicate article is never summarized twice, even across processes.
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS summary TEXT;
+
+CREATE TABLE summaries (
+    content_hash TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL
+);
+
+-- No policies: only the service role reads and writes the cache
+ALTER TABLE summaries ENABLE ROW LEVEL SECURITY;
+
+-- The backlog summarizer.py works through
+CREATE INDEX IF NOT EXISTS idx_posts_unsummarized ON posts(id)
+    WHERE summary IS NULL AND content IS NOT NULL;
+
+-- One statement per batch of results: caches each summary and sets it on
+-- its posts, unless a post's content has changed since it was queued
+CREATE OR REPLACE FUNCTION store_summaries(items JSONB)
+RETURNS VOID AS $$
+    INSERT INTO summaries (content_hash, summary)
+    SELECT DISTINCT ON (content_hash) content_hash, summary
+    FROM jsonb_to_recordset(items)
+        AS s(post_id BIGINT, content_hash TEXT, summary TEXT)
+    ON CONFLICT (content_hash) DO NOTHING;
+
+    UPDATE posts p
+    SET summary = s.summary
+    FROM jsonb_to_recordset(items)
+        AS s(post_id BIGINT, content_hash TEXT, summary TEXT)
+    WHERE p.id = s.post_id AND md5(p.content) = s.content_hash;
+$$ language 'sql' SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION store_summaries(JSONB)
+    FROM PUBLIC, anon, authenticated;
+
+
+-- ============================================
+-- CREATOR STATS (ANALYTICS)
+-- ============================================
+-- Per-creator counters kept up to date by triggers, like post_stats, so
+-- GET /stats never counts rows in posts or interactions. Totals are summed
+-- from these rows (one per profile) rather than kept in a single row that
+-- every like in the app would have to lock.
+
+CREATE TABLE profile_stats (
+    user_id UUID PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+    post_count INTEGER DEFAULT 0 NOT NULL,
+    like_count INTEGER DEFAULT 0 NOT NULL,
+    save_count INTEGER DEFAULT 0 NOT NULL,
+    view_count BIGINT DEFAULT 0 NOT NULL,
+    engagement INTEGER GENERATED ALWAYS AS (like_count + save_count) STORED
+);
+
+-- Top-N creators and posts are index scans
+CREATE INDEX idx_profile_stats_post_count ON profile_stats(post_count DESC);
+CREATE INDEX idx_profile_stats_engagement ON profile_stats(engagement DESC);
+
+ALTER TABLE post_stats ADD COLUMN IF NOT EXISTS engagement INTEGER
+    GENERATED ALWAYS AS (like_count + save_count) STORED;
+CREATE INDEX IF NOT EXISTS idx_post_stats_engagement
+    ON post_stats(engagement DESC, post_id DESC);
+
+-- Every profile starts with a zeroed counter row
+CREATE OR REPLACE FUNCTION create_profile_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO profile_stats (user_id) VALUES (NEW.id)
+    ON CONFLICT (user_id) DO NOTHING;
+    RETURN NEW;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE TRIGGER create_profiles_stats
+    AFTER INSERT ON profiles
+    FOR EACH ROW
+    EXECUTE FUNCTION create_profile_stats();
+
+-- A deleted post takes its engagement and views with it. This runs before
+-- the delete, while its post_stats row is still there; its interactions
+-- are deleted by the cascade after it and no longer find the post
+CREATE OR REPLACE FUNCTION update_profile_post_count()
+RETURNS TRIGGER AS $$
+DECLARE
+    likes INTEGER;
+    saves INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO profile_stats (user_id, post_count)
+        VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE
+        SET post_count = profile_stats.post_count + 1;
+        RETURN NEW;
+    ELSE
+        SELECT like_count, save_count INTO likes, saves
+        FROM post_stats WHERE post_id = OLD.id;
+        UPDATE profile_stats SET
+            post_count = post_count - 1,
+            like_count = like_count - coalesce(likes, 0),
+            save_count = save_count - coalesce(saves, 0),
+            view_count = view_count - OLD.view_count
+        WHERE user_id = OLD.user_id;
+        RETURN OLD;
+    END IF;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE TRIGGER insert_posts_profile_stats
+    AFTER INSERT ON posts
+    FOR EACH ROW
+    EXECUTE FUNCTION update_profile_post_count();
+
+CREATE TRIGGER delete_posts_profile_stats
+    BEFORE DELETE ON posts
+    FOR EACH ROW
+    EXECUTE FUNCTION update_profile_post_count();
+
+-- Likes and saves count toward the creator of the post
+CREATE OR REPLACE FUNCTION update_profile_engagement()
+RETURNS TRIGGER AS $$
+DECLARE
+    interaction interactions%ROWTYPE;
+    delta INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        interaction := NEW;
+        delta := 1;
+    ELSE
+        interaction := OLD;
+        delta := -1;
+    END IF;
+    UPDATE profile_stats s SET
+        like_count = s.like_count
+            + delta * (interaction.interaction_type = 'like')::int,
+        save_count = s.save_count
+            + delta * (interaction.interaction_type = 'save')::int
+    FROM posts p
+    WHERE p.id = interaction.post_id AND s.user_id = p.user_id;
+    RETURN interaction;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE TRIGGER update_interactions_profile_stats
+    AFTER INSERT OR DELETE ON interactions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_profile_engagement();
+
+-- View flushes also credit the creators, one update per creator per flush
+CREATE OR REPLACE FUNCTION increment_view_counts(
+    post_ids BIGINT[],
+    deltas INTEGER[]
+)
+RETURNS VOID AS $$
+    WITH bumped AS (
+        UPDATE posts p
+        SET view_count = p.view_count + d.delta
+        FROM unnest(post_ids, deltas) AS d(post_id, delta)
+        WHERE p.id = d.post_id
+        RETURNING p.user_id, d.delta
+    )
+    UPDATE profile_stats s
+    SET view_count = s.view_count + b.views
+    FROM (
+        SELECT user_id, sum(delta) AS views FROM bumped GROUP BY user_id
+    ) b
+    WHERE s.user_id = b.user_id;
+$$ language 'sql' SECURITY DEFINER;
+
+-- Backfill counters for profiles that existed before this table
+INSERT INTO profile_stats (user_id, post_count, like_count, save_count, view_count)
+SELECT
+    pr.id,
+    COUNT(p.id),
+    coalesce(SUM(ps.like_count), 0),
+    coalesce(SUM(ps.save_count), 0),
+    coalesce(SUM(p.view_count), 0)
+FROM profiles pr
+LEFT JOIN posts p ON p.user_id = pr.id
+LEFT JOIN post_stats ps ON ps.post_id = p.id
+GROUP BY pr.id
+ON CONFLICT (user_id) DO NOTHING;
+
+ALTER TABLE profile_stats ENABLE ROW LEVEL SECURITY;
+
+-- Counts are public like post_stats; only the triggers write them
+CREATE POLICY "Profile stats are viewable by everyone"
+    ON profile_stats FOR SELECT
+    USING (true);
+
+-- App-wide totals, summed from one row per profile
+CREATE OR REPLACE FUNCTION stats_totals()
+RETURNS TABLE (
+    users BIGINT,
+    posts BIGINT,
+    likes BIGINT,
+    saves BIGINT,
+    views BIGINT
+) AS $$
+    SELECT
+        COUNT(*),
+        coalesce(SUM(post_count), 0),
+        coalesce(SUM(like_count), 0),
+        coalesce(SUM(save_count), 0),
+        coalesce(SUM(view_count), 0)
+    FROM profile_stats;
+$$ language 'sql' STABLE;
+
+
+-- ============================================
+-- TRENDING
+-- ============================================
+-- GET /trending counts likes and saves per minute in the API process
+-- (trending.py). At startup it reads only the interactions made within the
+-- last day, page by page in (created_at, id) order, through this index.
+
+CREATE INDEX IF NOT EXISTS idx_interactions_created_at
+    ON interactions(created_at, id);
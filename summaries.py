@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Executor
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+SENTENCE = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+
+# key of the summary cache: the same content always gets the same summary,
+# however many posts carry it. md5 so the database can compute it too
+def content_hash(content: str) -> str:
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+# deterministic stand-in for a summarization model: the `sentences`
+# sentences whose words are most frequent in the text, in their original
+# order, cut to max_chars. `rounds` repeats the scoring to mimic a model's
+# CPU cost in benchmarks
+def summarize(
+    text: str, sentences: int = 2, max_chars: int = 280, rounds: int = 1
+) -> str:
+    parts = [part.strip() for part in SENTENCE.split(text) if part.strip()]
+    if not parts:
+        return ""
+    for _ in range(max(rounds, 1)):
+        frequency = Counter(
+            word
+            for word in WORD.findall(text.lower())
+            if word not in STOPWORDS
+        )
+        scores = [
+            sum(frequency[word] for word in WORD.findall(part.lower()))
+            / (1 + len(part) / 100)
+            for part in parts
+        ]
+    best = sorted(range(len(parts)), key=lambda i: (-scores[i], i))
+    summary = " ".join(parts[i] for i in sorted(best[:sentences]))
+    if len(summary) > max_chars:
+        summary = summary[: max_chars - 1].rsplit(" ", 1)[0] + "…"
+    return summary
+
+
+# what the worker pool runs: one call per batch, so a process pool pays
+# one round trip per batch rather than per post
+def summarize_batch(texts: list[str], rounds: int = 1) -> list[str]:
+    return [summarize(text, rounds=rounds) for text in texts]
+
+
+# background summaries for posts. submit() never waits: posts with the
+# same content share one job, and content summarized before is answered
+# from an LRU cache (then from the summaries table via `lookup`) without
+# running the summarizer again. `workers` tasks take up to batch_size jobs
+# at a time and run the summarizer on `executor` (a process pool for CPU
+# bound models). results are written back flush_size rows at a time, or
+# every flush_interval seconds. memory is bounded by max_queue waiting
+# jobs and max_queue unwritten results; submits past that are dropped and
+# left for summarizer.py's backlog scan
+class SummaryQueue:
+    def __init__(
+        self,
+        summarize: Callable[[list[str]], list[str]],
+        write: Callable[[list[dict]], Awaitable[None]],
+        lookup: Callable[[list[str]], Awaitable[dict[str, str]]] | None = None,
+        executor: Executor | None = None,
+        workers: int = 2,
+        batch_size: int = 16,
+        batch_wait: float = 0.005,
+        max_queue: int = 10000,
+        flush_interval: float = 1.0,
+        flush_size: int = 500,
+        cache_size: int = 10000,
+    ):
+        self._summarize = summarize
+        self._write = write
+        self._lookup = lookup
+        self.executor = executor
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        # content hash -> [content, post ids, submitted at]
+        self._jobs: OrderedDict[str, list] = OrderedDict()
+        self._running: dict[str, list] = {}
+        # (post id, content hash, summary, submitted at) to write
+        self.pending: list[tuple[int, str, str, float]] = []
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._latencies: deque[float] = deque(maxlen=1000)
+        self.submitted = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.stored_hits = 0
+        self.summarized = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+        self.written = 0
+        self.writes = 0
+        self.failed_writes = 0
+
+    def submit(self, post_id: int, content: str | None) -> bool:
+        if not content:
+            return False
+        key = content_hash(content)
+        now = time.monotonic()
+        summary = self.cache.get(key)
+        if summary is not None:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            return self._queue_write(post_id, key, summary, now)
+        job = self._jobs.get(key) or self._running.get(key)
+        if job is not None:
+            job[1].append(post_id)
+            self.coalesced += 1
+            return True
+        if len(self._jobs) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self._jobs[key] = [content, [post_id], now]
+        self.submitted += 1
+        self._ready.set()
+        return True
+
+    def _queue_write(
+        self, post_id: int, key: str, summary: str, submitted: float
+    ) -> bool:
+        if len(self.pending) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self.pending.append((post_id, key, summary, submitted))
+        if len(self.pending) >= self.flush_size:
+            self._full.set()
+        return True
+
+    def _resolve(self, key: str, summary: str) -> None:
+        content, post_ids, submitted = self._running.pop(key)
+        self.cache[key] = summary
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        for post_id in post_ids:
+            self._queue_write(post_id, key, summary, submitted)
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._jobs:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            # a burst of submits goes out as one batch
+            if len(self._jobs) < self.batch_size and self.batch_wait:
+                await asyncio.sleep(self.batch_wait)
+            keys = []
+            while self._jobs and len(keys) < self.batch_size:
+                key, job = self._jobs.popitem(last=False)
+                self._running[key] = job
+                keys.append(key)
+            if not keys:
+                continue
+            try:
+                if self._lookup is not None:
+                    stored = await self._lookup(keys)
+                    for key in keys:
+                        if key in stored:
+                            self.stored_hits += 1
+                            self._resolve(key, stored[key])
+                    keys = [key for key in keys if key not in stored]
+                if keys:
+                    summaries = await loop.run_in_executor(
+                        self.executor,
+                        self._summarize,
+                        [self._running[key][0] for key in keys],
+                    )
+                    for key, summary in zip(keys, summaries):
+                        self._resolve(key, summary)
+                    self.summarized += len(keys)
+                    self.batches += 1
+            except Exception:
+                # left for the backlog scan to retry
+                self.failed += len(keys)
+                for key in keys:
+                    self._running.pop(key, None)
+                logger.exception("Failed to summarize %d posts", len(keys))
+
+    async def flush(self) -> int:
+        async with self._lock:
+            batch, self.pending = self.pending, []
+            self._full.clear()
+            if not batch:
+                return 0
+            try:
+                await self._write(
+                    [
+                        {
+                            "post_id": post_id,
+                            "content_hash": key,
+                            "summary": summary,
+                        }
+                        for post_id, key, summary, _ in batch
+                    ]
+                )
+            except Exception:
+                # keep the results for the next attempt
+                self.failed_writes += 1
+                self.pending[:0] = batch
+                logger.exception("Failed to write %d summaries", len(batch))
+                return 0
+            now = time.monotonic()
+            self._latencies.extend(now - row[3] for row in batch)
+            self.written += len(batch)
+            self.writes += 1
+            return len(batch)
+
+    async def run(self) -> None:
+        workers = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        self._full.wait(), self.flush_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                await self.flush()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    # waits for every submitted job to be summarized and written
+    async def join(self) -> None:
+        while self._jobs or self._running:
+            await asyncio.sleep(0.01)
+        await self.flush()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            "queued": len(self._jobs),
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "stored_hits": self.stored_hits,
+            "summarized": self.summarized,
+            "batches": self.batches,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending_writes": len(self.pending),
+            "written": self.written,
+            "writes": self.writes,
+            "failed_writes": self.failed_writes,
+            "cached": len(self.cache),
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+        }
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from clients import create_http_pool, create_postgrest_client
+from summaries import SummaryQueue, summarize_batch
+
+parser = argparse.ArgumentParser(
+    description="Summarize posts that don't have a summary yet"
+)
+parser.add_argument(
+    "--interval", type=float, default=30, help="seconds between scans"
+)
+parser.add_argument(
+    "--once", action="store_true", help="work through the backlog and exit"
+)
+parser.add_argument(
+    "--processes",
+    type=int,
+    default=os.cpu_count() or 1,
+    help="summarizer processes",
+)
+parser.add_argument("--batch-size", type=int, default=16)
+parser.add_argument(
+    "--page-size", type=int, default=500, help="posts queued per scan page"
+)
+parser.add_argument(
+    "--grace",
+    type=float,
+    default=60,
+    help="seconds to leave new posts to the API's own summary queue",
+)
+
+
+async def main():
+    args = parser.parse_args()
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    service_key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not supabase_url or not service_key:
+        print("ERROR: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set")
+        raise SystemExit(1)
+
+    http_pool = create_http_pool(max_connections=20, max_keepalive=10)
+    client = create_postgrest_client(
+        supabase_url, service_key, service_key, http_pool
+    )
+
+    async def lookup(hashes: list[str]) -> dict[str, str]:
+        response = (
+            await client.table("summaries")
+            .select("content_hash,summary")
+            .in_("content_hash", hashes)
+            .execute()
+        )
+        return {row["content_hash"]: row["summary"] for row in response.data}
+
+    async def write(rows: list[dict]) -> None:
+        await client.rpc("store_summaries", {"items": rows}).execute()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+
+    with ProcessPoolExecutor(args.processes) as pool:
+        queue = SummaryQueue(
+            summarize_batch,
+            write,
+            lookup,
+            executor=pool,
+            workers=args.processes,
+            batch_size=args.batch_size,
+            max_queue=args.page_size,
+        )
+        runner = asyncio.create_task(queue.run())
+        while not stop.is_set():
+            # the scan walks posts without a summary in id order, one page
+            # at a time, and queues each page once the last one is written
+            started = time.perf_counter()
+            before = queue.stats()
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=args.grace)
+            cursor, posts = 0, 0
+            while not stop.is_set():
+                response = (
+                    await client.table("posts")
+                    .select("id,content")
+                    .is_("summary", "null")
+                    .neq("content", "")
+                    .lt("created_at", cutoff.isoformat())
+                    .gt("id", cursor)
+                    .order("id")
+                    .limit(args.page_size)
+                    .execute()
+                )
+                for row in response.data:
+                    queue.submit(row["id"], row["content"])
+                posts += len(response.data)
+                await queue.join()
+                if len(response.data) < args.page_size:
+                    break
+                cursor = response.data[-1]["id"]
+
+            elapsed = time.perf_counter() - started
+            stats = queue.stats()
+            done = {
+                name: stats[name] - before[name]
+                for name in (
+                    "summarized",
+                    "cache_hits",
+                    "stored_hits",
+                    "coalesced",
+                )
+            }
+            latency = stats["latency_p95"]
+            print(
+                f"{posts} posts in {elapsed:.2f}s "
+                f"({posts / elapsed if elapsed else 0:.1f} posts/s): "
+                f"{done['summarized']} summarized, "
+                f"{done['cache_hits'] + done['stored_hits']} from cache, "
+                f"{done['coalesced']} duplicates"
+                + (f", p95 latency {latency:.3f}s" if latency else "")
+            )
+            if args.once:
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), args.interval)
+            except asyncio.TimeoutError:
+                pass
+        runner.cancel()
+        await queue.flush()
+    await http_pool.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
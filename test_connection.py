@@ -79,21 +79,13 @@ except Exception as e:
 print("TEST 3: Analyzing interactions")
 print("-" * 40)
 try:
-    # Count total likes
-    likes = supabase.table('interactions') \
-        .select("*", count='exact') \
-        .eq('interaction_type', 'like') \
-        .execute()
-    
-    # Count total saves
-    saves = supabase.table('interactions') \
-        .select("*", count='exact') \
-        .eq('interaction_type', 'save') \
-        .execute()
+    # Totals summed from the per-creator counters (profile_stats), so no
+    # interaction rows are downloaded or counted
+    totals = supabase.rpc('stats_totals').execute().data[0]
     
     print(f"Successfully analyzed interactions!")
-    print(f"Total likes: {likes.count}")
-    print(f"Total saves: {saves.count}")
+    print(f"Total likes: {totals['likes']}")
+    print(f"Total saves: {totals['saves']}")
     print()
 except Exception as e:
     print(f"Error reading interactions: {e}")
@@ -174,18 +166,18 @@ except Exception as e:
 print("TEST 7: Finding most active user")
 print("-" * 40)
 try:
-    response = supabase.table('profiles') \
-        .select("username, posts(count)") \
+    # post counts are kept per creator in profile_stats; ordering by them
+    # is an index scan
+    response = supabase.table('profile_stats') \
+        .select("post_count, profiles(username)") \
+        .order('post_count', desc=True) \
+        .limit(3) \
         .execute()
     
-    # Find user with most posts
     if response.data:
-        user_post_counts = [(user['username'], len(user['posts'])) for user in response.data]
-        user_post_counts.sort(key=lambda x: x[1], reverse=True)
-        
         print(f"Most active creators:")
-        for username, count in user_post_counts[:3]:
-            print(f"   @{username}: {count} posts")
+        for creator in response.data:
+            print(f"   @{creator['profiles']['username']}: {creator['post_count']} posts")
     print()
 except Exception as e:
     print(f"Error finding active users: {e}")
@@ -197,17 +189,18 @@ except Exception as e:
 print("TEST 8: Posts with engagement metrics")
 print("-" * 40)
 try:
-    response = supabase.table('posts') \
-        .select("title, view_count, content, interactions(count)") \
-        .order('view_count', desc=True) \
+    # likes + saves per post are kept in post_stats.engagement
+    response = supabase.table('post_stats') \
+        .select("like_count, save_count, posts(title, view_count, content)") \
+        .order('engagement', desc=True) \
         .limit(3) \
         .execute()
     
     print(f"Top posts by engagement:")
-    for post in response.data:
-        interaction_count = len(post['interactions'])
+    for stats in response.data:
+        post = stats['posts']
         print(f"   '{post['title'][:60]}...'")
-        print(f"      Views: {post['view_count']} | Interactions: {interaction_count}")
+        print(f"      Views: {post['view_count']} | Likes: {stats['like_count']} | Saves: {stats['save_count']}")
         if post.get('content'):
             print(f"      Content: {post['content'][:80]}...")
     print()
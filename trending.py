@@ -0,0 +1,235 @@
+import heapq
+import time
+from typing import AsyncIterable, Callable, Iterable
+
+from feed import parse_timestamp
+
+# window name -> length in buckets
+WINDOWS = {"1h": 60, "24h": 1440}
+INTERACTION_TYPES = ("like", "save")
+
+
+# likes and saves received per post over sliding windows. interactions are
+# counted in a ring of per-minute buckets (post id -> [likes, saves]) that
+# covers the longest window, and each window keeps running totals: a new
+# interaction is added to its bucket and to the totals of the windows it
+# falls in, and a bucket's counts are subtracted from a window's totals
+# when it slides out. memory is bounded by the buckets in the longest
+# window times the posts active in each. the top max_k posts per window are
+# picked with a heap at most every `refresh` seconds, so reads are O(k)
+# however many interactions arrive
+class TrendingPosts:
+    def __init__(
+        self,
+        windows: dict[str, int] | None = None,
+        bucket_seconds: int = 60,
+        max_k: int = 100,
+        refresh: float = 1.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.windows = dict(windows or WINDOWS)
+        self.bucket_seconds = bucket_seconds
+        self.max_k = max_k
+        self.refresh = refresh
+        self.clock = clock
+        self.length = max(self.windows.values())
+        self._minutes = [-1] * self.length
+        self._buckets: list[dict[int, list[int]]] = [
+            {} for _ in range(self.length)
+        ]
+        self._totals: dict[str, dict[int, list[int]]] = {
+            name: {} for name in self.windows
+        }
+        # window -> (rebuilt at, top max_k items), and windows changed since
+        self._top: dict[str, tuple[float, list[dict]]] = {}
+        self._changed: set[str] = set()
+        self._now = self._bucket(clock())
+        # ids of interactions written while the table is being loaded
+        self._loading: set[int] | None = None
+        self.added = 0
+        self.removed = 0
+        self.ignored = 0
+        self.rebuilds = 0
+
+    # seconds of history the longest window needs
+    @property
+    def horizon(self) -> int:
+        return self.length * self.bucket_seconds
+
+    def _bucket(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def _advance(self, now: int) -> None:
+        if now <= self._now:
+            return
+        if now - self._now >= self.length:
+            # every bucket has slid out of every window
+            self._minutes = [-1] * self.length
+            self._buckets = [{} for _ in range(self.length)]
+            for totals in self._totals.values():
+                totals.clear()
+        else:
+            for minute in range(self._now + 1, now + 1):
+                for name, length in self.windows.items():
+                    expired = minute - length
+                    slot = expired % self.length
+                    if self._minutes[slot] == expired:
+                        self._apply(
+                            self._totals[name], self._buckets[slot], -1
+                        )
+                # the slot this minute reuses has left the longest window
+                slot = minute % self.length
+                self._minutes[slot] = minute
+                self._buckets[slot] = {}
+        self._now = now
+        self._changed.update(self.windows)
+
+    @staticmethod
+    def _apply(
+        totals: dict[int, list[int]],
+        counts: dict[int, list[int]],
+        sign: int,
+    ) -> None:
+        for post_id, (likes, saves) in counts.items():
+            total = totals.get(post_id)
+            if total is None:
+                total = totals[post_id] = [0, 0]
+            total[0] += sign * likes
+            total[1] += sign * saves
+            if not total[0] and not total[1]:
+                del totals[post_id]
+
+    # delta is +1 for a new interaction and -1 for a deleted one, counted
+    # in the minute it was created. deletes of interactions this instance
+    # never counted (older than the windows, or missed) are ignored
+    def add(
+        self,
+        post_id: int,
+        interaction_type: str,
+        created_at: float | None = None,
+        delta: int = 1,
+    ) -> bool:
+        if interaction_type not in INTERACTION_TYPES:
+            return False
+        kind = INTERACTION_TYPES.index(interaction_type)
+        now = self._bucket(self.clock())
+        self._advance(now)
+        minute = now
+        if created_at is not None:
+            minute = min(self._bucket(created_at), now)
+        slot = minute % self.length
+        if minute <= now - self.length or self._minutes[slot] != minute:
+            if minute <= now - self.length or delta < 0:
+                self.ignored += 1
+                return False
+            self._minutes[slot] = minute
+            self._buckets[slot] = {}
+        bucket = self._buckets[slot]
+        counts = bucket.get(post_id)
+        if delta < 0 and (counts is None or counts[kind] < -delta):
+            self.ignored += 1
+            return False
+        if counts is None:
+            counts = bucket[post_id] = [0, 0]
+        counts[kind] += delta
+        if not counts[0] and not counts[1]:
+            del bucket[post_id]
+        change = {post_id: [delta, 0] if kind == 0 else [0, delta]}
+        for name, length in self.windows.items():
+            if minute > now - length:
+                self._apply(self._totals[name], change, 1)
+                self._changed.add(name)
+        if delta > 0:
+            self.added += delta
+        else:
+            self.removed -= delta
+        return True
+
+    # rows as returned by interaction writes; delta as for add()
+    def changed(self, rows: Iterable[dict], delta: int) -> None:
+        for row in rows:
+            if self._loading is not None and "id" in row:
+                self._loading.add(row["id"])
+            created_at = row.get("created_at")
+            self.add(
+                row["post_id"],
+                row["interaction_type"],
+                parse_timestamp(created_at) if created_at else None,
+                delta,
+            )
+
+    # bootstraps from pages of interaction rows (id, post_id,
+    # interaction_type, created_at). writes reported through changed()
+    # while it runs are counted once, whether or not a page has them
+    async def load(self, pages: AsyncIterable[list[dict]]) -> int:
+        self._loading = set()
+        loaded = 0
+        try:
+            async for rows in pages:
+                for row in rows:
+                    if row["id"] in self._loading:
+                        continue
+                    loaded += self.add(
+                        row["post_id"],
+                        row["interaction_type"],
+                        parse_timestamp(row["created_at"]),
+                    )
+        finally:
+            self._loading = None
+        return loaded
+
+    def remove_post(self, post_id: int) -> None:
+        for bucket in self._buckets:
+            bucket.pop(post_id, None)
+        for name, totals in self._totals.items():
+            if totals.pop(post_id, None) is not None:
+                # deleted posts drop out on the next read, not the next refresh
+                self._top.pop(name, None)
+
+    # the `limit` posts with the most likes + saves in the window, ties
+    # broken by newest post
+    def top(self, window: str, limit: int) -> list[dict]:
+        now = self.clock()
+        self._advance(self._bucket(now))
+        cached = self._top.get(window)
+        if cached is None or (
+            window in self._changed and now - cached[0] >= self.refresh
+        ):
+            self._changed.discard(window)
+            best = heapq.nlargest(
+                self.max_k,
+                self._totals[window].items(),
+                key=lambda item: (item[1][0] + item[1][1], item[0]),
+            )
+            cached = (
+                now,
+                [
+                    {
+                        "post_id": post_id,
+                        "likes": likes,
+                        "saves": saves,
+                        "engagement": likes + saves,
+                    }
+                    for post_id, (likes, saves) in best
+                ],
+            )
+            self._top[window] = cached
+            self.rebuilds += 1
+        return [dict(item) for item in cached[1][:limit]]
+
+    def stats(self) -> dict:
+        return {
+            "windows": self.windows,
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": sum(1 for bucket in self._buckets if bucket),
+            "entries": sum(len(bucket) for bucket in self._buckets),
+            **{
+                f"posts_{name}": len(totals)
+                for name, totals in self._totals.items()
+            },
+            "added": self.added,
+            "removed": self.removed,
+            "ignored": self.ignored,
+            "rebuilds": self.rebuilds,
+            "loading": self._loading is not None,
+        }
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+
+INTERACTION_TYPES = ("like", "save")
+
+
+# the post ids one user has liked and saved, as sorted arrays of 64-bit
+# ints: 8 bytes per interaction and a binary search per lookup
+class UserInteractions:
+    __slots__ = ("posts",)
+
+    def __init__(self, rows: Iterable[dict] = ()):
+        ids = {kind: [] for kind in INTERACTION_TYPES}
+        for row in rows:
+            if row["interaction_type"] in ids:
+                ids[row["interaction_type"]].append(row["post_id"])
+        self.posts = {
+            kind: array("q", sorted(set(post_ids)))
+            for kind, post_ids in ids.items()
+        }
+
+    def has(self, kind: str, post_id: int) -> bool:
+        posts = self.posts[kind]
+        i = bisect_left(posts, post_id)
+        return i < len(posts) and posts[i] == post_id
+
+    def add(self, kind: str, post_id: int) -> None:
+        posts = self.posts[kind]
+        i = bisect_left(posts, post_id)
+        if i == len(posts) or posts[i] != post_id:
+            posts.insert(i, post_id)
+
+    def remove(self, kind: str, post_id: int) -> None:
+        posts = self.posts[kind]
+        i = bisect_left(posts, post_id)
+        if i < len(posts) and posts[i] == post_id:
+            del posts[i]
+
+    def __len__(self) -> int:
+        return sum(len(posts) for posts in self.posts.values())
+
+
+# per-user interaction sets behind the liked_by_me/saved_by_me flags,
+# loaded once per user (concurrent requests share the load) and then kept
+# current by applying interaction writes in place: this process's, and,
+# with a shared state backend, other workers' as they are broadcast (see
+# interactions_changed in api.py). entries are reloaded after `ttl` to
+# pick up writes neither covers, e.g. with the local backend or ones made
+# outside the API
+class InteractionState:
+    def __init__(
+        self,
+        load: Callable[[str], Awaitable[list[dict]]],
+        maxsize: int = 10000,
+        ttl: float = 300,
+    ):
+        self._load = load
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, UserInteractions]] = (
+            OrderedDict()
+        )
+        self._inflight: dict[str, asyncio.Task] = {}
+        # writes that arrived while that user's set was loading
+        self._pending: dict[str, list[tuple[str, int, int]]] = {}
+
+    async def get(self, user_id: str) -> UserInteractions:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+        task = self._inflight.get(user_id)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(user_id))
+            self._inflight[user_id] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, user_id: str) -> UserInteractions:
+        self._pending[user_id] = []
+        try:
+            state = UserInteractions(await self._load(user_id))
+            for kind, post_id, delta in self._pending[user_id]:
+                self._apply(state, kind, post_id, delta)
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (time.monotonic() + self.ttl, state)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return state
+        finally:
+            del self._pending[user_id]
+            del self._inflight[user_id]
+
+    @staticmethod
+    def _apply(state: UserInteractions, kind: str, post_id, delta) -> None:
+        if kind not in INTERACTION_TYPES:
+            return
+        if delta > 0:
+            state.add(kind, post_id)
+        else:
+            state.remove(kind, post_id)
+
+    # delta is +1 for new interactions and -1 for deleted ones; users whose
+    # sets aren't loaded are skipped, they'll be read fresh
+    def changed(self, rows: Iterable[dict], delta: int) -> None:
+        for row in rows:
+            user_id = row["user_id"]
+            change = (row["interaction_type"], row["post_id"], delta)
+            if user_id in self._pending:
+                self._pending[user_id].append(change)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._apply(entry[1], *change)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "users": len(self._entries),
+            "interactions": sum(len(e[1]) for e in self._entries.values()),
+            "maxsize": self.maxsize,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+# write-behind buffer for post views: impressions are summed per post in
+# memory and written periodically as one batched increment per post.
+# memory is bounded by max_posts distinct ids; a full buffer triggers an
+# early flush and views for new ids past twice that are dropped
+class ViewBuffer:
+    def __init__(
+        self,
+        flush: Callable[[dict[int, int]], Awaitable[None]],
+        interval: float = 5.0,
+        max_posts: int = 10000,
+    ):
+        self._flush = flush
+        self.interval = interval
+        self.max_posts = max_posts
+        self.pending: dict[int, int] = {}
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.last_flush: float | None = None
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def record(self, post_id: int, views: int = 1) -> bool:
+        if post_id not in self.pending:
+            if len(self.pending) >= 2 * self.max_posts:
+                self.dropped += views
+                return False
+            if len(self.pending) >= self.max_posts:
+                self._full.set()
+        self.pending[post_id] = self.pending.get(post_id, 0) + views
+        self.recorded += views
+        return True
+
+    async def flush(self) -> int:
+        async with self._lock:
+            batch, self.pending = self.pending, {}
+            self._full.clear()
+            if not batch:
+                return 0
+            try:
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # cancelled mid-write (the periodic flush, at shutdown): the
+                # final flush writes these instead. a write that had already
+                # landed counts twice, which beats losing it
+                self._restore(batch)
+                raise
+            except Exception:
+                # keep the counts for the next attempt rather than lose them
+                self.failed_flushes += 1
+                self._restore(batch)
+                logger.exception("Failed to flush %d post views", len(batch))
+                return 0
+            total = sum(batch.values())
+            self.flushed += total
+            self.flushes += 1
+            self.last_flush = time.time()
+            return total
+
+    def _restore(self, batch: dict[int, int]) -> None:
+        for post_id, views in batch.items():
+            self.record(post_id, views)
+            self.recorded -= views
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "buffered_posts": len(self.pending),
+            "buffered_views": sum(self.pending.values()),
+            "recorded_views": self.recorded,
+            "flushed_views": self.flushed,
+            "dropped_views": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush": self.last_flush,
+            "flush_interval": self.interval,
+            "max_posts": self.max_posts,
+        }